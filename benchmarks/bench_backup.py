@@ -0,0 +1,66 @@
+"""
+Benchmark of the backups made before corrections.
+
+Writes WAVECAR/CHGCAR-like files (single precision floats, which compress
+poorly, and formatted text, which compresses well) to a scratch directory
+and times custodian.utils.backup with the available codecs, levels and
+numbers of workers, reporting the wall time and the disk usage of each
+backup.
+
+Usage:
+    python benchmarks/bench_backup.py [size in MB]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from custodian.utils import backup
+
+
+def disk_usage(path):
+    if os.path.isfile(path):
+        return os.stat(path).st_blocks * 512
+    return sum(
+        os.stat(os.path.join(root, f)).st_blocks * 512 for root, _, files in os.walk(path) for f in files
+    )
+
+
+def available(codec):
+    try:
+        __import__({"zst": "zstandard", "lz4": "lz4.frame"}[codec])
+    except ImportError:
+        return False
+    return True
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    ncores = os.cpu_count() or 1
+    configs = [("gz", None, 1), ("gz", 1, 1), ("gz", 1, ncores)]
+    configs += [(codec, None, ncores) for codec in ["zst", "lz4"] if available(codec)]
+    configs += [("snapshot", None, 1)]
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        rng = np.random.default_rng(0)
+        rng.standard_normal(size * 1024 * 1024 // 8).astype(np.float32).tofile("WAVECAR")
+        np.savetxt("CHGCAR", rng.standard_normal((size * 1024 * 1024 // 2 // 60, 5)), fmt="%.11E")
+        total = disk_usage("WAVECAR") + disk_usage("CHGCAR")
+        print("Backing up {:.0f} MB with {} cores".format(total / 1e6, ncores))
+        print("{:<10} {:>6} {:>8} {:>10} {:>10}".format("codec", "level", "workers", "time (s)", "size (MB)"))
+        for codec, level, workers in configs:
+            start = time.perf_counter()
+            name = backup(["WAVECAR", "CHGCAR"], prefix="bench", codec=codec, level=level, workers=workers)
+            elapsed = time.perf_counter() - start
+            print(
+                "{:<10} {:>6} {:>8} {:10.2f} {:10.1f}".format(
+                    codec, "default" if level is None else level, workers, elapsed, disk_usage(name) / 1e6
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark of the turnaround between chained VaspJobs, i.e., of the
+postprocess of a non-final job, which keeps suffixed copies of its outputs,
+e.g., WAVECAR.relax1, for the next job.
+
+Writes WAVECAR/CHGCAR-like files to a scratch directory (by default the
+current directory, to benchmark its filesystem) and times
+VaspJob.postprocess, which clones the files where the filesystem supports
+it, against plain copies with shutil.copy. The disk usage reported is the
+increase of the used space of the filesystem, which excludes the blocks
+shared by clones.
+
+Usage:
+    python benchmarks/bench_handoff.py [size in MB] [directory]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+# Imported lazily by postprocess, which is not what is benchmarked.
+import pymatgen.io.vasp.outputs  # noqa: F401
+
+from custodian.vasp.jobs import VASP_OUTPUT_FILES, VaspJob
+
+
+def used_space(path):
+    st = os.statvfs(path)
+    return (st.f_blocks - st.f_bfree) * st.f_frsize
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def plain_copy(suffix):
+    for f in VASP_OUTPUT_FILES:
+        if os.path.exists(f):
+            shutil.copy(f, f + suffix)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    directory = sys.argv[2] if len(sys.argv) > 2 else "."
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        os.chdir(tmp)
+        rng = np.random.default_rng(0)
+        rng.standard_normal(size * 1024 * 1024 // 4 * 3 // 4).astype(np.float32).tofile("WAVECAR")
+        rng.standard_normal(size * 1024 * 1024 // 4 // 8).tofile("CHGCAR")
+        print("Handing off {:.0f} MB of outputs in {}".format(size * 1.048576, os.path.abspath(directory)))
+        print("{:<16} {:>10} {:>14}".format("method", "time (s)", "disk used (MB)"))
+        for name, func in [
+            ("shutil.copy", lambda: plain_copy(".copy")),
+            ("postprocess", VaspJob("vasp", final=False, suffix=".relax1").postprocess),
+        ]:
+            os.sync()
+            before = used_space(".")
+            elapsed = timed(func)
+            os.sync()
+            print("{:<16} {:10.2f} {:14.1f}".format(name, elapsed, (used_space(".") - before) / 1e6))
+
+
+if __name__ == "__main__":
+    main()
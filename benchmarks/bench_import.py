@@ -0,0 +1,64 @@
+"""
+Benchmark of the import time of the custodian modules loaded at startup by
+cstdn, run_vasp and spec-driven launches.
+
+Each module is imported in a fresh interpreter, several times, and the
+best wall time is reported along with the heavy dependencies it pulled in.
+The script exits with status 1 if a module exceeds the time budget or
+imports a dependency that is meant to be loaded on first use only, so that
+it can be used as a regression check.
+
+Usage:
+    python benchmarks/bench_import.py [budget in s] [repeat]
+"""
+
+import json
+import subprocess
+import sys
+
+MODULES = [
+    "custodian",
+    "custodian.cli.cstdn",
+    "custodian.cli.run_vasp",
+    "custodian.vasp.handlers",
+    "custodian.vasp.jobs",
+    "custodian.vasp.validators",
+]
+
+# Dependencies that custodian only imports when they are used.
+LAZY = ["pymatgen", "sentry_sdk"]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, sorted(m for m in {lazy} if m in sys.modules)]))
+"""
+
+
+def time_import(module):
+    script = SCRIPT.format(module=module, lazy=LAZY)
+    out = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 1.5
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    failed = False
+    print("{:<28} {:>10}  {}".format("module", "time (s)", "lazy deps imported"))
+    for module in MODULES:
+        results = [time_import(module) for _ in range(repeat)]
+        elapsed = min(r[0] for r in results)
+        imported = results[0][1]
+        over = elapsed > budget or imported
+        failed |= bool(over)
+        print("{:<28} {:10.3f}  {}{}".format(module, elapsed, ", ".join(imported) or "-", "  FAIL" if over else ""))
+    if failed:
+        print("Import time budget of {} s exceeded or lazy dependencies imported.".format(budget))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
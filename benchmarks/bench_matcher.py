@@ -0,0 +1,58 @@
+"""
+Micro-benchmark of the message matching used by the text-scanning handlers.
+
+Compares the nested line/message loops previously used in the VASP handlers
+against custodian.utils.MessageMatcher over the VASP stdout/stderr files in
+test_files. The files are concatenated and repeated to mimic a long run.
+
+Usage:
+    python benchmarks/bench_matcher.py [repeat]
+"""
+
+import glob
+import os
+import sys
+import timeit
+
+from custodian.utils import MessageMatcher
+from custodian.vasp.handlers import VaspErrorHandler, StdErrHandler, AliasingErrorHandler
+
+test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test_files")
+
+
+def nested_loops(table, lines):
+    found = set()
+    for line in lines:
+        l = line.strip()
+        for err, msgs in table.items():
+            for msg in msgs:
+                if l.find(msg) != -1:
+                    found.add((err, msg))
+    return found
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    files = sorted(glob.glob(os.path.join(test_dir, "vasp.*")) + glob.glob(os.path.join(test_dir, "vasp6.*")))
+    files += sorted(glob.glob(os.path.join(test_dir, "std_err.txt.*")))
+    text = ""
+    for fname in files:
+        with open(fname) as f:
+            text += f.read()
+    lines = (text * repeat).splitlines(True)
+    print("Scanning {} lines ({:.1f} MB)".format(len(lines), sum(len(l) for l in lines) / 1e6))
+
+    for cls in [VaspErrorHandler, StdErrHandler, AliasingErrorHandler]:
+        matcher = MessageMatcher(cls.error_msgs)
+        assert matcher.findall(lines) == nested_loops(cls.error_msgs, lines)
+        t_old = min(timeit.repeat(lambda: nested_loops(cls.error_msgs, lines), number=1, repeat=3))
+        t_new = min(timeit.repeat(lambda: matcher.findall(lines), number=1, repeat=3))
+        print(
+            "{:<22} nested loops: {:8.3f} s  matcher: {:8.3f} s  speedup: {:6.1f}x".format(
+                cls.__name__, t_old, t_new, t_old / t_new
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
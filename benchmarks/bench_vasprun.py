@@ -0,0 +1,81 @@
+"""
+Benchmark of vasprun.xml validation.
+
+Compares the time and peak memory of a full parse with
+pymatgen.io.vasp.Vasprun, as done by VasprunXMLValidator by default, against
+the streaming check_vasprun_xml used with full_parse=False, over the complete
+vasprun.xml files in test_files. The calculation blocks of each file are
+repeated to mimic a longer run, e.g., an MD run.
+
+Usage:
+    python benchmarks/bench_vasprun.py [repeat]
+"""
+
+import glob
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+from pymatgen.io.vasp import Vasprun
+
+from custodian.vasp.validators import check_vasprun_xml
+
+test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test_files")
+
+
+def measure(func, filename):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(filename)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def repeat_calculations(filename, repeat, dest):
+    with open(filename) as f:
+        text = f.read()
+    start = text.index("<calculation>")
+    end = text.rindex("</calculation>") + len("</calculation>")
+    with open(dest, "w") as f:
+        f.write(text[:start])
+        for _ in range(repeat):
+            f.write(text[start:end])
+        f.write(text[end:])
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    files = sorted(glob.glob(os.path.join(test_dir, "**", "vasprun.xml*"), recursive=True))
+    warnings.simplefilter("ignore")
+    print("{:<45} {:>8} {:>22} {:>22}".format("file", "MB", "Vasprun s / MB peak", "streaming s / MB peak"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for fname in files:
+            if fname.endswith(".gz"):
+                continue
+            try:
+                check_vasprun_xml(fname)
+            except Exception:
+                continue
+            dest = os.path.join(tmp, "vasprun.xml")
+            repeat_calculations(fname, repeat, dest)
+            t_full, m_full = measure(Vasprun, dest)
+            t_stream, m_stream = measure(check_vasprun_xml, dest)
+            print(
+                "{:<45} {:8.1f} {:10.2f} / {:9.1f} {:10.2f} / {:9.1f}".format(
+                    os.path.relpath(fname, test_dir),
+                    os.path.getsize(dest) / 1e6,
+                    t_full,
+                    m_full / 1e6,
+                    t_stream,
+                    m_stream / 1e6,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
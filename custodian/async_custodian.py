@@ -0,0 +1,282 @@
+# coding: utf-8
+
+"""
+An asyncio-based variant of Custodian, which lets a single process
+supervise many jobs running concurrently in different directories, e.g.,
+
+    custodians = [AsyncCustodian(handlers(), jobs(d), directory=d) for d in dirs]
+    run_log = run_many(custodians)
+
+Jobs, handlers and validators are the same as for Custodian. Instead of
+blocking in a polling loop, each AsyncCustodian awaits the exit of its job
+and schedules the checks of its monitors on the event loop. Since jobs,
+handlers and validators work with paths relative to the current working
+directory, which is shared by the whole process, all their methods are run
+in a shared thread pool, one at a time, in the directory of their
+AsyncCustodian. The event loop itself never blocks on them, so that waiting
+for hundreds of jobs costs little more than waiting for one.
+"""
+
+import asyncio
+import logging
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from monty.shutil import gzip_dir
+
+from .custodian import Custodian, CustodianError, init_sentry
+from .utils import forward_signals, terminate_process
+
+logger = logging.getLogger(__name__)
+
+# Serializes the calls made in the directories of the AsyncCustodians.
+_cwd_lock = threading.Lock()
+
+_executor = None
+
+
+def get_executor():
+    """
+    Returns the thread pool shared by the AsyncCustodians by default.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="custodian")
+    return _executor
+
+
+async def wait_process(p, polling_time_step=10):
+    """
+    Waits for a process to exit without blocking the event loop. On Linux,
+    the event loop is notified of the exit through a pidfd. Otherwise, the
+    process is polled every polling_time_step seconds.
+
+    Args:
+        p (subprocess.Popen): Process.
+        polling_time_step (float): Time in seconds between polls, if needed.
+
+    Returns:
+        (int) Return code of the process.
+    """
+    try:
+        fd = os.pidfd_open(p.pid)
+    except (AttributeError, OSError):
+        fd = None
+    if fd is not None:
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+        loop.add_reader(fd, lambda: exited.done() or exited.set_result(None))
+        try:
+            if p.poll() is None:
+                await exited
+        finally:
+            loop.remove_reader(fd)
+            os.close(fd)
+    while p.poll() is None:
+        await asyncio.sleep(polling_time_step)
+    return p.returncode
+
+
+class AsyncCustodian(Custodian):
+    """
+    Custodian supervising its jobs from an asyncio event loop. Use run_async
+    in a coroutine, or run_many to supervise several AsyncCustodians.
+
+    Jobs are run in the directory of the AsyncCustodian rather than in a
+    scratch directory, and checkpointing is not supported.
+    """
+
+    def __init__(self, handlers, jobs, directory=".", executor=None, **kwargs):
+        """
+        Args:
+            handlers ([ErrorHandler]): Error handlers, as for Custodian.
+            jobs ([Job]): Jobs, as for Custodian.
+            directory (str): Directory in which the jobs are run. Defaults
+                to the current directory.
+            executor (concurrent.futures.Executor): Executor in which the
+                methods of the jobs, handlers and validators are run.
+                Defaults to the thread pool shared by all AsyncCustodians.
+            **kwargs: Other arguments of Custodian, except scratch_dir,
+                checkpoint, event_monitoring and check_timeout.
+        """
+        # A check abandoned after its timeout would keep running in its
+        # thread once the working directory has been restored, and read the
+        # files of another AsyncCustodian.
+        for k in ("scratch_dir", "checkpoint", "event_monitoring", "check_timeout"):
+            if kwargs.get(k):
+                raise ValueError("{} is not supported by AsyncCustodian.".format(k))
+        for h in handlers:
+            if h.check_timeout is not None:
+                raise ValueError("check_timeout of {} is not supported by AsyncCustodian.".format(h))
+        super().__init__(handlers, jobs, **kwargs)
+        self.directory = os.path.abspath(directory)
+        self.executor = executor
+
+    def run(self):
+        """
+        Runs all jobs in a new event loop.
+
+        Returns:
+            All errors encountered as a list of list.
+            [[error_dicts for job 1], [error_dicts for job 2], ....]
+        """
+        return asyncio.run(self.run_async())
+
+    async def run_async(self):
+        """
+        Runs all jobs.
+
+        Returns:
+            All errors encountered as a list of list.
+            [[error_dicts for job 1], [error_dicts for job 2], ....]
+
+        Raises:
+            ValidationError: if a job fails validation
+            ReturnCodeError: if the process has a return code different from 0
+            NonRecoverableError: if an unrecoverable occurs
+            MaxCorrectionsPerJobError: if max_errors_per_job is reached
+            MaxCorrectionsError: if max_errors is reached
+            MaxCorrectionsPerHandlerError: if max_errors_per_handler is reached
+        """
+        self.total_errors = 0
+        logger.info("Run started in {}.".format(self.directory))
+        try:
+            await self._call(self._open_journal)
+            for job_n, job in islice(enumerate(self.jobs, 1), self.restart, None):
+                try:
+                    await self._run_job_async(job_n, job)
+                finally:
+                    await self._call(self._dump_profile, job_n)
+                await self._call(self._log_job)
+        except CustodianError as ex:
+            init_sentry()
+            logger.error(ex.message)
+            if ex.raises:
+                raise
+        finally:
+            await self._call(self._end_run)
+        return self.run_log
+
+    async def _run_job_async(self, job_n, job):
+        """
+        Runs a single job, as Custodian._run_job.
+        """
+        await self._call(self._setup_job, job, job_n)
+
+        attempt = 0
+        while (
+            self.total_errors < self.max_errors
+            and self.errors_current_job < self.max_errors_per_job
+        ):
+            attempt += 1
+            p, start = await self._call(self._start_attempt, job, job_n, attempt)
+            has_error = False
+            zero_return_code = True
+            if isinstance(p, subprocess.Popen):
+                try:
+                    with forward_signals():
+                        has_error = await self._monitor_async(p)
+                except BaseException:
+                    # Jobs may run in their own process group, out of reach
+                    # of the signals interrupting Custodian.
+                    await asyncio.shield(self._call(terminate_process, p))
+                    raise
+                zero_return_code = p.returncode == 0
+
+            if await self._call(self._finish_attempt, job, p, start, has_error, zero_return_code):
+                return
+
+        await self._call(self._raise_max_errors, job)
+
+    async def _monitor_async(self, p):
+        """
+        Waits for a job to exit, checking the monitors when they are due.
+        Returns True iff an error was caught.
+        """
+        exited = asyncio.ensure_future(wait_process(p, self.polling_time_step))
+        has_error = False
+        terminate = self._terminator(p)
+        custom_terminate = self.terminate_func is not None and self.terminate_func != p.terminate
+        if self.monitors:
+            self._start_monitor_clock()
+        while not exited.done():
+            await asyncio.wait([exited], timeout=self.polling_time_step)
+            if exited.done() or not self.monitors:
+                continue
+            due = self._due_monitors()
+            if due:
+                has_error = await self._call(self._do_check, due, terminate) or has_error
+            if custom_terminate:
+                await asyncio.sleep(self.polling_time_step)
+        if not self.monitors and custom_terminate:
+            await self._call(self.terminate_func)
+            await asyncio.sleep(self.polling_time_step)
+        return has_error
+
+    def _log_job(self):
+        """
+        Journals the run log after a job.
+        """
+        self._sync_journal()
+        self._write_metrics()
+
+    def _end_run(self):
+        """
+        Writes the run log at the end of the run.
+        """
+        self._stop_sampler()
+        logger.info("Logging to {}...".format(os.path.join(self.directory, Custodian.LOG_FILE)))
+        self._compact_journal()
+        self._write_metrics()
+        if self.gzipped_output:
+            gzip_dir(".")
+
+    async def _call(self, func, *args):
+        """
+        Calls a function in the executor, in the directory of the
+        AsyncCustodian.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor or get_executor(), self._call_in_directory, func, *args)
+
+    def _call_in_directory(self, func, *args):
+        with _cwd_lock:
+            cwd = os.getcwd()
+            os.chdir(self.directory)
+            try:
+                return func(*args)
+            finally:
+                os.chdir(cwd)
+
+
+async def supervise(custodians):
+    """
+    Runs several AsyncCustodians concurrently.
+
+    Args:
+        custodians ([AsyncCustodian]): AsyncCustodians, each running in its
+            own directory.
+
+    Returns:
+        List of the run logs of the AsyncCustodians, or of the exceptions
+        they raised.
+    """
+    return await asyncio.gather(*[c.run_async() for c in custodians], return_exceptions=True)
+
+
+def run_many(custodians):
+    """
+    Runs several AsyncCustodians concurrently in a new event loop.
+
+    Args:
+        custodians ([AsyncCustodian]): AsyncCustodians, each running in its
+            own directory.
+
+    Returns:
+        List of the run logs of the AsyncCustodians, or of the exceptions
+        they raised.
+    """
+    return asyncio.run(supervise(custodians))
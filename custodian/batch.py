@@ -0,0 +1,291 @@
+# coding: utf-8
+
+"""
+Batch mode, which runs many independent Custodian workflows concurrently
+within one allocation, e.g., the hundreds of small calculations of a
+high-throughput screening packed into a few nodes.
+
+Each workflow is a directory and a cstdn spec, and is run by cstdn in its
+own process. The cores of the allocation are split into slices: each
+workflow gets the number of cores it asks for on a single host, and starts
+as soon as a slice is free, so that workflows that fit in the free cores
+backfill the allocation as others finish. Backfilling lets a large
+workflow wait while smaller, lower priority ones keep taking the cores it
+needs, and can be turned off to start the workflows in strict order. The slice of a workflow is passed
+to it in environment variables, which the spec can use in vasp_cmd through
+the usual $ expansion of cstdn, e.g.,
+
+    jobs_common_params:
+      $vasp_cmd: ["mpirun", "-np", "$CUSTODIAN_NCORES",
+                  "--hostfile", "$CUSTODIAN_HOSTFILE", "vasp_std"]
+
+    CUSTODIAN_NCORES    number of cores of the slice
+    CUSTODIAN_HOST      host of the slice
+    CUSTODIAN_HOSTFILE  hostfile with the host and number of slots
+    CUSTODIAN_CPUS      indices of the cores of the slice on the host, e.g.,
+                        "8-15", for binding with taskset or --cpu-set
+
+A summary of all the workflows is written to a JSON file as they finish.
+"""
+
+import datetime
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from monty.json import MSONable
+from monty.serialization import dumpfn
+
+from .utils import start_process, terminate_process
+
+logger = logging.getLogger(__name__)
+
+
+def get_allocation_slots():
+    """
+    Returns the cores allocated to the current batch job, from the PBS node
+    file or the Slurm node list, or the cores of the local host otherwise.
+
+    Returns:
+        {host: number of cores}
+    """
+    if "PBS_NODEFILE" in os.environ:
+        with open(os.environ["PBS_NODEFILE"]) as f:
+            return dict(Counter(line.strip() for line in f if line.strip()))
+    if "SLURM_JOB_NODELIST" in os.environ and "SLURM_CPUS_ON_NODE" in os.environ:
+        try:
+            hosts = subprocess.run(
+                ["scontrol", "show", "hostnames", os.environ["SLURM_JOB_NODELIST"]],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout.split()
+            return {h: int(os.environ["SLURM_CPUS_ON_NODE"]) for h in hosts}
+        except (OSError, subprocess.CalledProcessError):
+            logger.warning("Cannot expand SLURM_JOB_NODELIST. Using the local host only.")
+    return {"localhost": os.cpu_count() or 1}
+
+
+def _cpu_list(cores):
+    """
+    Formats core indices as a cpu list, e.g., [0, 1, 2, 5] as "0-2,5".
+    """
+    ranges = []
+    for c in sorted(cores):
+        if ranges and c == ranges[-1][1] + 1:
+            ranges[-1][1] = c
+        else:
+            ranges.append([c, c])
+    return ",".join(str(a) if a == b else "{}-{}".format(a, b) for a, b in ranges)
+
+
+def _parse_cpu_list(cpus):
+    """
+    Parses a cpu list, e.g., "0-2,5" as [0, 1, 2, 5].
+    """
+    cores = []
+    for part in cpus.split(","):
+        a, _, b = part.partition("-")
+        cores.extend(range(int(a), int(b or a) + 1))
+    return cores
+
+
+def split_allocation(n, ncores, slots=None):
+    """
+    Splits the cores of an allocation into slices of cores on a single
+    host, as BatchRunner does for its workflows. Within a workflow of a
+    batch, the allocation is the slice of the workflow, as given by
+    CUSTODIAN_HOST and CUSTODIAN_CPUS.
+
+    Args:
+        n (int): Number of slices.
+        ncores (int): Number of cores of each slice.
+        slots (dict): Number of cores of each host of the allocation.
+            Defaults to None, i.e., the slice of the current workflow or
+            else get_allocation_slots.
+
+    Returns:
+        [(host, cpu list)], e.g., [("node01", "0-7"), ("node01", "8-15")],
+        or None if the slices do not fit in the allocation.
+    """
+    if slots is not None:
+        free = {host: list(range(c)) for host, c in slots.items()}
+    elif "CUSTODIAN_HOST" in os.environ and "CUSTODIAN_CPUS" in os.environ:
+        free = {os.environ["CUSTODIAN_HOST"]: _parse_cpu_list(os.environ["CUSTODIAN_CPUS"])}
+    else:
+        free = {host: list(range(c)) for host, c in get_allocation_slots().items()}
+    slices = []
+    for _ in range(n):
+        host = next((h for h, cores in free.items() if len(cores) >= ncores), None)
+        if host is None:
+            return None
+        cores, free[host] = free[host][:ncores], free[host][ncores:]
+        slices.append((host, _cpu_list(cores)))
+    return slices
+
+
+class BatchTask(MSONable):
+    """
+    A Custodian workflow of a batch, i.e., a directory and the cstdn spec
+    run in it.
+    """
+
+    def __init__(self, directory, spec, ncores=1):
+        """
+        Args:
+            directory (str): Directory in which the workflow is run.
+            spec (str or dict): cstdn spec, or path of a YAML/JSON spec file.
+                Relative paths are relative to the directory.
+            ncores (int): Number of cores used by the workflow. They are
+                allocated on a single host. Defaults to 1.
+        """
+        self.directory = directory
+        self.spec = spec
+        self.ncores = ncores
+
+
+class BatchRunner:
+    """
+    Runs many Custodian workflows concurrently on the cores of an
+    allocation, starting each workflow as soon as enough cores are free on
+    a host.
+    """
+
+    SPEC_FILE = "custodian_batch_spec.json"
+    OUTPUT_FILE = "custodian_batch.out"
+
+    def __init__(self, tasks, slots=None, poll_interval=5, summary_file="custodian_batch.json", backfill=True):
+        """
+        Args:
+            tasks ([BatchTask]): Workflows to run, in order of priority.
+            slots (dict): Number of cores of each host of the allocation,
+                e.g., {"node01": 32, "node02": 32}. Defaults to None, i.e.,
+                the allocation of the current batch job as returned by
+                get_allocation_slots.
+            poll_interval (float): Time in seconds between checks for
+                finished workflows. Defaults to 5.
+            summary_file (str): JSON file to which the summary of the
+                workflows is written. Defaults to "custodian_batch.json".
+            backfill (bool): Whether workflows that fit in the free cores
+                start before an earlier workflow that does not. This keeps
+                the allocation busy, but a large workflow may then only
+                start once the smaller ones after it are done. If False,
+                no workflow starts before the earlier ones. Defaults to
+                True.
+        """
+        self.tasks = tasks
+        self.slots = slots or get_allocation_slots()
+        self.poll_interval = poll_interval
+        self.summary_file = summary_file
+        self.backfill = backfill
+        self.summary = []
+        for t in tasks:
+            if t.ncores > max(self.slots.values()):
+                raise ValueError(
+                    "Workflow in {} needs {} cores, more than any host has.".format(t.directory, t.ncores)
+                )
+
+    def run(self):
+        """
+        Runs all the workflows, and waits until they have all finished. If
+        the run is interrupted, e.g., by a KeyboardInterrupt, the running
+        workflows are terminated.
+
+        Returns:
+            Summary of the workflows as a list of dicts, in the order of the
+            tasks, with the host and cores they ran on, their return code
+            and wall time, and the number of corrections in their run log.
+        """
+        free = {host: list(range(n)) for host, n in self.slots.items()}
+        pending = list(enumerate(self.tasks))
+        running = {}
+        self.summary = [None] * len(self.tasks)
+        try:
+            while pending or running:
+                # Backfill: start every pending workflow that fits in the
+                # free cores, in order of priority.
+                for i, task in list(pending):
+                    host = next((h for h, cores in free.items() if len(cores) >= task.ncores), None)
+                    if host is None:
+                        if self.backfill:
+                            continue
+                        break
+                    cores, free[host] = free[host][: task.ncores], free[host][task.ncores:]
+                    running[i] = (*self._start(task, host, cores), host, cores)
+                    pending.remove((i, task))
+                time.sleep(self.poll_interval)
+                for i, (p, info, host, cores) in list(running.items()):
+                    if p.poll() is None:
+                        continue
+                    del running[i]
+                    free[host] = sorted(free[host] + cores)
+                    self._finish(i, p, info)
+        finally:
+            for p, info, host, cores in running.values():
+                logger.info("Terminating workflow in {}.".format(info["directory"]))
+                terminate_process(p)
+        return self.summary
+
+    def _start(self, task, host, cores):
+        """
+        Starts a workflow on cores of a host. Returns the process and the
+        summary of the workflow.
+        """
+        directory = os.path.abspath(task.directory)
+        if isinstance(task.spec, dict):
+            spec_file = os.path.join(directory, BatchRunner.SPEC_FILE)
+            dumpfn(task.spec, spec_file)
+        else:
+            spec_file = os.path.join(directory, task.spec)
+        hostfile = os.path.join(directory, "custodian_batch.hosts")
+        with open(hostfile, "w") as f:
+            f.write("{} slots={}\n".format(host, len(cores)))
+        env = dict(
+            os.environ,
+            CUSTODIAN_NCORES=str(len(cores)),
+            CUSTODIAN_HOST=host,
+            CUSTODIAN_HOSTFILE=hostfile,
+            CUSTODIAN_CPUS=_cpu_list(cores),
+        )
+        logger.info("Starting workflow in {} on {} cores {}.".format(directory, host, env["CUSTODIAN_CPUS"]))
+        with open(os.path.join(directory, BatchRunner.OUTPUT_FILE), "w") as out:
+            p = start_process(
+                [sys.executable, "-m", "custodian.cli.cstdn", "run", spec_file],
+                cwd=directory,
+                env=env,
+                stdout=out,
+                stderr=subprocess.STDOUT,
+            )
+        info = {
+            "directory": directory,
+            "host": host,
+            "cores": env["CUSTODIAN_CPUS"],
+            "ncores": len(cores),
+            "start": datetime.datetime.now(),
+        }
+        return p, info
+
+    def _finish(self, i, p, d):
+        """
+        Completes the summary of a finished workflow and writes the summary
+        of the batch.
+        """
+        end = datetime.datetime.now()
+        d["wall_time"] = (end - d["start"]).total_seconds()
+        d["start"], d["end"] = d["start"].isoformat(), end.isoformat()
+        d["returncode"] = p.returncode
+        d["n_corrections"] = None
+        try:
+            with open(os.path.join(d["directory"], "custodian.json")) as f:
+                d["n_corrections"] = sum(len(job["corrections"]) for job in json.load(f))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        logger.info("Workflow in {} finished with return code {}.".format(d["directory"], p.returncode))
+        self.summary[i] = d
+        if self.summary_file:
+            dumpfn([s for s in self.summary if s is not None], self.summary_file + ".tmp", indent=4)
+            os.replace(self.summary_file + ".tmp", self.summary_file)
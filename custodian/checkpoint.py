@@ -0,0 +1,180 @@
+# coding: utf-8
+
+"""
+Incremental checkpoints of a working directory. Instead of archiving the
+whole directory after each job, a checkpoint is a manifest of the files in
+the directory with their hash, size and mtime, and the content of the files
+is stored once in a content-addressed store. Files unchanged since the
+previous checkpoint, e.g., large WAVECAR or CHGCAR files kept between jobs,
+are neither hashed nor copied again, and restoring a checkpoint only
+rewrites the files that are missing or differ.
+
+A checkpoint is stored in the CHECKPOINT_DIR directory as:
+
+    manifest.json    {"index": job number, "files": {...}, "dirs": [...]}
+    blobs/ab/ab...   content of the files, named by their SHA-256 hash
+
+Blobs are written as reflinks where the filesystem supports them, and as
+copies otherwise.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import stat
+
+from .utils import clone_file
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = "custodian.chk"
+
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _blob_path(store, digest):
+    return os.path.join(store, "blobs", digest[:2], digest)
+
+
+def _read_manifest(store):
+    try:
+        with open(os.path.join(store, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _scan(directory):
+    """
+    Yields the relative paths and lstat results of the files and
+    directories in a directory, except the checkpoints themselves.
+    """
+    for root, dirs, files in os.walk(directory):
+        rel_root = os.path.relpath(root, directory)
+        if rel_root == ".":
+            dirs[:] = [d for d in dirs if d != CHECKPOINT_DIR]
+            files = [f for f in files if not (f.startswith("custodian.chk.") and f.endswith(".tar.gz"))]
+        for name in dirs + files:
+            path = os.path.normpath(os.path.join(rel_root, name))
+            yield path, os.lstat(os.path.join(directory, path))
+
+
+def save_checkpoint(directory, index):
+    """
+    Checkpoints a directory. Only the files that changed since the previous
+    checkpoint are hashed and stored, and blobs no longer referenced are
+    removed once the new manifest is written.
+
+    Args:
+        directory (str): Directory to checkpoint.
+        index (int): Index of the checkpoint, i.e., the number of completed
+            jobs.
+
+    Returns:
+        (dict) Number of "stored" and "reused" files.
+    """
+    store = os.path.join(directory, CHECKPOINT_DIR)
+    previous = (_read_manifest(store) or {}).get("files", {})
+    files = {}
+    dirs = []
+    stored = reused = 0
+    for path, st in _scan(directory):
+        if stat.S_ISDIR(st.st_mode):
+            dirs.append(path)
+            continue
+        if stat.S_ISLNK(st.st_mode):
+            files[path] = {"link": os.readlink(os.path.join(directory, path))}
+            continue
+        if not stat.S_ISREG(st.st_mode):
+            continue
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "mode": stat.S_IMODE(st.st_mode)}
+        old = previous.get(path, {})
+        if old.get("size") == entry["size"] and old.get("mtime_ns") == entry["mtime_ns"] and "hash" in old:
+            entry["hash"] = old["hash"]
+        else:
+            entry["hash"] = _hash_file(os.path.join(directory, path))
+        blob = _blob_path(store, entry["hash"])
+        if os.path.exists(blob):
+            reused += 1
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            clone_file(os.path.join(directory, path), blob + ".tmp")
+            os.replace(blob + ".tmp", blob)
+            stored += 1
+        files[path] = entry
+    # The manifest is replaced atomically, so that an interrupted checkpoint
+    # leaves the previous one intact.
+    manifest = os.path.join(store, "manifest.json")
+    with open(manifest + ".tmp", "w") as f:
+        json.dump({"index": index, "files": files, "dirs": dirs}, f)
+    os.replace(manifest + ".tmp", manifest)
+    referenced = {_blob_path(store, e["hash"]) for e in files.values() if "hash" in e}
+    for root, _, names in os.walk(os.path.join(store, "blobs")):
+        for name in names:
+            if os.path.join(root, name) not in referenced:
+                os.remove(os.path.join(root, name))
+    return {"stored": stored, "reused": reused}
+
+
+def load_checkpoint(directory):
+    """
+    Restores the last checkpoint of a directory. Files whose size and mtime
+    match the manifest are left untouched, and only the missing or modified
+    files are restored from the store. Files not in the checkpoint are kept.
+
+    Args:
+        directory (str): Directory to restore.
+
+    Returns:
+        (int) Index of the checkpoint, or 0 if there is none.
+    """
+    manifest = _read_manifest(os.path.join(directory, CHECKPOINT_DIR))
+    if manifest is None:
+        return 0
+    store = os.path.join(directory, CHECKPOINT_DIR)
+    for path in manifest["dirs"]:
+        os.makedirs(os.path.join(directory, path), exist_ok=True)
+    restored = 0
+    for path, entry in manifest["files"].items():
+        dest = os.path.join(directory, path)
+        if "link" in entry:
+            if os.path.islink(dest) and os.readlink(dest) == entry["link"]:
+                continue
+            if os.path.lexists(dest):
+                os.remove(dest)
+            os.symlink(entry["link"], dest)
+            continue
+        try:
+            st = os.lstat(dest)
+            if stat.S_ISREG(st.st_mode) and (st.st_size, st.st_mtime_ns) == (entry["size"], entry["mtime_ns"]):
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                shutil.rmtree(dest)
+            else:
+                os.remove(dest)
+        except FileNotFoundError:
+            pass
+        clone_file(_blob_path(store, entry["hash"]), dest)
+        os.chmod(dest, entry["mode"])
+        os.utime(dest, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        restored += 1
+    logger.info("Restored {} files from checkpoint {}.".format(restored, manifest["index"]))
+    return manifest["index"]
+
+
+def delete_checkpoints(directory):
+    """
+    Removes the checkpoints of a directory.
+
+    Args:
+        directory (str): Directory whose checkpoints are removed.
+    """
+    shutil.rmtree(os.path.join(directory, CHECKPOINT_DIR), ignore_errors=True)
@@ -8,6 +8,7 @@ A yaml based Custodian job runner. Allows for multi-step jobs with modifications
 
 import argparse
 import logging
+import os
 import sys
 
 from monty.serialization import loadfn
@@ -88,6 +89,30 @@ def run(args):
     c.run()
 
 
+def batch(args):
+    """
+    Run the same spec in many directories concurrently.
+    """
+    from custodian.batch import BatchRunner, BatchTask
+
+    FORMAT = "%(asctime)s %(message)s"
+    logging.basicConfig(format=FORMAT, level=logging.INFO, filename="batch.log")
+    spec_file = os.path.abspath(args.spec_file[0])
+    tasks = [BatchTask(d, spec_file, ncores=args.ncores) for d in args.directories]
+    slots = None
+    if args.hosts:
+        slots = {}
+        for h in args.hosts:
+            host, n = h.rsplit(":", 1)
+            slots[host] = int(n)
+    runner = BatchRunner(tasks, slots=slots, poll_interval=args.poll_interval, summary_file=args.summary)
+    summary = runner.run()
+    failed = [s["directory"] for s in summary if s["returncode"] != 0]
+    if failed:
+        logging.info("Failed workflows: {}".format(", ".join(failed)))
+        sys.exit(1)
+
+
 def print_example(args):
     """
     Print the example_yaml.
@@ -114,6 +139,37 @@ def main():
     )
     prun.set_defaults(func=run)
 
+    pbatch = subparsers.add_parser(
+        "batch",
+        help="Run a spec in many directories concurrently, e.g., within a single allocation.",
+    )
+    pbatch.add_argument(
+        "spec_file", metavar="spec_file", type=str, nargs=1, help="YAML/JSON spec file."
+    )
+    pbatch.add_argument(
+        "directories", metavar="directories", type=str, nargs="+", help="Directories in which to run the spec."
+    )
+    pbatch.add_argument(
+        "-n",
+        "--ncores",
+        type=int,
+        default=1,
+        help="Number of cores of each workflow, available in the spec as $CUSTODIAN_NCORES. Defaults to 1.",
+    )
+    pbatch.add_argument(
+        "--hosts",
+        type=str,
+        nargs="+",
+        help="Hosts and cores to use, as host:ncores. Defaults to the allocation of the batch job.",
+    )
+    pbatch.add_argument(
+        "--poll_interval", type=float, default=5, help="Seconds between checks for finished workflows."
+    )
+    pbatch.add_argument(
+        "-s", "--summary", type=str, default="custodian_batch.json", help="Summary file of the workflows."
+    )
+    pbatch.set_defaults(func=batch)
+
     prun = subparsers.add_parser(
         "example",
         help="Print examples. Right now, there is only one example for VASP double relaxation.",
@@ -9,7 +9,6 @@ import logging
 import sys
 
 import ruamel.yaml as yaml
-from pymatgen.io.vasp.inputs import VaspInput, Incar, Kpoints
 
 from custodian.custodian import Custodian
 from custodian.vasp.jobs import VaspJob
@@ -36,6 +35,8 @@ def get_jobs(args):
     """
     Returns a generator of jobs. Allows of "infinite" jobs.
     """
+    from pymatgen.io.vasp.inputs import Incar, Kpoints, VaspInput
+
     vasp_command = args.command.split()
     # save initial INCAR for rampU runs
     n_ramp_u = args.jobs.count("rampU")
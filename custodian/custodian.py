@@ -6,16 +6,22 @@ given a set of error handlers, the abstract base classes for the
 ErrorHandlers and Jobs.
 """
 
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 import logging
+import select
 import subprocess
 import sys
 import datetime
+import json
+import threading
 import time
 from glob import glob
 import tarfile
 import os
 from abc import abstractmethod
 from itertools import islice
+from contextlib import nullcontext
+from functools import partial
 import warnings
 from ast import literal_eval
 
@@ -24,7 +30,19 @@ from monty.shutil import gzip_dir
 from monty.json import MSONable, MontyEncoder, MontyDecoder
 from monty.serialization import loadfn, dumpfn
 
-from .utils import get_execution_host_info
+from .utils import (
+    get_execution_host_info,
+    FileWatcher,
+    BackupMetrics,
+    ParseCache,
+    bind_metrics,
+    forward_signals,
+    terminate_process,
+)
+from .metrics import write_prometheus
+from .profiling import Profiler
+from .resources import ProcessTreeSampler
+from .checkpoint import save_checkpoint, load_checkpoint, delete_checkpoints
 
 __author__ = "Shyue Ping Ong, William Davidson Richards"
 __copyright__ = "Copyright 2012, The Materials Project"
@@ -39,7 +57,9 @@ logger = logging.getLogger(__name__)
 # for Custodian to get statistics on which errors are most common.
 # If you do not have a SENTRY_DSN environment variable set, or do
 # not have CUSTODIAN_REPORTING_OPT_IN set to True, then
-# Sentry will not be enabled.
+# Sentry will not be enabled. Since importing and initializing sentry_sdk
+# is slow, this is only done by init_sentry when there is a first error
+# to report.
 
 SENTRY_DSN = None
 if "SENTRY_DSN" in os.environ:
@@ -50,7 +70,19 @@ elif "CUSTODIAN_REPORTING_OPT_IN" in os.environ:
     if literal_eval(os.environ.get("CUSTODIAN_REPORTING_OPT_IN", "False").title()):
         SENTRY_DSN = "https://0f7291738eb042a3af671df9fc68ae2a@sentry.io/1470881"
 
-if SENTRY_DSN:
+_sentry_tags = {}
+_sentry_initialized = False
+
+
+def init_sentry():
+    """
+    Initializes Sentry if it is enabled and has not been initialized yet.
+    Called before the first error is logged, so that it is reported.
+    """
+    global _sentry_initialized
+    if not SENTRY_DSN or _sentry_initialized:
+        return
+    _sentry_initialized = True
 
     import sentry_sdk
 
@@ -68,6 +100,25 @@ if SENTRY_DSN:
         import socket
 
         scope.set_tag("hostname", socket.gethostname())
+        for k, v in _sentry_tags.items():
+            scope.set_tag(k, v)
+
+
+def add_sentry_tags(**tags):
+    """
+    Adds tags to the errors reported to Sentry, e.g., the executable run
+    by a job. Does not initialize Sentry by itself.
+
+    Args:
+        **tags: Tags and their values.
+    """
+    _sentry_tags.update(tags)
+    if _sentry_initialized:
+        import sentry_sdk
+
+        with sentry_sdk.configure_scope() as scope:
+            for k, v in tags.items():
+                scope.set_tag(k, v)
 
 
 class Custodian:
@@ -110,9 +161,60 @@ class Custodian:
         if you have a polling_time_step of 10 seconds and a monitor_freq of
         30, this means that Custodian uses the monitors to check for errors
         every 30 x 10 = 300 seconds, i.e., 5 minutes.
+        Monitors that set ErrorHandler.monitor_interval or
+        ErrorHandler.monitor_budget are checked on their own schedule
+        instead. The number and duration of the checks of each handler are
+        recorded under "handler_checks" in the run log.
+
+    .. attribute: event_monitoring
+
+        Whether jobs are monitored in event-driven mode, i.e., checks are
+        triggered by the job exiting or by modifications of the files the
+        monitors declare in ErrorHandler.monitored_files, instead of at
+        fixed polling steps.
+
+    .. attribute: check_workers
+
+        Number of threads used to run the check methods of the handlers
+        concurrently. Corrections are still applied one at a time in order
+        of priority.
+
+    .. attribute: metrics_file
+
+        File to which the metrics in the run log are exported in the
+        Prometheus text format, or None.
+
+    .. attribute: profiling
+
+        Profiler of the job phases and of the checks and corrections, or
+        None.
+
+    .. attribute: resource_sampling
+
+        Time in seconds between samples of the resources used by a running
+        job, or None.
+
+    .. attribute: check_timeout
+
+        Time in seconds after which the check of a handler that does not set
+        ErrorHandler.check_timeout is abandoned, or None.
+
+    Each job in the run log has a "metrics" record with the durations of
+    its setup, run attempts and postprocessing, the number of cores it
+    used, the core-hours lost to attempts that had to be corrected, and the
+    number, size and duration of the backups made by the handlers. The
+    number and duration of the checks and corrections of each handler are
+    recorded under "handler_checks".
+
+    The run log is written to LOG_FILE at the end of a run. During the run,
+    e.g., after each check and each job, only the changes are appended as
+    compact JSON lines to JOURNAL_FILE, which is removed once the run log
+    has been written. If a run is interrupted, the run log is rebuilt from
+    the journal.
     """
 
     LOG_FILE = "custodian.json"
+    JOURNAL_FILE = "custodian.jsonl"
 
     def __init__(
         self,
@@ -129,6 +231,12 @@ class Custodian:
         checkpoint=False,
         terminate_func=None,
         terminate_on_nonzero_returncode=True,
+        event_monitoring=False,
+        check_workers=1,
+        metrics_file=None,
+        profiling=None,
+        resource_sampling=None,
+        check_timeout=None,
     ):
         """
         Initializes a Custodian from a list of jobs and error handler.s
@@ -175,12 +283,79 @@ class Custodian:
             gzipped_output (bool): Whether to gzip the final output to save
                 space. Defaults to False.
             checkpoint (bool):  Whether to checkpoint after each successful Job.
-                Checkpoints are stored as custodian.chk.#.tar.gz files. Defaults
-                to False.
+                Checkpoints are incremental and stored in the custodian.chk
+                directory (see custodian.checkpoint), so that files unchanged
+                between jobs are not copied again. Checkpoints stored as
+                custodian.chk.#.tar.gz files by older versions can still be
+                loaded. Defaults to False.
             terminate_func (callable): A function to be called to terminate a
                 running job. If None, the default is to call Popen.terminate.
             terminate_on_nonzero_returncode (bool): If True, a non-zero return
                 code on any Job will result in a termination. Defaults to True.
+            event_monitoring (bool): If True, a running job is not polled.
+                Instead, custodian waits for the job to exit and for
+                modifications of the files that the monitors declare in
+                ErrorHandler.monitored_files (via inotify on Linux, by
+                checking their mtime every polling_time_step seconds
+                otherwise). Monitors interested in a modified file are
+                checked at most once every polling_time_step seconds, and all
+                monitors are still checked every polling_time_step x
+                monitor_freq seconds. This catches errors and finished jobs
+                as soon as they happen. Defaults to False, i.e., the fixed
+                polling described above.
+            check_workers (int): If larger than 1, the check methods of the
+                handlers in a check are run concurrently in a pool of that
+                many threads, which cuts the time spent parsing large
+                outputs at the end of a job. The corrections are then applied
+                serially in order of priority, so that max_num_corrections
+                and termination behave as with serial checks. Once a
+                correction has been applied, the remaining handlers are
+                checked again serially since the correction may have changed
+                the files they look at, so that a check with a correction
+                costs up to the concurrent checks plus the serial checks of
+                the handlers after the first correction. The discarded
+                concurrent checks are counted under "discarded" in
+                "handler_checks" in the run log. Handlers must therefore not
+                modify any file in check. Defaults to 1, i.e., serial checks.
+            metrics_file (str): If set, the metrics in the run log are
+                written to this file in the Prometheus text exposition format
+                after each job and at the end of the run, e.g., for the
+                textfile collector of the Prometheus node exporter. Defaults
+                to None.
+            profiling (bool or dict): If set, the setup, run and postprocess
+                calls of the jobs and the check and correct calls of the
+                handlers and validators are profiled with cProfile and/or
+                tracemalloc. The cProfile statistics of each kind of call are
+                dumped after each job to files named
+                <directory>/job<n>.<label>.prof, e.g.,
+                custodian_profiles/job1.check.VaspErrorHandler.prof, and a
+                summary is added to the run log under "profile". Set to True
+                for the defaults, or to a dict of the arguments of
+                custodian.profiling.Profiler, e.g., {"directory": "profiles",
+                "tracemalloc": True, "top": 20}, which can also be given in
+                the custodian_params of a spec. Defaults to None, i.e., no
+                profiling.
+            resource_sampling (float): If set, the resources used by the
+                process tree of a running job, i.e., its memory, CPU, I/O,
+                threads and context switches, are sampled from /proc every
+                resource_sampling seconds in a background thread (see
+                custodian.resources.ProcessTreeSampler). The samples of
+                each attempt are added to the run log under "resources",
+                and the sampler is available to the handlers as
+                ErrorHandler.process_sampler while the job runs, so that
+                monitors can act on, e.g., a memory blow-up. Linux only.
+                Defaults to None, i.e., no sampling.
+            check_timeout (float): If set, the check methods of the handlers
+                run in worker threads, and custodian waits at most
+                check_timeout seconds for each, or ErrorHandler.check_timeout
+                for the handlers that set it, e.g., so that a check blocked on
+                a stalled network filesystem does not hold up the monitoring
+                of the job and the other monitors such as WalltimeHandler. A
+                check that times out counts as no error found, and is counted
+                under "timeouts" in "handler_checks" in the run log. Until it
+                completes, the handler is not checked again, which is counted
+                under "stalled", and once it does, its result is used at the
+                next check. Defaults to None, i.e., checks are waited for.
         """
         self.max_errors = max_errors
         self.max_errors_per_job = max_errors_per_job or max_errors
@@ -204,12 +379,42 @@ class Custodian:
         self.total_errors = 0
         self.terminate_func = terminate_func
         self.terminate_on_nonzero_returncode = terminate_on_nonzero_returncode
+        self.event_monitoring = event_monitoring
+        self.check_workers = check_workers
+        self.metrics_file = metrics_file
+        self.profiling = profiling
+        self.resource_sampling = resource_sampling
+        self.check_timeout = check_timeout
+        self._sampler = None
+        if profiling:
+            self._profiler = Profiler(**profiling) if isinstance(profiling, dict) else Profiler()
+        else:
+            self._profiler = None
+        # Timers and last check costs of the handlers, keyed by id.
+        self._monitor_checked = {}
+        self._check_costs = {}
+        # Checks running in worker threads under a deadline, keyed by the id
+        # of their handler, the handlers whose check timed out, and those
+        # whose check is left over from a previous attempt.
+        self._pending_checks = {}
+        self._stalled_checks = set()
+        self._stale_checks = set()
+        # Parse cache of the checks and totals of the backups of the current
+        # job, bound to the threads working for this Custodian.
+        self.parse_cache = ParseCache()
+        self.backup_metrics = BackupMetrics()
+        self._journal = None
+        self._journaled = []
         self.finished = False
 
     @staticmethod
     def _load_checkpoint(cwd):
-        restart = 0
+        restart = load_checkpoint(cwd)
+        if restart:
+            logger.info("Loaded checkpoint {}.".format(restart))
+            return restart, Custodian._load_run_log()
         run_log = []
+        # Checkpoints written by older versions are full tarballs.
         chkpts = glob(os.path.join(cwd, "custodian.chk.*.tar.gz"))
         if chkpts:
             chkpt = sorted(chkpts, key=lambda c: int(c.split(".")[-3]))[0]
@@ -218,26 +423,31 @@ class Custodian:
             t = tarfile.open(chkpt)
             t.extractall()
             # Log the corrections to a json file.
-            run_log = loadfn(Custodian.LOG_FILE, cls=MontyDecoder)
+            run_log = Custodian._load_run_log()
 
         return restart, run_log
 
     @staticmethod
     def _delete_checkpoints(cwd):
+        delete_checkpoints(cwd)
         for f in glob(os.path.join(cwd, "custodian.chk.*.tar.gz")):
             os.remove(f)
 
     @staticmethod
     def _save_checkpoint(cwd, index):
         try:
-            Custodian._delete_checkpoints(cwd)
-            n = os.path.join(cwd, "custodian.chk.{}.tar.gz".format(index))
-            with tarfile.open(n, mode="w:gz", compresslevel=3) as f:
-                f.add(cwd, arcname=".")
-            logger.info("Checkpoint written to {}".format(n))
+            stats = save_checkpoint(cwd, index)
+            for f in glob(os.path.join(cwd, "custodian.chk.*.tar.gz")):
+                os.remove(f)
+            logger.info(
+                "Checkpoint {} written: {} files stored, {} unchanged.".format(
+                    index, stats["stored"], stats["reused"]
+                )
+            )
         except Exception:
             logger.info("Checkpointing failed")
             import traceback
+            init_sentry()
             logger.error(traceback.format_exc())
 
     @classmethod
@@ -364,24 +574,38 @@ class Custodian:
             logger.info("Hostname: {}, Cluster: {}".format(*get_execution_host_info()))
 
             try:
+                if self._profiler is not None:
+                    # Traces allocations again if a previous run closed it.
+                    self._profiler.reset()
+                self._open_journal()
                 # skip jobs until the restart
                 for job_n, job in islice(enumerate(self.jobs, 1), self.restart, None):
-                    self._run_job(job_n, job)
-                    # We do a dump of the run log after each job.
-                    dumpfn(self.run_log, Custodian.LOG_FILE, cls=MontyEncoder, indent=4)
+                    try:
+                        self._run_job(job_n, job)
+                    finally:
+                        self._dump_profile(job_n)
+                    # The run log is journaled after each job, and only
+                    # written in full at the end of the run.
+                    self._sync_journal()
+                    self._write_metrics()
                     # Checkpoint after each job so that we can recover from last
                     # point and remove old checkpoints
                     if self.checkpoint:
                         self.restart = job_n
                         Custodian._save_checkpoint(cwd, job_n)
             except CustodianError as ex:
+                init_sentry()
                 logger.error(ex.message)
                 if ex.raises:
                     raise
             finally:
+                self._stop_sampler()
+                if self._profiler is not None:
+                    self._profiler.close()
                 # Log the corrections to a json file.
                 logger.info("Logging to {}...".format(Custodian.LOG_FILE))
-                dumpfn(self.run_log, Custodian.LOG_FILE, cls=MontyEncoder, indent=4)
+                self._compact_journal()
+                self._write_metrics()
                 end = datetime.datetime.now()
                 logger.info("Run ended at {}.".format(end))
                 run_time = end - start
@@ -411,6 +635,87 @@ class Custodian:
             MaxCorrectionsError: if max_errors is reached
             MaxCorrectionsPerHandlerError: if max_errors_per_handler is reached
         """
+        self._setup_job(job, job_n)
+
+        attempt = 0
+        while (
+            self.total_errors < self.max_errors
+            and self.errors_current_job < self.max_errors_per_job
+        ):
+            attempt += 1
+            p, start = self._start_attempt(job, job_n, attempt)
+            # Check for errors using the error handlers and perform
+            # corrections.
+            has_error = False
+            zero_return_code = True
+
+            # While the job is running, we use the handlers that are
+            # monitors to monitor the job.
+            if isinstance(p, subprocess.Popen):
+                try:
+                    with forward_signals():
+                        has_error = self._monitor(p)
+                except BaseException:
+                    # Jobs may run in their own process group, out of reach
+                    # of the signals interrupting Custodian.
+                    terminate_process(p)
+                    raise
+                zero_return_code = p.returncode == 0
+
+            if self._finish_attempt(job, p, start, has_error, zero_return_code):
+                return
+
+        self._raise_max_errors(job)
+
+    def _monitor(self, p):
+        """
+        Monitors a running job until it exits.
+
+        Args:
+            p (Popen): The running job.
+
+        Returns:
+            True iff errors were caught by the last check of the monitors.
+        """
+        has_error = False
+        # A terminate_func other than the default does not wait for the job
+        # to exit, so it is given some time to do so.
+        custom_terminate = self.terminate_func is not None and self.terminate_func != p.terminate
+        if self.monitors and self.event_monitoring:
+            has_error = self._monitor_events(p)
+        elif self.monitors:
+            self._start_monitor_clock()
+            while True:
+                time.sleep(self.polling_time_step)
+                if p.poll() is not None:
+                    break
+                due = self._due_monitors()
+                if due:
+                    has_error = self._do_check(due, self._terminator(p))
+                if custom_terminate:
+                    time.sleep(self.polling_time_step)
+                elif has_error and p.poll() is not None:
+                    # Terminated and confirmed gone: restart right away.
+                    break
+        else:
+            p.wait()
+            if custom_terminate:
+                self.terminate_func()
+                time.sleep(self.polling_time_step)
+        return has_error
+
+    def _terminator(self, p):
+        """
+        Returns the function terminating a running job, i.e., terminate_func
+        if set, or else a function terminating the process of the job, along
+        with its process group if it leads one, and waiting for them to exit.
+        """
+        return self.terminate_func or partial(terminate_process, p)
+
+    def _setup_job(self, job, job_n):
+        """
+        Adds a job to the run log and sets it up.
+        """
         self.run_log.append(
             {
                 "job": job.as_dict(),
@@ -428,57 +733,73 @@ class Custodian:
         # applied for each handler
         for h in self.handlers:
             h.n_applied_corrections = 0
+        self.parse_cache.reset_stats()
+        self.backup_metrics.reset()
+        metrics = self.run_log[-1]["metrics"] = {
+            "ncores": self._job_ncores(job),
+            "setup_time": 0.0,
+            "run_times": [],
+            "postprocess_time": 0.0,
+            "core_hours_lost": 0.0,
+            "backups": self.backup_metrics.stats(),
+        }
+
+        start = time.perf_counter()
+        with self._profiled("setup"), self._bound():
+            job.setup()
+        metrics["setup_time"] = time.perf_counter() - start
 
-        job.setup()
-
-        attempt = 0
-        while (
-            self.total_errors < self.max_errors
-            and self.errors_current_job < self.max_errors_per_job
-        ):
-            attempt += 1
-            logger.info(
-                "Starting job no. {} ({}) attempt no. {}. Total errors and "
-                "errors in job thus far = {}, {}.".format(
-                    job_n, job.name, attempt, self.total_errors, self.errors_current_job
-                )
+    def _start_attempt(self, job, job_n, attempt):
+        """
+        Starts an attempt at running a job. Returns the result of Job.run
+        and the start time of the attempt.
+        """
+        logger.info(
+            "Starting job no. {} ({}) attempt no. {}. Total errors and "
+            "errors in job thus far = {}, {}.".format(
+                job_n, job.name, attempt, self.total_errors, self.errors_current_job
             )
+        )
 
+        # Handlers that follow output files incrementally have to start
+        # over, since the output of the previous attempt is overwritten.
+        # A handler whose check is still running from the previous attempt
+        # is only reset once that check returns, and its result discarded.
+        for h in self.handlers:
+            pending = self._pending_checks.get(id(h))
+            if pending is not None and not pending[0].done():
+                self._stale_checks.add(id(h))
+                continue
+            self._pending_checks.pop(id(h), None)
+            self._stalled_checks.discard(id(h))
+            self._stale_checks.discard(id(h))
+            h.reset()
+
+        start = time.perf_counter()
+        with self._profiled("run"):
             p = job.run()
-            # Check for errors using the error handlers and perform
-            # corrections.
-            has_error = False
-            zero_return_code = True
-
-            # While the job is running, we use the handlers that are
-            # monitors to monitor the job.
-            if isinstance(p, subprocess.Popen):
-                if self.monitors:
-                    n = 0
-                    while True:
-                        n += 1
-                        time.sleep(self.polling_time_step)
-                        if p.poll() is not None:
-                            break
-                        terminate = self.terminate_func or p.terminate
-                        if n % self.monitor_freq == 0:
-                            has_error = self._do_check(self.monitors, terminate)
-                        if terminate is not None and terminate != p.terminate:
-                            time.sleep(self.polling_time_step)
-                else:
-                    p.wait()
-                    if (
-                        self.terminate_func is not None
-                        and self.terminate_func != p.terminate
-                    ):
-                        self.terminate_func()
-                        time.sleep(self.polling_time_step)
-
-                zero_return_code = p.returncode == 0
+        if self.resource_sampling and isinstance(p, subprocess.Popen):
+            self._sampler = ProcessTreeSampler(p.pid, self.resource_sampling)
+            self._sampler.start()
+            for h in self.handlers:
+                h.process_sampler = self._sampler
+        return p, start
+
+    def _finish_attempt(self, job, p, start, has_error, zero_return_code):
+        """
+        Checks the handlers and validators once an attempt at running a job
+        has completed, and postprocesses the job if there is no error.
+        Returns True iff the job is done.
+        """
+        metrics = self.run_log[-1]["metrics"]
+        metrics["run_times"].append(time.perf_counter() - start)
+        self._stop_sampler()
 
-            logger.info(
-                "{}.run has completed. " "Checking remaining handlers".format(job.name)
-            )
+        logger.info(
+            "{}.run has completed. " "Checking remaining handlers".format(job.name)
+        )
+        # The final checks and the validators share parsed output files.
+        with self._bound(), self.parse_cache.scope():
             # Check for errors again, since in some cases non-monitor
             # handlers fix the problems detected by monitors
             # if an error has been found, not all handlers need to run
@@ -488,42 +809,68 @@ class Custodian:
                 has_error = self._do_check(self.handlers)
 
             if has_error:
-                # This makes sure the job is killed cleanly for certain systems.
+                # This makes sure the job is killed cleanly for certain
+                # systems, e.g., that no MPI rank outlives mpirun.
+                if isinstance(p, subprocess.Popen):
+                    terminate_process(p)
                 job.terminate()
 
             # If there are no errors detected, perform
             # postprocessing and exit.
             if not has_error:
                 for v in self.validators:
-                    if v.check():
+                    if self._validate(v):
                         self.run_log[-1]["validator"] = v
                         s = "Validation failed: {}".format(v.__class__.__name__)
                         raise ValidationError(s, True, v)
-                if not zero_return_code:
-                    if self.terminate_on_nonzero_returncode:
-                        self.run_log[-1]["nonzero_return_code"] = True
-                        s = "Job return code is %d. Terminating..." % p.returncode
-                        logger.info(s)
-                        raise ReturnCodeError(s, True)
-                    warnings.warn(
-                        "subprocess returned a non-zero return "
-                        "code. Check outputs carefully..."
-                    )
+                self.run_log[-1]["parse_cache"] = self.parse_cache.stats()
+
+        if not has_error:
+            if not zero_return_code:
+                if self.terminate_on_nonzero_returncode:
+                    self.run_log[-1]["nonzero_return_code"] = True
+                    s = "Job return code is %d. Terminating..." % p.returncode
+                    logger.info(s)
+                    raise ReturnCodeError(s, True)
+                warnings.warn(
+                    "subprocess returned a non-zero return "
+                    "code. Check outputs carefully..."
+                )
+            start = time.perf_counter()
+            with self._profiled("postprocess"), self._bound():
                 job.postprocess()
-                return
-
-            # Check that all errors could be handled
-            for x in self.run_log[-1]["corrections"]:
-                if not x["actions"] and x["handler"].raises_runtime_error:
-                    self.run_log[-1]["handler"] = x["handler"]
-                    s = "Unrecoverable error for handler: {}".format(x["handler"])
-                    raise NonRecoverableError(s, True, x["handler"])
-            for x in self.run_log[-1]["corrections"]:
-                if not x["actions"]:
-                    self.run_log[-1]["handler"] = x["handler"]
-                    s = "Unrecoverable error for handler: %s" % x["handler"]
-                    raise NonRecoverableError(s, False, x["handler"])
+            metrics["postprocess_time"] = time.perf_counter() - start
+            return True
+
+        metrics["core_hours_lost"] += metrics["run_times"][-1] * metrics["ncores"] / 3600
+
+        # Check that all errors could be handled
+        for x in self.run_log[-1]["corrections"]:
+            if not x["actions"] and x["handler"].raises_runtime_error:
+                self.run_log[-1]["handler"] = x["handler"]
+                s = "Unrecoverable error for handler: {}".format(x["handler"])
+                raise NonRecoverableError(s, True, x["handler"])
+        for x in self.run_log[-1]["corrections"]:
+            if not x["actions"]:
+                self.run_log[-1]["handler"] = x["handler"]
+                s = "Unrecoverable error for handler: %s" % x["handler"]
+                raise NonRecoverableError(s, False, x["handler"])
+        return False
+
+    def _stop_sampler(self):
+        """
+        Stops sampling the resources used by the job, if needed, and adds
+        the samples to the run log.
+        """
+        if self._sampler is not None:
+            self._sampler.stop()
+            self.run_log[-1].setdefault("resources", []).append(self._sampler.samples)
+            self._sampler = None
 
+    def _raise_max_errors(self, job):
+        """
+        Raises the error for the maximum number of errors that was reached.
+        """
         if self.errors_current_job >= self.max_errors_per_job:
             self.run_log[-1]["max_errors_per_job"] = True
             msg = "Max errors per job reached: {}.".format(self.max_errors_per_job)
@@ -535,6 +882,305 @@ class Custodian:
         logger.info(msg)
         raise MaxCorrectionsError(msg, True, self.max_errors)
 
+    def _monitor_events(self, p):
+        """
+        Monitors a running job in event-driven mode until it exits.
+
+        Args:
+            p (Popen): The running job.
+
+        Returns:
+            True iff errors were caught by the last check of the monitors.
+        """
+        terminate = self._terminator(p)
+        watched = {}
+        for h in self.monitors:
+            for f in h.monitored_files:
+                watched.setdefault(f, []).append(h)
+        watcher = None
+        if watched:
+            try:
+                watcher = FileWatcher(list(watched))
+            except OSError as ex:
+                logger.info("File events unavailable ({}). Checking file mtimes instead.".format(ex))
+
+        def stamps():
+            d = {}
+            for f in watched:
+                try:
+                    st = os.stat(f)
+                    d[f] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    d[f] = None
+            return d
+
+        # Wake up as soon as the job exits.
+        exit_r, exit_w = os.pipe()
+
+        def wait():
+            # The write end is owned by this thread, so that it is never
+            # closed while the job is still running.
+            p.wait()
+            try:
+                os.write(exit_w, b"\0")
+            except OSError:
+                pass
+            os.close(exit_w)
+
+        waiter = threading.Thread(target=wait, daemon=True)
+        waiter.start()
+        self._start_monitor_clock()
+        last_event_check = time.time()
+        last_stamps = stamps() if watched and watcher is None else {}
+        changed = set()
+        has_error = False
+        try:
+            while True:
+                wakeup = self._next_monitor_due()
+                if changed:
+                    wakeup = min(wakeup, last_event_check + self.polling_time_step)
+                timeout = wakeup - time.time()
+                if watched and watcher is None:
+                    timeout = min(timeout, self.polling_time_step)
+                fds = [exit_r] if watcher is None else [exit_r, watcher]
+                readable = select.select(fds, [], [], max(timeout, 0))[0]
+                if exit_r in readable:
+                    break
+                if watcher is not None:
+                    if watcher in readable:
+                        changed |= watcher.read()
+                elif watched:
+                    new_stamps = stamps()
+                    changed |= {f for f in watched if new_stamps[f] != last_stamps[f]}
+                    last_stamps = new_stamps
+                now = time.time()
+                due = self._due_monitors(now)
+                if changed and now >= last_event_check + self.polling_time_step:
+                    # Output relevant to a monitor triggers its check ahead of
+                    # its interval, but not beyond its CPU budget.
+                    for h in self.monitors:
+                        if (
+                            id(h) not in {id(x) for x in due}
+                            and any(h in watched[f] for f in changed)
+                            and now >= self._monitor_checked[id(h)] + self._budget_wait(h)
+                        ):
+                            self._monitor_checked[id(h)] = now
+                            due.append(h)
+                    changed = set()
+                    last_event_check = now
+                if due:
+                    due_ids = {id(h) for h in due}
+                    handlers = [h for h in self.monitors if id(h) in due_ids]
+                    has_error = self._do_check(handlers, terminate)
+        finally:
+            if watcher is not None:
+                watcher.close()
+            os.close(exit_r)
+        return has_error
+
+    def _start_monitor_clock(self):
+        """
+        Starts the timers of all monitors at the beginning of a run.
+        """
+        now = time.time()
+        self._monitor_checked = {id(h): now for h in self.monitors}
+
+    def _budget_wait(self, h):
+        """
+        Returns the time in seconds to wait after the last check of a monitor
+        to stay within its CPU budget.
+        """
+        cost = self._check_costs.get(id(h))
+        if not h.monitor_budget or cost is None:
+            return 0
+        return cost / h.monitor_budget
+
+    def _monitor_interval(self, h):
+        """
+        Returns the time in seconds between two checks of a monitor.
+        """
+        interval = h.monitor_interval
+        if interval is None:
+            interval = self.polling_time_step * self.monitor_freq
+        return max(interval, self._budget_wait(h))
+
+    def _next_monitor_due(self):
+        """
+        Returns the earliest time at which a monitor is due to be checked.
+        """
+        return min(self._monitor_checked[id(h)] + self._monitor_interval(h) for h in self.monitors)
+
+    def _due_monitors(self, now=None):
+        """
+        Returns the monitors due to be checked, in order, and restarts their
+        timers.
+        """
+        now = time.time() if now is None else now
+        due = []
+        for h in self.monitors:
+            if now >= self._monitor_checked[id(h)] + self._monitor_interval(h):
+                self._monitor_checked[id(h)] = now
+                due.append(h)
+        return due
+
+    def _profiled(self, label):
+        """
+        Returns a context manager profiling the code it wraps under a label
+        if profiling is enabled, and doing nothing otherwise.
+        """
+        if self._profiler is None:
+            return nullcontext()
+        return self._profiler.profile(label)
+
+    def _dump_profile(self, job_n):
+        """
+        Dumps the profiles of a job and adds their summary to the run log.
+        """
+        if self._profiler is not None and self.run_log:
+            self.run_log[-1]["profile"] = self._profiler.dump("job{}".format(job_n))
+
+    def _validate(self, v):
+        """
+        Checks a validator. Returns True iff the validation failed.
+        """
+        with self._profiled("check." + v.__class__.__name__), self._bound():
+            return v.check()
+
+    def _bound(self):
+        """
+        Context manager binding the parse cache and backup metrics of this
+        Custodian to the current thread, for the handlers, validators and
+        jobs it calls.
+        """
+        return bind_metrics(self.parse_cache, self.backup_metrics)
+
+    def _timed_check(self, h):
+        """
+        Checks a handler. Returns (result, wall time, CPU time).
+        """
+        start_wall, start_cpu = time.perf_counter(), time.thread_time()
+        with self._profiled("check." + h.__class__.__name__), self._bound():
+            found = h.check()
+        return found, time.perf_counter() - start_wall, time.thread_time() - start_cpu
+
+    def _check_timeout(self, h):
+        """
+        Returns the time in seconds custodian waits for a check of a
+        handler, or None.
+        """
+        return h.check_timeout if h.check_timeout is not None else self.check_timeout
+
+    def _start_check(self, h):
+        """
+        Starts a check of a handler in a daemon thread, so that a check that
+        never returns does not prevent custodian from exiting.
+        """
+        future = Future()
+
+        def check():
+            try:
+                future.set_result(self._timed_check(h))
+            except BaseException as ex:
+                future.set_exception(ex)
+
+        self._pending_checks[id(h)] = (future, time.monotonic())
+        threading.Thread(target=check, name="custodian-check-" + h.__class__.__name__, daemon=True).start()
+
+    def _wait_check(self, h, recheck=False):
+        """
+        Waits for the check of a handler started by _start_check until its
+        deadline. If the handler is still stalled in a check that timed out
+        before, it is not waited for. A check left over from a previous
+        attempt is not waited for either, and once it returns, its result is
+        discarded and the handler reset and checked again. With recheck,
+        e.g., after a correction has been applied, the handler is checked
+        again once its current check is done.
+
+        Returns:
+            (result, wall time, CPU time) as _timed_check, or None if the
+            check timed out.
+        """
+        name = h.__class__.__name__
+        if id(h) in self._stale_checks:
+            if not self._pending_checks[id(h)][0].done():
+                logger.warning("Check of {} from a previous attempt still running. Skipping it.".format(name))
+                self._check_stats(h)["stalled"] += 1
+                return None
+            del self._pending_checks[id(h)]
+            self._stalled_checks.discard(id(h))
+            self._stale_checks.discard(id(h))
+            h.reset()
+        if id(h) not in self._pending_checks:
+            self._start_check(h)
+        future, start = self._pending_checks[id(h)]
+        if id(h) in self._stalled_checks and not future.done():
+            logger.warning("Check of {} still running. Skipping it.".format(name))
+            self._check_stats(h)["stalled"] += 1
+            return None
+        timeout = self._check_timeout(h)
+        if not wait([future], timeout=max(start + timeout - time.monotonic(), 0)).done:
+            logger.warning("Check of {} timed out after {} s.".format(name, timeout))
+            self._check_stats(h)["timeouts"] += 1
+            self._stalled_checks.add(id(h))
+            return None
+        del self._pending_checks[id(h)]
+        self._stalled_checks.discard(id(h))
+        if recheck:
+            self._start_check(h)
+            return self._wait_check(h)
+        return future.result()
+
+    @staticmethod
+    def _job_ncores(job):
+        """
+        Returns the number of cores used by a job, as declared by the job or
+        else by the batch system.
+        """
+        if job.ncores:
+            return job.ncores
+        for var in ("SLURM_NTASKS", "NSLOTS", "PBS_NP"):
+            if os.environ.get(var, "").isdigit():
+                return int(os.environ[var])
+        return 1
+
+    def _write_metrics(self):
+        """
+        Exports the metrics in the run log to metrics_file, if set.
+        """
+        if self.metrics_file:
+            write_prometheus(self.run_log, self.metrics_file)
+
+    def _check_stats(self, h):
+        """
+        Returns the record of the checks of a handler in the run log.
+        """
+        stats = self.run_log[-1].setdefault("handler_checks", {})
+        return stats.setdefault(
+            h.__class__.__name__,
+            {
+                "checks": 0,
+                "wall_time": 0.0,
+                "cpu_time": 0.0,
+                "max_wall_time": 0.0,
+                "corrections": 0,
+                "correct_time": 0.0,
+                "timeouts": 0,
+                "stalled": 0,
+                "discarded": 0,
+            },
+        )
+
+    def _record_check(self, h, wall_time, cpu_time):
+        """
+        Records the duration of a check of a handler in the run log.
+        """
+        self._check_costs[id(h)] = cpu_time
+        d = self._check_stats(h)
+        d["checks"] += 1
+        d["wall_time"] += wall_time
+        d["cpu_time"] += cpu_time
+        d["max_wall_time"] = max(d["max_wall_time"], wall_time)
+
     def run_interrupted(self):
         """
         Runs custodian in a interuppted mode, which sets up and
@@ -561,83 +1207,95 @@ class Custodian:
             logger.info("Custodian running on Python version {}".format(v))
 
             # load run log
-            if os.path.exists(Custodian.LOG_FILE):
-                self.run_log = loadfn(Custodian.LOG_FILE, cls=MontyDecoder)
+            if os.path.exists(Custodian.LOG_FILE) or os.path.exists(Custodian.JOURNAL_FILE):
+                self.run_log = Custodian._load_run_log()
+            self._open_journal()
+
+            # The setup, the checks and the postprocessing use the parse
+            # cache and backup metrics of this Custodian.
+            with self._bound():
+                if len(self.run_log) == 0:
+                    # starting up an initial job - setup input and quit
+                    job_n = 0
+                    job = self.jobs[job_n]
+                    logger.info("Setting up job no. 1 ({}) ".format(job.name))
+                    with self._profiled("setup"):
+                        job.setup()
+                    self.run_log.append(
+                        {"job": job.as_dict(), "corrections": [], "job_n": job_n}
+                    )
+                    return len(self.jobs)
+
+                # Continuing after running calculation
+                job_n = self.run_log[-1]["job_n"]
+                job = self.jobs[job_n]
+
+                # If we had to fix errors from a previous run, insert clean log
+                # dict
+                if len(self.run_log[-1]["corrections"]) > 0:
+                    logger.info("Reran {}.run due to fixable errors".format(job.name))
+
+                # check error handlers
+                logger.info("Checking error handlers for {}.run".format(job.name))
+                if self._do_check(self.handlers):
+                    logger.info("Failed validation based on error handlers")
+                    # raise an error for an unrecoverable error
+                    for x in self.run_log[-1]["corrections"]:
+                        if not x["actions"] and x["handler"].raises_runtime_error:
+                            self.run_log[-1]["handler"] = x["handler"]
+                            s = (
+                                "Unrecoverable error for handler: {}. "
+                                "Raising RuntimeError".format(x["handler"])
+                            )
+                            raise NonRecoverableError(s, True, x["handler"])
+                    logger.info("Corrected input based on error handlers")
+                    # Return with more jobs to run if recoverable error caught
+                    # and corrected for
+                    return len(self.jobs) - job_n
+
+                # check validators
+                logger.info("Checking validator for {}.run".format(job.name))
+                for v in self.validators:
+                    if self._validate(v):
+                        self.run_log[-1]["validator"] = v
+                        logger.info("Failed validation based on validator")
+                        s = "Validation failed: {}".format(v)
+                        raise ValidationError(s, True, v)
+
+                logger.info("Postprocessing for {}.run".format(job.name))
+                with self._profiled("postprocess"):
+                    job.postprocess()
 
-            if len(self.run_log) == 0:
-                # starting up an initial job - setup input and quit
-                job_n = 0
+                # IF DONE WITH ALL JOBS - DELETE ALL CHECKPOINTS AND RETURN
+                # VALIDATED
+                if len(self.jobs) == (job_n + 1):
+                    self.finished = True
+                    return 0
+
+                # Setup next job_n
+                job_n += 1
                 job = self.jobs[job_n]
-                logger.info("Setting up job no. 1 ({}) ".format(job.name))
-                job.setup()
                 self.run_log.append(
                     {"job": job.as_dict(), "corrections": [], "job_n": job_n}
                 )
-                return len(self.jobs)
-
-            # Continuing after running calculation
-            job_n = self.run_log[-1]["job_n"]
-            job = self.jobs[job_n]
-
-            # If we had to fix errors from a previous run, insert clean log
-            # dict
-            if len(self.run_log[-1]["corrections"]) > 0:
-                logger.info("Reran {}.run due to fixable errors".format(job.name))
-
-            # check error handlers
-            logger.info("Checking error handlers for {}.run".format(job.name))
-            if self._do_check(self.handlers):
-                logger.info("Failed validation based on error handlers")
-                # raise an error for an unrecoverable error
-                for x in self.run_log[-1]["corrections"]:
-                    if not x["actions"] and x["handler"].raises_runtime_error:
-                        self.run_log[-1]["handler"] = x["handler"]
-                        s = (
-                            "Unrecoverable error for handler: {}. "
-                            "Raising RuntimeError".format(x["handler"])
-                        )
-                        raise NonRecoverableError(s, True, x["handler"])
-                logger.info("Corrected input based on error handlers")
-                # Return with more jobs to run if recoverable error caught
-                # and corrected for
+                with self._profiled("setup"):
+                    job.setup()
                 return len(self.jobs) - job_n
 
-            # check validators
-            logger.info("Checking validator for {}.run".format(job.name))
-            for v in self.validators:
-                if v.check():
-                    self.run_log[-1]["validator"] = v
-                    logger.info("Failed validation based on validator")
-                    s = "Validation failed: {}".format(v)
-                    raise ValidationError(s, True, v)
-
-            logger.info("Postprocessing for {}.run".format(job.name))
-            job.postprocess()
-
-            # IF DONE WITH ALL JOBS - DELETE ALL CHECKPOINTS AND RETURN
-            # VALIDATED
-            if len(self.jobs) == (job_n + 1):
-                self.finished = True
-                return 0
-
-            # Setup next job_n
-            job_n += 1
-            job = self.jobs[job_n]
-            self.run_log.append(
-                {"job": job.as_dict(), "corrections": [], "job_n": job_n}
-            )
-            job.setup()
-            return len(self.jobs) - job_n
-
         except CustodianError as ex:
+            init_sentry()
             logger.error(ex.message)
             if ex.raises:
                 raise
 
         finally:
+            self._dump_profile(len(self.run_log))
+            if self.finished and self._profiler is not None:
+                self._profiler.close()
             # Log the corrections to a json file.
             logger.info("Logging to {}...".format(Custodian.LOG_FILE))
-            dumpfn(self.run_log, Custodian.LOG_FILE, cls=MontyEncoder, indent=4)
+            self._compact_journal()
+            self._write_metrics()
             end = datetime.datetime.now()
             logger.info("Run ended at {}.".format(end))
             run_time = end - start
@@ -649,10 +1307,134 @@ class Custodian:
         """
         checks the specified handlers. Returns True iff errors caught
         """
+        with self._bound(), self.parse_cache.scope():
+            corrections = self._check_handlers(handlers, terminate_func)
+        self.total_errors += len(corrections)
+        self.errors_current_job += len(corrections)
+        self.run_log[-1]["corrections"].extend(corrections)
+        self.run_log[-1]["parse_cache"] = self.parse_cache.stats()
+        if "metrics" in self.run_log[-1]:
+            self.run_log[-1]["metrics"]["backups"] = self.backup_metrics.stats()
+        # We log the changes to the run log after each check.
+        self._sync_journal()
+        return len(corrections) > 0
+
+    def _open_journal(self):
+        """
+        Starts the journal of the run log with its current content.
+        """
+        self._journal = open(Custodian.JOURNAL_FILE, "w")
+        self._journaled = []
+        self._sync_journal()
+
+    def _sync_journal(self):
+        """
+        Appends the changes to the run log since the last call to the journal,
+        i.e., new jobs, new corrections and the other fields of the current
+        job whose values changed, one JSON line per record.
+        """
+        journal = self._journal
+        if journal is None or journal.closed:
+            return
+        last = len(self.run_log) - 1
+        written = False
+        for i, entry in enumerate(self.run_log):
+            if i < min(len(self._journaled), last) and self._journaled[i][0] == len(entry["corrections"]):
+                continue
+            # The other fields are compared in their serialized form, so
+            # that unchanged ones, e.g. the resources of the previous
+            # attempts, are not written again.
+            fields = {k: json.dumps(v, cls=MontyEncoder) for k, v in entry.items() if k not in ("job", "corrections")}
+            if i >= len(self._journaled):
+                record = {"index": i, "entry": entry}
+            else:
+                ncorrections, journaled = self._journaled[i]
+                changed = [k for k, v in fields.items() if journaled.get(k) != v]
+                if ncorrections == len(entry["corrections"]) and not changed:
+                    continue
+                record = {
+                    "index": i,
+                    "corrections": entry["corrections"][ncorrections:],
+                    "fields": {k: entry[k] for k in changed},
+                }
+            self._journaled[i:i + 1] = [(len(entry["corrections"]), fields)]
+            journal.write(json.dumps(record, cls=MontyEncoder) + "\n")
+            written = True
+        if written:
+            journal.flush()
+            getattr(os, "fdatasync", os.fsync)(journal.fileno())
+
+    def _compact_journal(self):
+        """
+        Writes the run log to LOG_FILE and removes the journal.
+        """
+        dumpfn(self.run_log, Custodian.LOG_FILE, cls=MontyEncoder, indent=4)
+        journal = self._journal
+        if journal is not None and not journal.closed:
+            journal.close()
+            os.remove(Custodian.JOURNAL_FILE)
+
+    @staticmethod
+    def _load_run_log():
+        """
+        Loads the run log, rebuilding it from the journal of an interrupted
+        run if there is one, and from LOG_FILE otherwise.
+        """
+        if not os.path.exists(Custodian.JOURNAL_FILE):
+            return loadfn(Custodian.LOG_FILE, cls=MontyDecoder)
+        run_log = []
+        with open(Custodian.JOURNAL_FILE) as f:
+            for line in f:
+                try:
+                    record = json.loads(line, cls=MontyDecoder)
+                except ValueError:
+                    # The last line may have been cut by the interruption.
+                    break
+                if "entry" in record:
+                    del run_log[record["index"]:]
+                    run_log.append(record["entry"])
+                else:
+                    entry = run_log[record["index"]]
+                    entry["corrections"].extend(record["corrections"])
+                    entry.update(record["fields"])
+        logger.info("Rebuilt the run log from {}.".format(Custodian.JOURNAL_FILE))
+        return run_log
+
+    def _check_handlers(self, handlers, terminate_func=None):
+        """
+        Checks the handlers and applies the corrections. Returns the list of
+        corrections.
+        """
         corrections = []
+        prechecked = {}
+        deadline = {id(h) for h in handlers if self._check_timeout(h) is not None}
+        # Checks under a deadline all start at once, so that a stalled one
+        # does not delay the others.
+        for h in handlers:
+            if id(h) in deadline and id(h) not in self._pending_checks:
+                self._start_check(h)
+        others = [h for h in handlers if id(h) not in deadline]
+        if self.check_workers > 1 and len(others) > 1:
+            with ThreadPoolExecutor(max_workers=self.check_workers) as executor:
+                prechecked = {id(h): executor.submit(self._timed_check, h) for h in others}
         for h in handlers:
             try:
-                if h.check():
+                if id(h) in deadline:
+                    checked = self._wait_check(h, recheck=bool(corrections))
+                    if checked is None:
+                        continue
+                    found, wall_time, cpu_time = checked
+                elif id(h) in prechecked and not corrections:
+                    found, wall_time, cpu_time = prechecked[id(h)].result()
+                else:
+                    if id(h) in prechecked and prechecked[id(h)].exception() is None:
+                        # The concurrent check predates the corrections. Its
+                        # cost is recorded, but not its result.
+                        self._record_check(h, *prechecked[id(h)].result()[1:])
+                        self._check_stats(h)["discarded"] += 1
+                    found, wall_time, cpu_time = self._timed_check(h)
+                self._record_check(h, wall_time, cpu_time)
+                if found:
                     if (
                         h.max_num_corrections is not None
                         and h.n_applied_corrections >= h.max_num_corrections
@@ -674,7 +1456,15 @@ class Custodian:
                         terminate_func()
                         # make sure we don't terminate twice
                         terminate_func = None
-                    d = h.correct()
+                    start = time.perf_counter()
+                    with self._profiled("correct." + h.__class__.__name__):
+                        d = h.correct()
+                    stats = self._check_stats(h)
+                    stats["corrections"] += 1
+                    stats["correct_time"] += time.perf_counter() - start
+                    # Corrections rewrite input files and may remove outputs.
+                    self.parse_cache.clear()
+                    init_sentry()
                     logger.error(h.__class__.__name__, extra=d)
                     d["handler"] = h
                     corrections.append(d)
@@ -683,15 +1473,11 @@ class Custodian:
                 if not self.skip_over_errors:
                     raise
                 import traceback
+                init_sentry()
                 logger.error("Bad handler %s " % h)
                 logger.error(traceback.format_exc())
                 corrections.append({"errors": ["Bad handler %s " % h], "actions": []})
-        self.total_errors += len(corrections)
-        self.errors_current_job += len(corrections)
-        self.run_log[-1]["corrections"].extend(corrections)
-        # We do a dump of the run log after each check.
-        dumpfn(self.run_log, Custodian.LOG_FILE, cls=MontyEncoder, indent=4)
-        return len(corrections) > 0
+        return corrections
 
 
 class Job(MSONable):
@@ -737,6 +1523,15 @@ class Job(MSONable):
         """
         return self.__class__.__name__
 
+    @property
+    def ncores(self):
+        """
+        Number of cores used by the job, used to compute the core-hours lost
+        to failed attempts. Defaults to None, in which case the number of
+        tasks allocated by the batch system is assumed.
+        """
+        return None
+
 
 class ErrorHandler(MSONable):
     """
@@ -786,6 +1581,40 @@ class ErrorHandler(MSONable):
     an instance attribute from __init__.
     """
 
+    monitor_interval = None
+    monitor_budget = None
+    """
+    Scheduling of monitors while a job is running. monitor_interval is the
+    time in seconds between two checks of this monitor. If None, the
+    monitor is checked every polling_time_step x monitor_freq seconds as set
+    in Custodian. monitor_budget is the maximum fraction of the elapsed time
+    that checks of this monitor may spend on the CPU, e.g., with a budget of
+    0.01, a check that took 2 s of CPU time is not repeated for 200 s, even
+    if monitor_interval is shorter. If None, checks are not limited. Cheap
+    monitors can thus be checked often and expensive ones rarely. As for
+    max_num_corrections, these options can be overridden as class attributes
+    of the subclass or set as instance attributes from __init__.
+    """
+
+    check_timeout = None
+    """
+    Time in seconds Custodian waits for a check of this handler before
+    moving on, overriding Custodian.check_timeout. If None, the timeout of
+    the Custodian applies. Time-critical monitors can thus be given a short
+    timeout and handlers parsing large outputs a longer one. As for
+    max_num_corrections, this can be overridden as a class attribute of the
+    subclass or set as an instance attribute from __init__.
+    """
+
+    process_sampler = None
+    """
+    Sampler of the resources used by the job being run, i.e., a
+    custodian.resources.ProcessTreeSampler, if Custodian samples them (see
+    Custodian.resource_sampling), and None otherwise. Monitors can use its
+    latest sample, e.g., to catch a memory blow-up or CPU starvation before
+    the job is killed by the scheduler.
+    """
+
     @abstractmethod
     def check(self):
         """
@@ -812,6 +1641,28 @@ class ErrorHandler(MSONable):
         """
         pass
 
+    @property
+    def monitored_files(self):
+        """
+        Files whose modification should trigger a check of this monitor
+        when Custodian runs with event_monitoring=True. Monitors that only
+        look at elapsed time, for instance, need not declare any file; they
+        are still checked periodically.
+
+        Returns:
+            ([str]) Filenames. Defaults to an empty list.
+        """
+        return []
+
+    def reset(self):
+        """
+        This method is called before each run of a job, including restarts
+        after corrections. Handlers that keep track of how far they have read
+        the output files of a run should clear that state here. The default
+        implementation does nothing.
+        """
+        pass
+
     @property
     def n_applied_corrections(self):
         """
@@ -6,13 +6,12 @@ This module implements specific error handler for FEFF runs.
 
 
 import logging
-import re
 
 from pymatgen.io.feff.sets import FEFFDictSet
 
 from custodian.custodian import ErrorHandler
 from custodian.feff.interpreter import FeffModder
-from custodian.utils import backup
+from custodian.utils import backup, MessageMatcher
 
 __author__ = "Chen Zheng"
 __copyright__ = "Copyright 2012, The Materials Project"
@@ -41,6 +40,13 @@ class UnconvergedErrorHandler(ErrorHandler):
 
     is_monitor = False
 
+    _matcher = MessageMatcher(
+        {
+            "not_converged": ["Convergence not reached"],
+            "converged": ["Convergence reached"],
+        }
+    )
+
     def __init__(self, output_filename="log1.dat"):
         """
         Initializes the handler with the output file to check
@@ -61,16 +67,13 @@ class UnconvergedErrorHandler(ErrorHandler):
 
     def _notconverge_check(self):
 
-        # Process the output file and get converge information
-        not_converge_pattern = re.compile("Convergence not reached.*")
-        converge_pattern = re.compile("Convergence reached.*")
-        for _, line in enumerate(open(self.output_filename)):
-            if len(not_converge_pattern.findall(line)) > 0:
-                return True
-
-            if len(converge_pattern.findall(line)) > 0:
-                return False
-        return None
+        # Process the output file and get converge information from the
+        # first convergence message
+        with open(self.output_filename) as f:
+            hit = UnconvergedErrorHandler._matcher.first(f)
+        if hit is None:
+            return None
+        return hit[0] == "not_converged"
 
     def correct(self):
         """
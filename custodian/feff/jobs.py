@@ -5,12 +5,9 @@
 import logging
 import os
 import shutil
-import subprocess
-
-from monty.shutil import decompress_dir
 
 from custodian.custodian import Job
-from custodian.utils import backup
+from custodian.utils import backup, decompress_files, start_process
 
 logger = logging.getLogger(__name__)
 
@@ -69,7 +66,7 @@ class FeffJob(Job):
         Returns:
 
         """
-        decompress_dir(".")
+        decompress_files(sorted(FEFF_INPUT_FILES | FEFF_BACKUP_FILES))
 
         if self.backup:
             for f in FEFF_INPUT_FILES:
@@ -91,7 +88,7 @@ class FeffJob(Job):
         ) as f_err:
             # Use line buffering for stderr
             # On TSCC, need to run shell command
-            p = subprocess.Popen(self.feff_cmd, stdout=f_std, stderr=f_err, shell=True)
+            p = start_process(self.feff_cmd, stdout=f_std, stderr=f_err, shell=True)
 
         return p
 
@@ -8,8 +8,9 @@ import numpy as np
 
 from collections import Counter
 
-from custodian.utils import backup
+from custodian.utils import backup, TailReader
 from custodian.custodian import ErrorHandler
+from custodian.liveness import LivenessDetector
 
 
 """
@@ -155,12 +156,14 @@ class AimsRelaxHandler(ErrorHandler):
 
 class FrozenJobErrorHandler(ErrorHandler):
     """
-    Detects an error when the output file has not been updated in timeout seconds, no fix for that
+    Detects an error when the run has made no progress for too long, i.e., its output file has not
+    grown, within timeout seconds at most and min_timeout seconds at least depending on the time its
+    SCF iterations have taken so far (see custodian.liveness.LivenessDetector), no fix for that
     """
 
     is_monitor = True
 
-    def __init__(self, output_filename="run", timeout=3600):
+    def __init__(self, output_filename="run", timeout=3600, min_timeout=600, step_factor=10):
         """
         Initializes the handler with the output file to check.
 
@@ -168,16 +171,43 @@ class FrozenJobErrorHandler(ErrorHandler):
             output_filename (str): This is the file where the stdout
                 is being redirected. The error messages that are checked are
                 present in the stdout.
-            timeout (int): The time in seconds between checks where if there
-                is no activity on the output file, the run is considered
-                frozen. Defaults to 3600 seconds, i.e., 1 hour.
+            timeout (int): The longest time in seconds without progress
+                before the run is considered frozen. Defaults to 3600
+                seconds, i.e., 1 hour.
+            min_timeout (int): The shortest time in seconds without progress
+                before the run is considered frozen. Defaults to 600 seconds.
+            step_factor (float): The run is considered frozen after
+                step_factor times its longest recent SCF iteration without
+                progress, within min_timeout and timeout. Defaults to 10.
         """
         self.output_filename = output_filename
         self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.step_factor = step_factor
+        self._detector = LivenessDetector(output_filename, timeout, min_timeout, step_factor)
+        self._reader = TailReader(output_filename)
+        self._scf_steps = 0
+
+    def reset(self):
+        """
+        Forgets the progress of the previous run.
+        """
+        self._detector.reset()
+        self._reader.reset()
+        self._scf_steps = 0
 
     def check(self):
-        st = os.stat(self.output_filename)
-        if time.time() - st.st_mtime > self.timeout:
+        try:
+            lines = self._reader.readlines()
+            if self._reader.rewound:
+                self._scf_steps = 0
+            for line in lines:
+                if "Begin self-consistency iteration" in line and not self._reader.incomplete:
+                    self._scf_steps += 1
+            steps = self._scf_steps
+        except OSError:
+            steps = None
+        if self._detector.update(steps, self.process_sampler):
             return True
 
     def correct(self):
@@ -1,7 +1,6 @@
 # coding: utf-8
 
 from __future__ import unicode_literals, division
-import subprocess
 import os
 import shutil
 import logging
@@ -11,6 +10,7 @@ import numpy as np
 from monty.shutil import decompress_dir
 
 from custodian.custodian import Job
+from custodian.utils import start_process
 
 
 """
@@ -97,7 +97,7 @@ class AimsJob(Job):
         logger.info("Running {}".format(" ".join(cmd)))
         with open(self.output_file, 'w') as f_std, open(self.stderr_file, "w", buffering=1) as f_err:
             # use line buffering for stderr
-            p = subprocess.Popen(cmd, stdout=f_std, stderr=f_err)
+            p = start_process(cmd, stdout=f_std, stderr=f_err)
         return p
 
     def postprocess(self):
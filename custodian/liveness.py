@@ -0,0 +1,168 @@
+# coding: utf-8
+
+"""
+Detection of hung jobs from several signs of life, rather than from the
+modification time of the output file alone. A job is considered alive as
+long as it makes progress, i.e., its output grows or it completes steps
+(e.g., electronic or ionic steps), and the time it is allowed to go without
+progress adapts to the time its steps have taken so far in the current run.
+When the resources of the job are sampled, a job whose process tree has
+used no CPU time and done no I/O for a while is flagged early, since it is
+most likely stuck in a blocking call.
+"""
+
+import os
+import time
+from collections import deque
+
+
+class LivenessDetector:
+    """
+    Decides whether a job is hung from the growth of its output file, the
+    number of steps it has completed and, optionally, the CPU time and I/O
+    counters of its process tree, as sampled by a
+    custodian.resources.ProcessTreeSampler. update is meant to be called
+    periodically, e.g., from the check of a monitor.
+
+    A job is hung if it has made no progress for longer than the adaptive
+    timeout, i.e., step_factor times the longest of its recent steps, but at
+    least min_timeout and at most timeout. Until a step has been timed, the
+    timeout is used. A job is also hung if it has made no progress and its
+    process tree has been idle for min_timeout, as far as the samples of its
+    resources tell.
+    """
+
+    def __init__(self, output_filename, timeout=21600, min_timeout=600, step_factor=10, min_cpu=0.05, window=10):
+        """
+        Args:
+            output_filename (str): Output file of the job.
+            timeout (float): Longest time in seconds without progress before
+                the job is considered hung. Defaults to 21600, i.e., 6 hours.
+            min_timeout (float): Shortest time in seconds without progress
+                before the job is considered hung. Defaults to 600.
+            step_factor (float): Number of times the longest recent step the
+                job may go without progress. Defaults to 10.
+            min_cpu (float): Number of cores below which the CPU utilisation
+                of the process tree is considered idle. Defaults to 0.05.
+            window (int): Number of recent steps over which the step time is
+                estimated. Defaults to 10.
+        """
+        self.output_filename = output_filename
+        self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.step_factor = step_factor
+        self.min_cpu = min_cpu
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the progress observed so far, e.g., before a new run of the
+        job.
+        """
+        self.last_progress = None
+        self.last_active = None
+        self.reason = None
+        self._size = None
+        self._steps = None
+        self._sample = None
+        self._idle = False
+        self._step_times = deque(maxlen=self.window)
+
+    @property
+    def step_time(self):
+        """
+        Longest time in seconds taken by a recent step, or None if no step
+        has been timed yet.
+        """
+        return max(self._step_times) if self._step_times else None
+
+    @property
+    def adaptive_timeout(self):
+        """
+        Time in seconds without progress after which the job is considered
+        hung, given the steps timed so far.
+        """
+        if self.step_time is None:
+            return self.timeout
+        return min(self.timeout, max(self.min_timeout, self.step_factor * self.step_time))
+
+    def update(self, steps=None, sampler=None, now=None):
+        """
+        Records the current state of the job.
+
+        Args:
+            steps (int): Number of steps completed by the job so far, or None
+                if unknown. A decrease means that the count was restarted.
+            sampler (ProcessTreeSampler): Sampler of the resources of the job,
+                or None.
+            now (float): Current time, as returned by time.time. Defaults to
+                None, i.e., the current time.
+
+        Returns:
+            (bool) Whether the job is hung. If so, the reason attribute
+            describes why.
+        """
+        now = time.time() if now is None else now
+        try:
+            st = os.stat(self.output_filename)
+            size, mtime = st.st_size, st.st_mtime
+        except OSError:
+            size, mtime = None, None
+
+        if self.last_progress is None:
+            # Like a plain mtime check, an output file left untouched from
+            # before counts as no progress since it was last written.
+            self.last_progress = min(mtime, now) if mtime is not None else now
+            self.last_active = now
+            self._size, self._steps = size, steps
+        else:
+            progress_time, nsteps = None, 0
+            if size is not None and size != self._size:
+                progress_time, nsteps = min(mtime, now), 1
+            if steps is not None:
+                if self._steps is not None and steps > self._steps:
+                    progress_time, nsteps = now, steps - self._steps
+                elif self._steps is not None and steps < self._steps:
+                    progress_time = now
+            self._size = size
+            self._steps = steps if steps is not None else self._steps
+            if progress_time is not None and progress_time > self.last_progress:
+                if nsteps:
+                    self._step_times.append((progress_time - self.last_progress) / nsteps)
+                self.last_progress = progress_time
+                self.last_active = max(self.last_active, progress_time)
+
+        self._update_activity(sampler, now)
+
+        stalled = now - self.last_progress
+        idle = now - self.last_active
+        self.reason = None
+        if self._idle and min(stalled, idle) > self.min_timeout:
+            self.reason = "No progress for {:.0f} s and no CPU or I/O activity for {:.0f} s".format(stalled, idle)
+        elif stalled > self.adaptive_timeout:
+            self.reason = "No progress for {:.0f} s, {}".format(
+                stalled,
+                "more than {} times the step time of {:.0f} s".format(self.step_factor, self.step_time)
+                if self.step_time is not None and self.adaptive_timeout < self.timeout
+                else "the timeout is {:.0f} s".format(self.adaptive_timeout),
+            )
+        return self.reason is not None
+
+    def _update_activity(self, sampler, now):
+        """
+        Marks the job as active if its process tree has used CPU time or
+        done I/O since the sample seen at the previous update, or as idle
+        otherwise. Without a new sample, the job stays as it was.
+        """
+        sample = sampler.latest if sampler is not None else None
+        if sample is None or sample is self._sample:
+            return
+        previous, self._sample = self._sample, sample
+        if previous is None or sample["time"] <= previous["time"]:
+            return
+        cpu = (sample["cpu_time"] - previous["cpu_time"]) / (sample["time"] - previous["time"])
+        io = sample["read_bytes"] + sample["write_bytes"] - previous["read_bytes"] - previous["write_bytes"]
+        self._idle = cpu < self.min_cpu and io <= 0
+        if not self._idle:
+            self.last_active = now
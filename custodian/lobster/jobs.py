@@ -3,12 +3,12 @@
 import logging
 import os
 import shutil
-import subprocess
 
 from monty.io import zopen
 from monty.shutil import compress_file
 
 from custodian.custodian import Job
+from custodian.utils import start_process
 
 __author__ = "Janine George, Guido Petretto"
 __copyright__ = "Copyright 2020, The Materials Project"
@@ -68,7 +68,7 @@ class LobsterJob(Job):
         with zopen(self.output_file, 'w') as f_std, \
                 zopen(self.stderr_file, "w", buffering=1) as f_err:
             # use line buffering for stderr
-            p = subprocess.Popen(cmd, stdout=f_std, stderr=f_err)
+            p = start_process(cmd, stdout=f_std, stderr=f_err)
 
         return p
 
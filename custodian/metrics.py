@@ -0,0 +1,116 @@
+# coding: utf-8
+
+"""
+Export of the metrics recorded in the run log of a Custodian run, i.e., the
+durations of the job phases, the checks and corrections of each handler,
+the backups and the core-hours lost to failed attempts, in the Prometheus
+text exposition format. The files written by write_prometheus can be
+collected by the textfile collector of the Prometheus node exporter, or
+parsed directly to compare runs.
+"""
+
+import os
+
+# Name, type and help of the exported metrics.
+METRICS = [
+    ("custodian_job_phase_seconds", "gauge", "Time spent in each phase of a job."),
+    ("custodian_job_attempts", "gauge", "Number of times a job has been run."),
+    ("custodian_job_ncores", "gauge", "Number of cores used by a job."),
+    ("custodian_core_hours_lost", "gauge", "Core-hours spent in attempts that had to be corrected."),
+    ("custodian_handler_checks_total", "counter", "Number of checks of a handler."),
+    ("custodian_handler_check_seconds_total", "counter", "Time spent checking a handler."),
+    ("custodian_handler_corrections_total", "counter", "Number of corrections applied by a handler."),
+    ("custodian_handler_correct_seconds_total", "counter", "Time spent applying the corrections of a handler."),
+    ("custodian_handler_check_timeouts_total", "counter", "Number of checks of a handler that timed out."),
+    ("custodian_backups_total", "counter", "Number of backups made before corrections."),
+    ("custodian_backup_bytes_total", "counter", "Size of the backups made before corrections."),
+    ("custodian_backup_seconds_total", "counter", "Time spent making backups before corrections."),
+]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _sample(name, labels, value):
+    if not labels:
+        return "{} {}".format(name, repr(float(value)))
+    label_str = ",".join('{}="{}"'.format(k, _escape(v)) for k, v in labels.items())
+    return "{}{{{}}} {}".format(name, label_str, repr(float(value)))
+
+
+def _job_name(entry):
+    job = entry.get("job", {})
+    if isinstance(job, dict):
+        return job.get("@class", "Job")
+    return job.__class__.__name__
+
+
+def prometheus_text(run_log):
+    """
+    Formats the metrics of a run log in the Prometheus text exposition
+    format. Jobs are labelled by their class and number in the run log, and
+    handler metrics are summed over the jobs.
+
+    Args:
+        run_log ([dict]): Run log, as returned by Custodian.run.
+
+    Returns:
+        (str) Metrics.
+    """
+    samples = {name: [] for name, _, _ in METRICS}
+    handlers = {}
+    backups = {"count": 0, "bytes": 0, "time": 0.0}
+    for job_n, entry in enumerate(run_log, 1):
+        labels = {"job": _job_name(entry), "job_n": job_n}
+        metrics = entry.get("metrics")
+        if metrics:
+            for phase, value in [
+                ("setup", metrics["setup_time"]),
+                ("run", sum(metrics["run_times"])),
+                ("postprocess", metrics["postprocess_time"]),
+            ]:
+                samples["custodian_job_phase_seconds"].append((dict(labels, phase=phase), value))
+            samples["custodian_job_attempts"].append((labels, len(metrics["run_times"])))
+            samples["custodian_job_ncores"].append((labels, metrics["ncores"]))
+            samples["custodian_core_hours_lost"].append((labels, metrics["core_hours_lost"]))
+            for k in backups:
+                backups[k] += metrics["backups"][k]
+        for name, stats in entry.get("handler_checks", {}).items():
+            totals = handlers.setdefault(
+                name, {"checks": 0, "wall_time": 0.0, "corrections": 0, "correct_time": 0.0, "timeouts": 0}
+            )
+            for k in totals:
+                totals[k] += stats.get(k, 0)
+    for name, totals in sorted(handlers.items()):
+        labels = {"handler": name}
+        samples["custodian_handler_checks_total"].append((labels, totals["checks"]))
+        samples["custodian_handler_check_seconds_total"].append((labels, totals["wall_time"]))
+        samples["custodian_handler_corrections_total"].append((labels, totals["corrections"]))
+        samples["custodian_handler_correct_seconds_total"].append((labels, totals["correct_time"]))
+        samples["custodian_handler_check_timeouts_total"].append((labels, totals["timeouts"]))
+    samples["custodian_backups_total"].append(({}, backups["count"]))
+    samples["custodian_backup_bytes_total"].append(({}, backups["bytes"]))
+    samples["custodian_backup_seconds_total"].append(({}, backups["time"]))
+
+    lines = []
+    for name, metric_type, doc in METRICS:
+        lines.append("# HELP {} {}".format(name, doc))
+        lines.append("# TYPE {} {}".format(name, metric_type))
+        lines.extend(_sample(name, labels, value) for labels, value in samples[name])
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(run_log, filename):
+    """
+    Writes the metrics of a run log to a file in the Prometheus text
+    exposition format. The file is replaced atomically, so that a collector
+    never reads a partial file.
+
+    Args:
+        run_log ([dict]): Run log, as returned by Custodian.run.
+        filename (str): File to write.
+    """
+    with open(filename + ".tmp", "w") as f:
+        f.write(prometheus_text(run_log))
+    os.replace(filename + ".tmp", filename)
@@ -4,13 +4,13 @@
 This module implements basic kinds of jobs for Nwchem runs.
 """
 
-import subprocess
 import shutil
 
 from monty.io import zopen
 from monty.shutil import gzip_dir
 
 from custodian.custodian import Job
+from custodian.utils import start_process
 
 __author__ = "Shyue Ping Ong"
 __version__ = "0.1"
@@ -71,7 +71,7 @@ class NwchemJob(Job):
         Performs actual nwchem run.
         """
         with zopen(self.output_file, "w") as fout:
-            return subprocess.Popen(self.nwchem_cmd + [self.input_file], stdout=fout)
+            return start_process(self.nwchem_cmd + [self.input_file], stdout=fout)
 
     def postprocess(self):
         """
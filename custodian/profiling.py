@@ -0,0 +1,166 @@
+# coding: utf-8
+
+"""
+Opt-in profiling of the work custodian does around a job, i.e., the job
+phases and the checks and corrections of the handlers and validators.
+Each profiled call is labelled, e.g., "setup" or "check.VaspErrorHandler",
+and the calls with the same label are aggregated over a job. At the end of
+a job, the cProfile statistics of each label are dumped to a directory, to
+be inspected with pstats or snakeviz, and a summary with the top functions
+by cumulative time and, with tracemalloc, the peak memory of each label and
+the top allocations of the job is returned for the run log.
+"""
+
+import cProfile
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Profiler:
+    """
+    Profiles labelled calls with cProfile and/or tracemalloc. Calls can be
+    profiled concurrently from several threads, e.g., the checks run with
+    Custodian(check_workers=...).
+    """
+
+    def __init__(self, directory="custodian_profiles", cprofile=True, tracemalloc=False, top=10):
+        """
+        Args:
+            directory (str): Directory to which the profiles are dumped.
+                Defaults to "custodian_profiles".
+            cprofile (bool): Whether calls are profiled with cProfile.
+                Defaults to True.
+            tracemalloc (bool): Whether memory allocations are traced with
+                tracemalloc. This slows down all allocations of the process
+                while enabled. Defaults to False.
+            top (int): Number of functions and allocations in the summaries.
+                Defaults to 10.
+        """
+        self.directory = directory
+        self.cprofile = cprofile
+        self.tracemalloc = tracemalloc
+        self.top = top
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the calls profiled so far, and starts tracing allocations
+        from now on if tracemalloc is enabled.
+        """
+        self._stats = {}
+        self._calls = {}
+        if self.tracemalloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(5)
+            self._snapshot = self._take_snapshot()
+
+    @contextmanager
+    def profile(self, label):
+        """
+        Context manager profiling the code it wraps under a label.
+
+        Args:
+            label (str): Label of the call.
+        """
+        profile = cProfile.Profile() if self.cprofile else None
+        if self.tracemalloc:
+            base = tracemalloc.get_traced_memory()[0]
+            # Without reset_peak (Python < 3.9), the peak is the peak since
+            # tracing started.
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+        start = time.perf_counter()
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError:
+                # Since Python 3.12, only one profiler can be active at a
+                # time, even across threads.
+                profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - base if self.tracemalloc else None
+            with self._lock:
+                calls = self._calls.setdefault(label, {"calls": 0, "time": 0.0})
+                calls["calls"] += 1
+                calls["time"] += elapsed
+                if peak is not None:
+                    calls["peak_memory"] = max(calls.get("peak_memory", 0), peak)
+                if profile is not None:
+                    if label in self._stats:
+                        self._stats[label].add(profile)
+                    else:
+                        self._stats[label] = pstats.Stats(profile)
+
+    def dump(self, prefix):
+        """
+        Dumps the cProfile statistics of each label to
+        directory/prefix.label.prof and summarizes the calls profiled since
+        the last reset, which are then forgotten.
+
+        Args:
+            prefix (str): Prefix of the dumped files, e.g., "job1".
+
+        Returns:
+            (dict) Summary with the number of calls, total time, top
+            functions by cumulative time and peak memory of each label under
+            "phases", and the top allocations under "top_allocations".
+        """
+        summary = {"phases": {}}
+        if self._stats:
+            os.makedirs(self.directory, exist_ok=True)
+        for label, calls in self._calls.items():
+            d = dict(calls)
+            if label in self._stats:
+                stats = self._stats[label]
+                stats.dump_stats(os.path.join(self.directory, "{}.{}.prof".format(prefix, label)))
+                d["top_functions"] = self._top_functions(stats)
+            summary["phases"][label] = d
+        if self.tracemalloc:
+            snapshot = self._take_snapshot()
+            summary["top_allocations"] = [
+                {
+                    "location": "{}:{}".format(diff.traceback[0].filename, diff.traceback[0].lineno),
+                    "size": diff.size_diff,
+                    "count": diff.count_diff,
+                }
+                for diff in snapshot.compare_to(self._snapshot, "lineno")[: self.top]
+            ]
+        self.reset()
+        return summary
+
+    @staticmethod
+    def _take_snapshot():
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        )
+
+    def _top_functions(self, stats):
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                "function": "{}:{}({})".format(*func),
+                "ncalls": nc,
+                "tottime": tt,
+                "cumtime": ct,
+            }
+            for func, (_, nc, tt, ct, _) in rows[: self.top]
+        ]
+
+    def close(self):
+        """
+        Stops tracing allocations.
+        """
+        if self.tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._snapshot = None
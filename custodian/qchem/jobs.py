@@ -8,12 +8,12 @@ import math
 import os
 import shutil
 import copy
-import subprocess
 import numpy as np
 from pymatgen.core import Molecule
 from pymatgen.io.qchem.inputs import QCInput
 from pymatgen.io.qchem.outputs import QCOutput, check_for_structure_changes
 from custodian.custodian import Job
+from custodian.utils import start_process
 
 __author__ = "Samuel Blau, Brandon Wood, Shyam Dwaraknath"
 __copyright__ = "Copyright 2018, The Materials Project"
@@ -135,7 +135,7 @@ class QCJob(Job):
         if os.path.exists(local_scratch):
             shutil.rmtree(local_scratch)
         qclog = open(self.qclog_file, 'w')
-        p = subprocess.Popen(self.current_command, stdout=qclog, shell=True)
+        p = start_process(self.current_command, stdout=qclog, shell=True)
         return p
 
     @classmethod
@@ -0,0 +1,184 @@
+# coding: utf-8
+
+"""
+Sampling of the resources used by a running job, i.e., by the whole tree of
+processes started by Job.run, e.g., mpirun and all the ranks it launches on
+the local host. The samples are read from /proc and are therefore only
+available on Linux.
+"""
+
+import os
+import threading
+import time
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Counters that only increase over the life of a process.
+_COUNTERS = ("cpu_time", "read_bytes", "write_bytes", "ctx_switches")
+
+
+def _read_proc(pid):
+    """
+    Reads the resource usage of a process from /proc. Returns None if the
+    process no longer exists.
+    """
+    try:
+        with open("/proc/{}/stat".format(pid)) as f:
+            # The command name may contain spaces, so the fields are read
+            # after its closing parenthesis.
+            fields = f.read().rsplit(")", 1)[1].split()
+        usage = {
+            "ppid": int(fields[1]),
+            "cpu_time": (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS,
+            "threads": int(fields[17]),
+            "rss": int(fields[21]) * _PAGE_SIZE,
+            "read_bytes": 0,
+            "write_bytes": 0,
+            "ctx_switches": 0,
+        }
+        with open("/proc/{}/status".format(pid)) as f:
+            for line in f:
+                if line.startswith(("voluntary_ctxt_switches", "nonvoluntary_ctxt_switches")):
+                    usage["ctx_switches"] += int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    try:
+        with open("/proc/{}/io".format(pid)) as f:
+            for line in f:
+                key, value = line.split(":")
+                if key in ("read_bytes", "write_bytes"):
+                    usage[key] = int(value)
+    except (OSError, ValueError):
+        # /proc/<pid>/io is not readable on some kernels.
+        pass
+    return usage
+
+
+def _children(pid):
+    """
+    Returns the pids of the children of a process.
+    """
+    children = []
+    try:
+        for tid in os.listdir("/proc/{}/task".format(pid)):
+            with open("/proc/{}/task/{}/children".format(pid, tid)) as f:
+                children.extend(int(c) for c in f.read().split())
+    except OSError:
+        return None
+    return children
+
+
+class ProcessTreeSampler:
+    """
+    Samples the resources used by a process and all its descendants: the
+    number of processes and threads, the resident memory, the CPU time and
+    utilisation, the bytes read from and written to storage, and the number
+    of context switches. Counters are cumulative over all the processes of
+    the tree since the sampler was created, including the processes that
+    have exited since.
+
+    Samples can be taken explicitly with sample, or periodically in a
+    background thread with start and stop.
+    """
+
+    def __init__(self, pid, interval=30):
+        """
+        Args:
+            pid (int): Pid of the root of the process tree, e.g., the pid of
+                the Popen returned by Job.run.
+            interval (float): Time in seconds between samples taken by the
+                background thread. Defaults to 30.
+        """
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._start = time.monotonic()
+        self._last = {}
+        self._totals = dict.fromkeys(_COUNTERS, 0.0)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def latest(self):
+        """
+        Latest sample as a dict, or None if no sample has been taken yet.
+        """
+        return self.samples[-1] if self.samples else None
+
+    def _tree(self):
+        """
+        Returns the resource usage of the processes of the tree by pid.
+        """
+        usages = {}
+        pids = [self.pid]
+        while pids:
+            pid = pids.pop()
+            usage = _read_proc(pid)
+            if usage is None:
+                continue
+            usages[pid] = usage
+            children = _children(pid)
+            if children is None:
+                # Kernels without /proc/<pid>/task/<tid>/children.
+                children = [int(p) for p in os.listdir("/proc") if p.isdigit() and int(p) not in usages]
+                children = [p for p in children if (_read_proc(p) or {}).get("ppid") == pid]
+            pids.extend(children)
+        return usages
+
+    def sample(self):
+        """
+        Takes a sample, appends it to samples and returns it.
+
+        Returns:
+            {"time": seconds since the sampler was created, "nprocs": int,
+            "threads": int, "rss": bytes, "cpu_time": seconds,
+            "cpu_percent": utilisation since the previous sample,
+            "read_bytes": int, "write_bytes": int, "ctx_switches": int}
+        """
+        with self._lock:
+            now = time.monotonic() - self._start
+            usages = self._tree()
+            previous_cpu = self._totals["cpu_time"]
+            for pid, usage in usages.items():
+                last = self._last.get(pid, dict.fromkeys(_COUNTERS, 0))
+                for k in _COUNTERS:
+                    self._totals[k] += max(usage[k] - last[k], 0)
+            self._last = usages
+            previous_time = self.samples[-1]["time"] if self.samples else 0.0
+            elapsed = now - previous_time
+            sample = {
+                "time": now,
+                "nprocs": len(usages),
+                "threads": sum(u["threads"] for u in usages.values()),
+                "rss": sum(u["rss"] for u in usages.values()),
+                "cpu_percent": 100 * (self._totals["cpu_time"] - previous_cpu) / elapsed if elapsed > 0 else 0.0,
+            }
+            sample.update({k: self._totals[k] for k in _COUNTERS})
+            for k in ("read_bytes", "write_bytes", "ctx_switches"):
+                sample[k] = int(sample[k])
+            self.samples.append(sample)
+            return sample
+
+    def start(self):
+        """
+        Starts sampling every interval seconds in a background thread.
+        """
+        self.sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="custodian-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        """
+        Stops the background thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
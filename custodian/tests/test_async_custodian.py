@@ -0,0 +1,163 @@
+# coding: utf-8
+
+import os
+import subprocess
+import time
+import unittest
+
+from monty.tempfile import ScratchDir
+
+from custodian.async_custodian import AsyncCustodian, run_many
+from custodian.custodian import ErrorHandler, Job, MaxCorrectionsPerJobError, ReturnCodeError
+from custodian.utils import backup
+
+
+class ShellJob(Job):
+    def __init__(self, cmd):
+        self.cmd = cmd
+
+    def setup(self):
+        with open("setup.txt", "w") as f:
+            f.write(os.getcwd())
+
+    def run(self):
+        return subprocess.Popen(self.cmd, shell=True)
+
+    def postprocess(self):
+        pass
+
+
+class StuckHandler(ErrorHandler):
+    """
+    Monitor catching a job stuck on a "stuck" file, which it removes.
+    """
+
+    is_monitor = True
+
+    def check(self):
+        return os.path.exists("stuck")
+
+    def correct(self):
+        os.remove("stuck")
+        return {"errors": ["stuck"], "actions": ["remove stuck"]}
+
+
+class BackupStuckHandler(StuckHandler):
+    """
+    StuckHandler backing up the "stuck" file before removing it.
+    """
+
+    def correct(self):
+        backup(["stuck"])
+        return super().correct()
+
+
+class BlockingCwdHandler(ErrorHandler):
+    """
+    Handler whose slow check records the directory it runs in.
+    """
+
+    def __init__(self):
+        self.directories = []
+
+    def check(self):
+        time.sleep(0.5)
+        self.directories.append(os.getcwd())
+        return False
+
+    def correct(self):
+        return {"errors": [], "actions": []}
+
+
+class AsyncCustodianTest(unittest.TestCase):
+    def test_run_many(self):
+        with ScratchDir("."):
+            custodians = []
+            for i in range(4):
+                os.mkdir(str(i))
+                custodians.append(
+                    AsyncCustodian(
+                        [StuckHandler()],
+                        [ShellJob("sleep 1")],
+                        directory=str(i),
+                        polling_time_step=0.1,
+                        monitor_freq=1,
+                    )
+                )
+            # The job in the last directory gets stuck until its monitor
+            # terminates it, and then succeeds.
+            with open(os.path.join("3", "stuck"), "w"):
+                pass
+            custodians[3].jobs = [ShellJob("if [ -e stuck ]; then sleep 60; fi")]
+            custodians[3].max_errors = custodians[3].max_errors_per_job = 2
+            start = time.time()
+            run_logs = run_many(custodians)
+            self.assertLess(time.time() - start, 10)
+            for i, run_log in enumerate(run_logs):
+                self.assertEqual(len(run_log[0]["corrections"]), 1 if i == 3 else 0)
+                self.assertTrue(os.path.exists(os.path.join(str(i), "custodian.json")))
+                with open(os.path.join(str(i), "setup.txt")) as f:
+                    self.assertEqual(f.read(), os.path.abspath(str(i)))
+            self.assertEqual(len(run_logs[3][0]["metrics"]["run_times"]), 2)
+            self.assertFalse(os.path.exists("custodian.json"))
+
+    def test_metrics_per_custodian(self):
+        with ScratchDir("."):
+            for d in ("stuck", "other"):
+                os.mkdir(d)
+            with open(os.path.join("stuck", "stuck"), "w"):
+                pass
+            custodians = [
+                AsyncCustodian(
+                    [BackupStuckHandler()],
+                    [ShellJob(cmd)],
+                    directory=d,
+                    polling_time_step=0.1,
+                    monitor_freq=1,
+                    max_errors=2,
+                )
+                for d, cmd in [("stuck", "if [ -e stuck ]; then sleep 60; fi"), ("other", "sleep 2")]
+            ]
+            run_logs = run_many(custodians)
+            # The backup made for one custodian is not counted by the other.
+            self.assertEqual(run_logs[0][0]["metrics"]["backups"]["count"], 1)
+            self.assertEqual(run_logs[1][0]["metrics"]["backups"]["count"], 0)
+            self.assertTrue(os.path.exists(os.path.join("stuck", "error.1.tar.gz")))
+
+    def test_errors(self):
+        with ScratchDir("."):
+            os.mkdir("other")
+            c = AsyncCustodian([], [ShellJob("exit 1")], polling_time_step=0.1)
+            other = AsyncCustodian([StuckHandler()], [ShellJob("touch stuck")], directory="other", polling_time_step=0.1)
+            run_logs = run_many([c, other])
+            self.assertIsInstance(run_logs[0], ReturnCodeError)
+            self.assertTrue(c.run_log[0]["nonzero_return_code"])
+            self.assertIsInstance(run_logs[1], MaxCorrectionsPerJobError)
+            self.assertTrue(os.path.exists(os.path.join("other", "custodian.json")))
+            self.assertRaises(ValueError, AsyncCustodian, [], [], scratch_dir="/tmp")
+
+    def test_blocking_check(self):
+        with ScratchDir("."):
+            handlers = {d: BlockingCwdHandler() for d in ("blocked", "other")}
+            for d in handlers:
+                os.mkdir(d)
+            run_many(
+                [
+                    AsyncCustodian([h], [ShellJob("sleep 1")], directory=d, polling_time_step=0.1)
+                    for d, h in handlers.items()
+                ]
+            )
+            # The slow check of one custodian never runs in the directory
+            # of the other.
+            for d, h in handlers.items():
+                self.assertTrue(h.directories)
+                self.assertEqual(set(h.directories), {os.path.abspath(d)})
+            # Abandoned checks would outlive the working directory.
+            self.assertRaises(ValueError, AsyncCustodian, [], [], check_timeout=1)
+            h = BlockingCwdHandler()
+            h.check_timeout = 1
+            self.assertRaises(ValueError, AsyncCustodian, [h], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
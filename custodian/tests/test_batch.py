@@ -0,0 +1,107 @@
+# coding: utf-8
+
+import json
+import os
+import time
+import unittest
+from unittest import mock
+
+from monty.tempfile import ScratchDir
+
+from custodian.batch import BatchRunner, BatchTask, _cpu_list, split_allocation
+from custodian.custodian import Job
+
+
+class EnvJob(Job):
+    """
+    Job recording the slice of cores it was given.
+    """
+
+    def __init__(self, duration=0.5):
+        self.duration = duration
+
+    def setup(self):
+        pass
+
+    def run(self):
+        with open("slice.json", "w") as f:
+            json.dump({k: os.environ[k] for k in ["CUSTODIAN_NCORES", "CUSTODIAN_HOST", "CUSTODIAN_CPUS"]}, f)
+        time.sleep(self.duration)
+
+    def postprocess(self):
+        pass
+
+
+class BatchRunnerTest(unittest.TestCase):
+    def test_run(self):
+        spec = {"jobs": [{"jb": "custodian.tests.test_batch.EnvJob", "params": {"duration": 1}}]}
+        with ScratchDir("."):
+            tasks = []
+            for i in range(3):
+                os.mkdir("calc{}".format(i))
+                tasks.append(BatchTask("calc{}".format(i), spec, ncores=2 if i < 2 else 3))
+            runner = BatchRunner(tasks, slots={"node01": 4}, poll_interval=0.1)
+            summary = runner.run()
+            self.assertEqual([s["returncode"] for s in summary], [0, 0, 0])
+            self.assertEqual([s["cores"] for s in summary], ["0-1", "2-3", "0-2"])
+            # The third workflow waits for cores to be freed.
+            self.assertGreaterEqual(summary[2]["start"], min(s["end"] for s in summary[:2]))
+            self.assertLess(summary[1]["start"], summary[0]["end"])
+            with open(os.path.join("calc2", "slice.json")) as f:
+                self.assertEqual(
+                    json.load(f), {"CUSTODIAN_NCORES": "3", "CUSTODIAN_HOST": "node01", "CUSTODIAN_CPUS": "0-2"}
+                )
+            self.assertEqual(summary[0]["n_corrections"], 0)
+            with open("custodian_batch.json") as f:
+                self.assertEqual(len(json.load(f)), 3)
+            self.assertRaises(ValueError, BatchRunner, [BatchTask("calc0", spec, ncores=8)], {"node01": 4})
+
+    def test_strict_order(self):
+        spec = {"jobs": [{"jb": "custodian.tests.test_batch.EnvJob", "params": {"duration": 1}}]}
+        with ScratchDir("."):
+            tasks = []
+            for i, ncores in enumerate([2, 3, 1]):
+                os.mkdir("calc{}".format(i))
+                tasks.append(BatchTask("calc{}".format(i), spec, ncores=ncores))
+            summary = BatchRunner(tasks, slots={"node01": 4}, poll_interval=0.1, backfill=False).run()
+            # The last workflow fits next to the first one, but does not
+            # start before the second one.
+            self.assertGreaterEqual(summary[2]["start"], summary[1]["start"])
+            self.assertGreaterEqual(summary[1]["start"], summary[0]["end"])
+
+    def test_interrupted(self):
+        spec = {"jobs": [{"jb": "custodian.tests.test_batch.EnvJob", "params": {"duration": 60}}]}
+        start = BatchRunner._start
+        started = []
+
+        def start_once(runner, task, host, cores):
+            if started:
+                raise KeyboardInterrupt
+            started.append(start(runner, task, host, cores)[0])
+            return started[-1], {"directory": task.directory}
+
+        with ScratchDir("."):
+            for i in range(2):
+                os.mkdir("calc{}".format(i))
+            runner = BatchRunner([BatchTask("calc{}".format(i), spec) for i in range(2)], slots={"node01": 2})
+            with mock.patch.object(BatchRunner, "_start", start_once):
+                self.assertRaises(KeyboardInterrupt, runner.run)
+            # The running workflow is terminated.
+            self.assertIsNotNone(started[0].poll())
+
+    def test_cpu_list(self):
+        self.assertEqual(_cpu_list([5, 0, 1, 2, 7, 8]), "0-2,5,7-8")
+
+    def test_split_allocation(self):
+        self.assertEqual(
+            split_allocation(3, 4, {"node01": 8, "node02": 6}),
+            [("node01", "0-3"), ("node01", "4-7"), ("node02", "0-3")],
+        )
+        self.assertIsNone(split_allocation(2, 4, {"node01": 6}))
+        # Within a workflow, its own slice is split.
+        with mock.patch.dict(os.environ, {"CUSTODIAN_HOST": "node02", "CUSTODIAN_CPUS": "8-11,16-19"}):
+            self.assertEqual(split_allocation(2, 4), [("node02", "8-11"), ("node02", "16-19")])
+
+
+if __name__ == "__main__":
+    unittest.main()
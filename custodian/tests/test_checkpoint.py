@@ -0,0 +1,60 @@
+# coding: utf-8
+
+import os
+import unittest
+
+from monty.tempfile import ScratchDir
+
+from custodian.checkpoint import CHECKPOINT_DIR, save_checkpoint, load_checkpoint, delete_checkpoints
+
+
+class CheckpointTest(unittest.TestCase):
+    def write(self, fname, content):
+        with open(fname, "w") as f:
+            f.write(content)
+
+    def read(self, fname):
+        with open(fname) as f:
+            return f.read()
+
+    def test_save_load(self):
+        with ScratchDir("."):
+            self.assertEqual(load_checkpoint("."), 0)
+            self.write("INCAR", "ISMEAR = 0")
+            self.write("WAVECAR", "wavefunctions")
+            os.mkdir("sub")
+            self.write(os.path.join("sub", "OUTCAR"), "outcar")
+            os.symlink("WAVECAR", "WAVECAR.link")
+            self.assertEqual(save_checkpoint(".", 1), {"stored": 3, "reused": 0})
+
+            # Only modified files are stored again, and blobs that are no
+            # longer referenced are removed.
+            self.write("INCAR", "ISMEAR = -5")
+            self.assertEqual(save_checkpoint(".", 2), {"stored": 1, "reused": 2})
+            blobs = [f for _, _, files in os.walk(os.path.join(CHECKPOINT_DIR, "blobs")) for f in files]
+            self.assertEqual(len(blobs), 3)
+
+            os.remove("INCAR")
+            os.remove(os.path.join("sub", "OUTCAR"))
+            os.remove("WAVECAR.link")
+            self.write("WAVECAR", "modified")
+            self.write("CHGCAR", "created after the checkpoint")
+            mtime = os.stat("WAVECAR").st_mtime_ns
+            self.assertEqual(load_checkpoint("."), 2)
+            self.assertEqual(self.read("INCAR"), "ISMEAR = -5")
+            self.assertEqual(self.read(os.path.join("sub", "OUTCAR")), "outcar")
+            self.assertEqual(self.read("WAVECAR"), "wavefunctions")
+            self.assertNotEqual(os.stat("WAVECAR").st_mtime_ns, mtime)
+            self.assertEqual(os.readlink("WAVECAR.link"), "WAVECAR")
+            self.assertEqual(self.read("CHGCAR"), "created after the checkpoint")
+
+            # Restored files match the manifest and are not stored again.
+            self.assertEqual(save_checkpoint(".", 3)["stored"], 1)
+
+            delete_checkpoints(".")
+            self.assertFalse(os.path.exists(CHECKPOINT_DIR))
+            self.assertEqual(load_checkpoint("."), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
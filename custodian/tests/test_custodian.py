@@ -9,12 +9,23 @@ from custodian.custodian import (
     MaxCorrectionsError,
     MaxCorrectionsPerJobError,
     MaxCorrectionsPerHandlerError,
+    add_sentry_tags,
+    init_sentry,
 )
 import os
 import glob
+import json
 import shutil
+import socket
 import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from unittest import mock
 import ruamel.yaml as yaml
+from monty.tempfile import ScratchDir
+from custodian.utils import get_parse_cache, start_process
 
 """
 Created on Jun 1, 2012
@@ -65,6 +76,23 @@ class ExampleJob(Job):
         return "ExampleJob{}".format(self.jobid)
 
 
+class BoundCacheJob(ExampleJob):
+    """
+    Records the ids of the parse caches that its setup and postprocessing
+    use.
+    """
+
+    def __init__(self, jobid, caches):
+        super().__init__(jobid)
+        self.caches = caches
+
+    def setup(self):
+        self.caches.append(id(get_parse_cache()))
+
+    def postprocess(self):
+        self.caches.append(id(get_parse_cache()))
+
+
 class ExampleHandler(ErrorHandler):
     def __init__(self, params):
         self.params = params
@@ -124,6 +152,116 @@ class ExampleHandler2b(ExampleHandler2):
         return {"errors": "Unrecoverable error", "actions": []}
 
 
+class WatchedFileJob(Job):
+    """
+    Writes params["content"] to watched.txt. The job keeps running after
+    writing "error", until it is terminated.
+    """
+
+    def __init__(self, params):
+        self.params = params
+
+    def setup(self):
+        pass
+
+    def run(self):
+        content = self.params["content"]
+        cmd = "rm -f watched.txt; sleep 0.2; echo {} > watched.txt; exec sleep {}".format(
+            content, 60 if content == "error" else 0
+        )
+        return subprocess.Popen(cmd, shell=True)
+
+    def postprocess(self):
+        pass
+
+
+class ProcessGroupJob(WatchedFileJob):
+    """
+    Like WatchedFileJob, but in its own process group and with a background
+    process, like the ranks of mpirun.
+    """
+
+    def run(self):
+        content = self.params["content"]
+        cmd = "sleep {0} & rm -f watched.txt; sleep 0.2; echo {1} > watched.txt; wait".format(
+            60 if content == "error" else 0, content
+        )
+        p = start_process(cmd, shell=True)
+        self.params.setdefault("pids", []).append(p.pid)
+        return p
+
+
+class WatchedFileHandler(ErrorHandler):
+    """
+    Monitor that detects an error written to watched.txt.
+    """
+
+    is_monitor = True
+
+    def __init__(self, params):
+        self.params = params
+
+    @property
+    def monitored_files(self):
+        return ["watched.txt"]
+
+    def check(self):
+        if not os.path.exists("watched.txt"):
+            return False
+        with open("watched.txt") as f:
+            return "error" in f.read()
+
+    def correct(self):
+        self.params["content"] = "ok"
+        return {"errors": "error in watched.txt", "actions": ["write ok"]}
+
+
+class SlowCheckHandler(ErrorHandler):
+    """
+    Handler with a slow check that detects params["error"].
+    """
+
+    def __init__(self, params):
+        self.params = params
+
+    def check(self):
+        time.sleep(0.2)
+        return self.params["error"]
+
+    def correct(self):
+        self.params["error"] = False
+        return {"errors": "error", "actions": ["unset error"]}
+
+
+class BlockingCheckHandler(ErrorHandler):
+    """
+    Handler whose check blocks until params["event"] is set, like a read
+    from a stalled filesystem, and then detects params["error"].
+    """
+
+    def __init__(self, params):
+        self.params = params
+
+    def check(self):
+        self.params["event"].wait()
+        return self.params["error"]
+
+    def correct(self):
+        self.params["error"] = False
+        return {"errors": "blocked", "actions": ["unset error"]}
+
+
+class RestartedBlockingCheckHandler(BlockingCheckHandler):
+    """
+    BlockingCheckHandler whose error is gone once it is reset, as for a job
+    restarted with corrected inputs.
+    """
+
+    def reset(self):
+        self.params["resets"] = self.params.get("resets", 0) + 1
+        self.params["error"] = False
+
+
 class ExampleValidator1(Validator):
     def __init__(self):
         pass
@@ -185,6 +323,14 @@ class CustodianTest(unittest.TestCase):
                 self.assertEqual(c.run_interrupted(), njobs - total_done)
                 total_done += 1
 
+    def test_run_interrupted_bound(self):
+        caches = []
+        c = Custodian([], [BoundCacheJob(0, caches), BoundCacheJob(1, caches)])
+        with ScratchDir("."):
+            self.assertEqual(c.run_interrupted(), 2)
+            self.assertEqual(c.run_interrupted(), 1)
+        self.assertEqual(caches, [id(c.parse_cache)] * 3)
+
     def test_unrecoverable(self):
         njobs = 100
         params = {"initial": 0, "total": 0}
@@ -280,6 +426,254 @@ class CustodianTest(unittest.TestCase):
         self.assertRaises(ValidationError, c.run)
         self.assertEqual(c.run_log[-1]["validator"], v)
 
+    def test_event_monitoring(self):
+        params = {"content": "error"}
+        c = Custodian(
+            [WatchedFileHandler(params)],
+            [WatchedFileJob(params)],
+            max_errors=2,
+            polling_time_step=0.1,
+            monitor_freq=1000,
+            event_monitoring=True,
+        )
+        start = time.time()
+        c.run()
+        # With polling, the monitor would only be checked after 100 s.
+        self.assertLess(time.time() - start, 30)
+        self.assertEqual(len(c.run_log[-1]["corrections"]), 1)
+        self.assertEqual(params["content"], "ok")
+        os.remove("watched.txt")
+
+    def test_monitor_interval(self):
+        params = {"content": "error"}
+        h = WatchedFileHandler(params)
+        h.monitor_interval = 0.1
+        c = Custodian(
+            [h],
+            [WatchedFileJob(params)],
+            max_errors=2,
+            polling_time_step=0.1,
+            monitor_freq=1000,
+        )
+        start = time.time()
+        c.run()
+        # With the default interval, the monitor would only be checked
+        # after 100 s.
+        self.assertLess(time.time() - start, 30)
+        self.assertEqual(len(c.run_log[-1]["corrections"]), 1)
+        self.assertEqual(params["content"], "ok")
+        checks = c.run_log[0]["handler_checks"]["WatchedFileHandler"]
+        self.assertGreaterEqual(checks["checks"], 1)
+        self.assertGreaterEqual(checks["wall_time"], checks["max_wall_time"])
+        self.assertEqual(c._monitor_interval(h), 0.1)
+        # A check costing 1 s of CPU time with a 1% budget is not repeated
+        # for 100 s.
+        h.monitor_budget = 0.01
+        c._check_costs[id(h)] = 1
+        self.assertAlmostEqual(c._monitor_interval(h), 100)
+        h.monitor_interval = None
+        h.monitor_budget = None
+        self.assertEqual(c._monitor_interval(h), 100)
+        os.remove("watched.txt")
+
+    def test_check_workers(self):
+        params = {"error": True}
+        handlers = [SlowCheckHandler(params) for i in range(4)]
+        c = Custodian(handlers, [ExitCodeJob(0)], max_errors=2, check_workers=4)
+        c.run()
+        # The first handler corrects the error, the others are checked again
+        # and find nothing to correct. Their discarded concurrent checks are
+        # counted too.
+        self.assertEqual(len(c.run_log[0]["corrections"]), 1)
+        self.assertEqual(c.run_log[0]["corrections"][0]["handler"], handlers[0])
+        self.assertEqual(handlers[0].n_applied_corrections, 1)
+        stats = c.run_log[0]["handler_checks"]["SlowCheckHandler"]
+        self.assertEqual(stats["checks"], 11)
+        self.assertEqual(stats["discarded"], 3)
+        start = time.time()
+        self.assertEqual(c._check_handlers(handlers), [])
+        self.assertLess(time.time() - start, 0.6)
+        os.remove("custodian.json")
+
+    def test_metrics(self):
+        h = SlowCheckHandler({"error": True})
+        with ScratchDir("."):
+            c = Custodian([h], [ExitCodeJob(0)], max_errors=2, metrics_file="custodian.prom")
+            c.run()
+            metrics = c.run_log[0]["metrics"]
+            self.assertEqual(len(metrics["run_times"]), 2)
+            self.assertAlmostEqual(
+                metrics["core_hours_lost"], metrics["run_times"][0] * metrics["ncores"] / 3600
+            )
+            self.assertEqual(metrics["backups"]["count"], 0)
+            stats = c.run_log[0]["handler_checks"]["SlowCheckHandler"]
+            self.assertEqual(stats["checks"], 2)
+            self.assertEqual(stats["corrections"], 1)
+            with open("custodian.prom") as f:
+                text = f.read()
+            self.assertIn('custodian_handler_corrections_total{handler="SlowCheckHandler"} 1.0', text)
+            self.assertIn('custodian_job_attempts{job="ExitCodeJob",job_n="1"} 2.0', text)
+
+    def test_profiling(self):
+        h = SlowCheckHandler({"error": True})
+        with ScratchDir("."):
+            c = Custodian(
+                [h],
+                [ExitCodeJob(0)],
+                validators=[ExampleValidator1()],
+                max_errors=2,
+                profiling={"directory": "profiles", "top": 5},
+            )
+            c.run()
+            phases = c.run_log[0]["profile"]["phases"]
+            self.assertEqual(phases["check.SlowCheckHandler"]["calls"], 2)
+            self.assertEqual(phases["correct.SlowCheckHandler"]["calls"], 1)
+            self.assertEqual(phases["run"]["calls"], 2)
+            self.assertLessEqual(len(phases["setup"]["top_functions"]), 5)
+            self.assertIn("check.ExampleValidator1", phases)
+            self.assertTrue(os.path.exists(os.path.join("profiles", "job1.check.SlowCheckHandler.prof")))
+
+    def test_profiling_tracemalloc(self):
+        with ScratchDir("."):
+            c = Custodian([], [ExitCodeJob(0)], profiling={"cprofile": False, "tracemalloc": True})
+            c.run()
+            self.assertIn("top_allocations", c.run_log[0]["profile"])
+            # Tracing is stopped at the end of the run.
+            self.assertFalse(tracemalloc.is_tracing())
+
+    def test_lazy_imports(self):
+        # Heavy dependencies are imported on first use only.
+        script = (
+            "import sys; import custodian.vasp.jobs, custodian.vasp.validators; "
+            "print(sorted({m.split('.')[0] for m in sys.modules} & {'pymatgen', 'sentry_sdk'}))"
+        )
+        env = dict(os.environ, SENTRY_DSN="https://key@sentry.invalid/1")
+        out = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), "[]")
+
+    def test_sentry_tags(self):
+        scope = mock.MagicMock()
+        with mock.patch("custodian.custodian.SENTRY_DSN", "https://key@sentry.invalid/1"), mock.patch(
+            "custodian.custodian._sentry_initialized", False
+        ), mock.patch.dict("custodian.custodian._sentry_tags", clear=True), mock.patch("sentry_sdk.init"), mock.patch(
+            "sentry_sdk.configure_scope"
+        ) as configure_scope:
+            configure_scope.return_value.__enter__.return_value = scope
+            add_sentry_tags(executable="vasp_std")
+            init_sentry()
+        tags = {call[0][0]: call[0][1] for call in scope.set_tag.call_args_list}
+        self.assertEqual(tags, {"hostname": socket.gethostname(), "executable": "vasp_std"})
+
+    def test_terminate_process_group(self):
+        params = {"content": "error"}
+        h = WatchedFileHandler(params)
+        h.monitor_interval = 0.1
+        c = Custodian([h], [ProcessGroupJob(params)], max_errors=2, polling_time_step=0.1, monitor_freq=1000)
+        start = time.time()
+        c.run()
+        self.assertLess(time.time() - start, 30)
+        self.assertEqual(len(c.run_log[-1]["corrections"]), 1)
+        # The background process of the terminated attempt is gone too.
+        self.assertRaises(ProcessLookupError, os.killpg, params["pids"][0], 0)
+        os.remove("watched.txt")
+
+    def test_check_timeout(self):
+        blocked = {"event": threading.Event(), "error": True}
+        slow = SlowCheckHandler({"error": True})
+        h = BlockingCheckHandler(blocked)
+        c = Custodian([h, slow], [ExitCodeJob(0)], max_errors=10, check_timeout=0.5)
+        c.run_log.append({"job": {"name": "job0"}, "corrections": [], "validator": None})
+        start = time.time()
+        self.assertTrue(c._do_check(c.handlers))
+        self.assertLess(time.time() - start, 5)
+        stats = c.run_log[0]["handler_checks"]
+        self.assertEqual(stats["BlockingCheckHandler"]["timeouts"], 1)
+        self.assertEqual(stats["BlockingCheckHandler"]["checks"], 0)
+        self.assertEqual(stats["SlowCheckHandler"]["corrections"], 1)
+        # The stalled handler is skipped without waiting.
+        start = time.time()
+        self.assertFalse(c._do_check(c.handlers))
+        self.assertLess(time.time() - start, 0.45)
+        self.assertEqual(stats["BlockingCheckHandler"]["stalled"], 1)
+        # Once it completes, its result is used.
+        blocked["event"].set()
+        time.sleep(0.1)
+        self.assertTrue(c._do_check([h]))
+        self.assertEqual(c.run_log[0]["corrections"][-1]["errors"], "blocked")
+        self.assertEqual(stats["BlockingCheckHandler"]["checks"], 1)
+        self.assertFalse(c._do_check([h]))
+        # Handlers can set their own timeout.
+        self.assertEqual(c._check_timeout(h), 0.5)
+        h.check_timeout = 10
+        self.assertEqual(c._check_timeout(h), 10)
+
+    def test_stalled_check_after_restart(self):
+        blocked = {"event": threading.Event(), "error": True}
+        h = RestartedBlockingCheckHandler(blocked)
+        job = ExitCodeJob(0)
+        c = Custodian([h], [job], max_errors=10, check_timeout=0.2)
+        c.run_log.append({"job": {"name": "job0"}, "corrections": [], "validator": None})
+        self.assertFalse(c._do_check(c.handlers))
+        # The handler is not reset while its check is still running.
+        p, _ = c._start_attempt(job, 1, 2)
+        p.wait()
+        self.assertNotIn("resets", blocked)
+        self.assertFalse(c._do_check(c.handlers))
+        self.assertEqual(c.run_log[0]["handler_checks"]["RestartedBlockingCheckHandler"]["stalled"], 1)
+        # Once the check returns, its result for the previous attempt is
+        # discarded, and the handler is reset and checked again.
+        blocked["event"].set()
+        time.sleep(0.1)
+        self.assertFalse(c._do_check(c.handlers))
+        self.assertEqual(blocked["resets"], 1)
+        self.assertEqual(c.run_log[0]["corrections"], [])
+
+    @unittest.skipIf(not sys.platform.startswith("linux"), "/proc is only available on Linux")
+    def test_resource_sampling(self):
+        h = SlowCheckHandler({"error": True})
+        with ScratchDir("."):
+            c = Custodian([h], [ExitCodeJob(0)], max_errors=2, resource_sampling=0.1)
+            c.run()
+        resources = c.run_log[0]["resources"]
+        self.assertEqual(len(resources), 2)
+        self.assertIn("rss", resources[0][0])
+        self.assertIs(h.process_sampler.samples, resources[1])
+
+    def test_journal(self):
+        params = {"initial": 0, "total": 0}
+        h = ExampleHandler(params)
+        c = Custodian([h], [ExampleJob(0, params)], max_errors=10)
+        with ScratchDir("."):
+            c._open_journal()
+            c.run_log.append({"job": {"name": "job0"}, "corrections": [], "validator": None})
+            for _ in range(3):
+                c._do_check([h])
+            c.run_log[-1]["validator"] = ExampleValidator1()
+            c._do_check([])
+            # Only the fields that changed are journaled again.
+            c._sync_journal()
+            with open(Custodian.JOURNAL_FILE) as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual(len(records), 4)
+            self.assertIn("validator", records[-1]["fields"])
+            self.assertNotIn("validator", records[-2]["fields"])
+            c.run_log.append({"job": {"name": "job1"}, "corrections": [], "validator": None})
+            c._do_check([h])
+            # The run is interrupted before the journal is compacted.
+            with open(Custodian.JOURNAL_FILE, "a") as f:
+                f.write('{"index": 1, "corr')
+            run_log = Custodian._load_run_log()
+            self.assertEqual(len(run_log), 2)
+            self.assertEqual(len(run_log[0]["corrections"]), 3)
+            self.assertIsInstance(run_log[0]["corrections"][0]["handler"], ExampleHandler)
+            self.assertIsInstance(run_log[0]["validator"], ExampleValidator1)
+            self.assertEqual(run_log[1]["job"], {"name": "job1"})
+            self.assertEqual(len(run_log[1]["corrections"]), 1)
+
+            c._compact_journal()
+            self.assertFalse(os.path.exists(Custodian.JOURNAL_FILE))
+            self.assertEqual(len(Custodian._load_run_log()[0]["corrections"]), 3)
+
     def test_from_spec(self):
         spec = """jobs:
 - jb: custodian.vasp.jobs.VaspJob
@@ -0,0 +1,115 @@
+# coding: utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from custodian.liveness import LivenessDetector
+
+
+class FakeSampler:
+    def __init__(self):
+        self.samples = []
+
+    @property
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def add(self, t, cpu_time, io=0):
+        self.samples.append({"time": t, "cpu_time": cpu_time, "read_bytes": 0, "write_bytes": io})
+
+
+class LivenessDetectorTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.output = os.path.join(self.scratch, "vasp.out")
+        self.write("start\n", 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.scratch)
+
+    def write(self, text, mtime):
+        with open(self.output, "a") as f:
+            f.write(text)
+        os.utime(self.output, (mtime, mtime))
+
+    def test_adaptive_timeout(self):
+        d = LivenessDetector(self.output, timeout=21600, min_timeout=60, step_factor=10)
+        self.assertFalse(d.update(steps=0, now=1000))
+        self.assertIsNone(d.step_time)
+        self.assertEqual(d.adaptive_timeout, 21600)
+        # Ten steps of 20 s each.
+        self.write("steps\n", 1200)
+        self.assertFalse(d.update(steps=10, now=1200))
+        self.assertAlmostEqual(d.step_time, 20)
+        self.assertEqual(d.adaptive_timeout, 200)
+        self.assertFalse(d.update(steps=10, now=1350))
+        self.assertTrue(d.update(steps=10, now=1450))
+        self.assertIn("step time", d.reason)
+        # Progress clears the hang, and the slow step raises the timeout.
+        self.assertFalse(d.update(steps=11, now=1460))
+        self.assertEqual(d.adaptive_timeout, 2600)
+        # Without steps, the growth of the output file is progress.
+        self.write("more\n", 1500)
+        self.assertFalse(d.update(now=1600))
+        self.assertFalse(d.update(now=1500 + 2600))
+        self.assertTrue(d.update(now=1500 + 2601))
+
+    def test_min_and_max_timeout(self):
+        d = LivenessDetector(self.output, timeout=500, min_timeout=300, step_factor=10)
+        d.update(steps=0, now=1000)
+        d.update(steps=100, now=1010)
+        self.assertEqual(d.adaptive_timeout, 300)
+        d.update(steps=101, now=1210)
+        self.assertEqual(d.adaptive_timeout, 500)
+        self.assertFalse(d.update(steps=101, now=1700))
+        self.assertTrue(d.update(steps=101, now=1711))
+
+    def test_stale_output(self):
+        d = LivenessDetector(self.output, timeout=3600)
+        self.assertTrue(d.update(now=1000 + 3601))
+        d = LivenessDetector(os.path.join(self.scratch, "missing"), timeout=3600)
+        self.assertFalse(d.update(now=1000))
+        self.assertTrue(d.update(now=1000 + 3601))
+
+    def test_restarted_steps(self):
+        d = LivenessDetector(self.output, timeout=3600, min_timeout=60)
+        d.update(steps=50, now=1000)
+        self.assertFalse(d.update(steps=2, now=3000))
+        self.assertIsNone(d.step_time)
+        self.assertFalse(d.update(steps=2, now=3000 + 3600))
+
+    def test_idle(self):
+        sampler = FakeSampler()
+        d = LivenessDetector(self.output, timeout=21600, min_timeout=300)
+        sampler.add(0, 10)
+        d.update(sampler=sampler, now=1000)
+        # Busy without progress, e.g., ranks spinning in MPI, is not idle.
+        sampler.add(200, 400)
+        self.assertFalse(d.update(sampler=sampler, now=1200))
+        sampler.add(600, 800)
+        self.assertFalse(d.update(sampler=sampler, now=1600))
+        # I/O counts as activity.
+        sampler.add(800, 800, io=100)
+        self.assertFalse(d.update(sampler=sampler, now=1800))
+        # No new sample: nothing is concluded.
+        self.assertFalse(d.update(sampler=sampler, now=2200))
+        sampler.add(1000, 800.1, io=100)
+        self.assertFalse(d.update(sampler=sampler, now=2000))
+        sampler.add(1200, 800.2, io=100)
+        self.assertTrue(d.update(sampler=sampler, now=2200))
+        self.assertIn("no CPU or I/O activity", d.reason)
+
+    def test_reset(self):
+        d = LivenessDetector(self.output, timeout=3600, min_timeout=60)
+        d.update(steps=0, now=1000)
+        d.update(steps=10, now=1100)
+        self.assertIsNotNone(d.step_time)
+        d.reset()
+        self.assertIsNone(d.step_time)
+        self.assertIsNone(d.last_progress)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# coding: utf-8
+
+import os
+import unittest
+
+from monty.tempfile import ScratchDir
+
+from custodian.metrics import prometheus_text, write_prometheus
+
+RUN_LOG = [
+    {
+        "job": {"@class": "VaspJob"},
+        "corrections": [],
+        "metrics": {
+            "ncores": 24,
+            "setup_time": 1.5,
+            "run_times": [100.0, 50.0],
+            "postprocess_time": 0.5,
+            "core_hours_lost": 100.0 * 24 / 3600,
+            "backups": {"count": 1, "bytes": 2048, "time": 0.25},
+        },
+        "handler_checks": {
+            "VaspErrorHandler": {"checks": 3, "wall_time": 0.3, "corrections": 1, "correct_time": 0.1},
+            "UnconvergedErrorHandler": {"checks": 1, "wall_time": 2.0, "timeouts": 2},
+        },
+    },
+    {
+        "job": {"@class": "VaspJob"},
+        "corrections": [],
+        "handler_checks": {"VaspErrorHandler": {"checks": 2, "wall_time": 0.2}},
+    },
+]
+
+
+class PrometheusTest(unittest.TestCase):
+    def test_prometheus_text(self):
+        lines = prometheus_text(RUN_LOG).splitlines()
+        self.assertIn("# TYPE custodian_handler_checks_total counter", lines)
+        self.assertIn('custodian_job_phase_seconds{job="VaspJob",job_n="1",phase="run"} 150.0', lines)
+        self.assertIn('custodian_job_attempts{job="VaspJob",job_n="1"} 2.0', lines)
+        self.assertIn('custodian_core_hours_lost{job="VaspJob",job_n="1"} 0.6666666666666666', lines)
+        self.assertIn('custodian_handler_checks_total{handler="VaspErrorHandler"} 5.0', lines)
+        self.assertIn('custodian_handler_corrections_total{handler="VaspErrorHandler"} 1.0', lines)
+        self.assertIn('custodian_handler_corrections_total{handler="UnconvergedErrorHandler"} 0.0', lines)
+        self.assertIn('custodian_handler_check_timeouts_total{handler="UnconvergedErrorHandler"} 2.0', lines)
+        self.assertIn("custodian_backup_bytes_total 2048.0", lines)
+        # Jobs without metrics, e.g., from run_interrupted, are skipped.
+        self.assertFalse(any('job_n="2"' in line for line in lines))
+
+    def test_escape(self):
+        run_log = [dict(RUN_LOG[0], job={"@class": 'My"Job\\'})]
+        self.assertIn('job="My\\"Job\\\\"', prometheus_text(run_log))
+
+    def test_write_prometheus(self):
+        with ScratchDir("."):
+            write_prometheus(RUN_LOG, "custodian.prom")
+            with open("custodian.prom") as f:
+                self.assertEqual(f.read(), prometheus_text(RUN_LOG))
+            self.assertFalse(os.path.exists("custodian.prom.tmp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
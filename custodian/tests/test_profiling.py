@@ -0,0 +1,60 @@
+# coding: utf-8
+
+import os
+import pstats
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from monty.tempfile import ScratchDir
+
+from custodian.profiling import Profiler
+
+
+def allocate(n):
+    return [list(range(100)) for _ in range(n)]
+
+
+class ProfilerTest(unittest.TestCase):
+    def test_cprofile(self):
+        with ScratchDir("."):
+            profiler = Profiler(directory="profiles", top=3)
+            for _ in range(2):
+                with profiler.profile("setup"):
+                    allocate(10)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                def check(n):
+                    with profiler.profile("check.Handler"):
+                        return allocate(n)
+
+                list(executor.map(check, [10, 20]))
+            summary = profiler.dump("job1")
+            self.assertEqual(sorted(summary["phases"]), ["check.Handler", "setup"])
+            setup = summary["phases"]["setup"]
+            self.assertEqual(setup["calls"], 2)
+            self.assertEqual(len(setup["top_functions"]), 3)
+            self.assertTrue(any("(allocate)" in f["function"] for f in setup["top_functions"]))
+            self.assertNotIn("top_allocations", summary)
+            stats = pstats.Stats(os.path.join("profiles", "job1.setup.prof"))
+            self.assertTrue(any(func[2] == "allocate" for func in stats.stats))
+            self.assertTrue(os.path.exists(os.path.join("profiles", "job1.check.Handler.prof")))
+            # The profiles are reset after a dump.
+            self.assertEqual(profiler.dump("job2"), {"phases": {}})
+
+    def test_tracemalloc(self):
+        profiler = Profiler(cprofile=False, tracemalloc=True)
+        try:
+            with profiler.profile("run"):
+                kept = allocate(1000)
+            summary = profiler.dump("job1")
+        finally:
+            profiler.close()
+        run = summary["phases"]["run"]
+        self.assertGreater(run["peak_memory"], 1000 * 100 * 8)
+        self.assertNotIn("top_functions", run)
+        self.assertIn(__file__ + ":", summary["top_allocations"][0]["location"])
+        self.assertGreater(summary["top_allocations"][0]["size"], 0)
+        del kept
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+# coding: utf-8
+
+import subprocess
+import sys
+import time
+import unittest
+
+from custodian.resources import ProcessTreeSampler
+
+
+@unittest.skipIf(not sys.platform.startswith("linux"), "/proc is only available on Linux")
+class ProcessTreeSamplerTest(unittest.TestCase):
+    def test_sample(self):
+        # A shell running a busy child that allocates memory and writes.
+        script = "x = bytearray(50 * 1024 * 1024)\nimport time\nt = time.time()\nwhile time.time() - t < 1: pass"
+        p = subprocess.Popen(["sh", "-c", '"{}" -c "{}"; sleep 0.2'.format(sys.executable, script)])
+        sampler = ProcessTreeSampler(p.pid, interval=0.1)
+        try:
+            sampler.start()
+            time.sleep(0.8)
+            latest = sampler.latest
+            self.assertEqual(latest["nprocs"], 2)
+            self.assertGreater(latest["rss"], 50 * 1024 * 1024)
+            self.assertGreater(latest["cpu_percent"], 50)
+            self.assertGreaterEqual(latest["threads"], 2)
+            self.assertGreater(latest["ctx_switches"], 0)
+            p.wait()
+            # The CPU time of exited processes is kept.
+            cpu_time = latest["cpu_time"]
+            final = sampler.sample()
+            self.assertEqual(final["nprocs"], 0)
+            self.assertGreaterEqual(final["cpu_time"], cpu_time)
+        finally:
+            sampler.stop()
+            p.kill()
+            p.wait()
+        self.assertGreater(len(sampler.samples), 3)
+        times = [s["time"] for s in sampler.samples]
+        self.assertEqual(times, sorted(times))
+
+
+if __name__ == "__main__":
+    unittest.main()
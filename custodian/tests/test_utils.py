@@ -0,0 +1,378 @@
+# coding: utf-8
+
+from concurrent.futures import ThreadPoolExecutor
+import bz2
+import gzip
+import os
+import signal
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from monty.tempfile import ScratchDir
+
+from custodian import utils
+from custodian.utils import (
+    BackupMetrics,
+    MessageMatcher,
+    ParseCache,
+    backup,
+    backup_metrics,
+    bind_metrics,
+    clone_file,
+    decompress_files,
+    forward_signals,
+    get_mpi_ncores,
+    get_parse_cache,
+    set_mpi_ncores,
+    start_process,
+    terminate_process,
+    _BlockWriter,
+)
+
+
+class MessageMatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.matcher = MessageMatcher(
+            {
+                "tet": ["Tetrahedron method fails", "Routine TETIRR needs special values"],
+                "tetirr": ["Routine TETIRR needs special values"],
+                "brmix": ["BRMIX: very serious problems"],
+            }
+        )
+
+    def test_findall(self):
+        lines = [
+            " running on 8 nodes\n",
+            " BRMIX: very serious problems\n",
+            "  Routine TETIRR needs special values\n",
+        ]
+        self.assertEqual(
+            self.matcher.findall(lines),
+            {
+                ("brmix", "BRMIX: very serious problems"),
+                ("tet", "Routine TETIRR needs special values"),
+                ("tetirr", "Routine TETIRR needs special values"),
+            },
+        )
+        self.assertEqual(self.matcher.findall(["all good\n"]), set())
+
+    def test_findall_blocks(self):
+        matcher = MessageMatcher({"brmix": ["BRMIX: very serious problems"]})
+        matcher.block_size = 10
+        lines = ["x" * 8, "BRMIX: very", " serious problems", "BRMIX: very serious problems"]
+        self.assertEqual(matcher.findall(lines[:3]), set())
+        self.assertEqual(matcher.findall(lines), {("brmix", "BRMIX: very serious problems")})
+
+    def test_first(self):
+        lines = ["Tetrahedron method fails (number of k-points < 4)", "BRMIX: very serious problems"]
+        self.assertEqual(self.matcher.first(lines), ("tet", "Tetrahedron method fails"))
+        self.assertEqual(self.matcher.first(lines[::-1]), ("brmix", "BRMIX: very serious problems"))
+        self.assertIsNone(self.matcher.first(["all good"]))
+
+
+class BackupTest(unittest.TestCase):
+    def setUp(self):
+        self.content = os.urandom(1000) + b"0.0 " * 100000
+
+    def write_files(self):
+        for fname in ["INCAR", "WAVECAR"]:
+            with open(fname, "wb") as f:
+                f.write(self.content)
+
+    def test_backup(self):
+        with ScratchDir("."):
+            self.write_files()
+            self.assertEqual(backup(["INCAR"]), "error.1.tar.gz")
+            self.assertEqual(backup(["INCAR", "WAV*"], level=1), "error.2.tar.gz")
+            with tarfile.open("error.2.tar.gz") as tar:
+                self.assertEqual(sorted(tar.getnames()), ["INCAR", "WAVECAR"])
+                self.assertEqual(tar.extractfile("WAVECAR").read(), self.content)
+            os.remove("error.2.tar.gz")
+            self.assertEqual(backup(["INCAR"]), "error.2.tar.gz")
+            self.assertEqual(backup(["INCAR"], codec="snapshot"), "error.3")
+            self.assertEqual(backup(["INCAR"]), "error.4.tar.gz")
+
+    def test_metrics(self):
+        with ScratchDir("."):
+            self.write_files()
+            backup_metrics.reset()
+            backup(["INCAR"])
+            backup(["INCAR", "WAVECAR"], codec="snapshot")
+            stats = backup_metrics.stats()
+            self.assertEqual(stats["count"], 2)
+            self.assertEqual(stats["bytes"], os.path.getsize("error.1.tar.gz") + 2 * len(self.content))
+            self.assertGreater(stats["time"], 0)
+
+    def test_bind_metrics(self):
+        with ScratchDir("."):
+            self.write_files()
+            backup_metrics.reset()
+            cache, metrics = ParseCache(), BackupMetrics()
+            with bind_metrics(cache, metrics):
+                self.assertIs(get_parse_cache(), cache)
+                backup(["INCAR"])
+                # Other threads keep the module's metrics.
+                thread = threading.Thread(target=backup, args=(["INCAR"],))
+                thread.start()
+                thread.join()
+            self.assertIs(get_parse_cache(), utils.parse_cache)
+            self.assertEqual(metrics.count, 1)
+            self.assertEqual(backup_metrics.count, 1)
+
+    def test_parallel(self):
+        block_size = _BlockWriter.block_size
+        _BlockWriter.block_size = 50000
+        try:
+            with ScratchDir("."):
+                self.write_files()
+                self.assertEqual(backup(["INCAR", "WAVECAR"], level=1, workers=3), "error.1.tar.gz")
+                with tarfile.open("error.1.tar.gz") as tar:
+                    self.assertEqual(tar.extractfile("WAVECAR").read(), self.content)
+        finally:
+            _BlockWriter.block_size = block_size
+
+    def test_snapshot(self):
+        with ScratchDir("."):
+            self.write_files()
+            os.mkdir("sub")
+            with open(os.path.join("sub", "OUTCAR"), "w") as f:
+                f.write("OUTCAR")
+            self.assertEqual(backup(["INCAR", "sub"], codec="snapshot"), "error.1")
+            with open(os.path.join("error.1", "INCAR"), "rb") as f:
+                self.assertEqual(f.read(), self.content)
+            self.assertTrue(os.path.exists(os.path.join("error.1", "sub", "OUTCAR")))
+            # Snapshots are not affected by files rewritten in place.
+            with open("INCAR", "w") as f:
+                f.write("ISMEAR = 0")
+            with open(os.path.join("error.1", "INCAR"), "rb") as f:
+                self.assertEqual(f.read(), self.content)
+            self.assertEqual(backup(["INCAR"]), "error.2.tar.gz")
+            self.assertRaises(ValueError, backup, ["INCAR"], codec="rar")
+
+
+class CloneFileTest(unittest.TestCase):
+    def test_clone_file(self):
+        content = os.urandom(3 * 1024 * 1024 + 7)
+        with ScratchDir("."):
+            with open("WAVECAR", "wb") as f:
+                f.write(content)
+            os.utime("WAVECAR", (1000, 1000))
+            # Reflinks, then copy_file_range, then regular copies.
+            with mock.patch.object(utils.fcntl, "ioctl", side_effect=OSError):
+                clone_file("WAVECAR", "WAVECAR.relax1")
+                with mock.patch.object(utils, "_copy_file_range", side_effect=OSError):
+                    clone_file("WAVECAR", "WAVECAR.relax2")
+                # An incomplete copy_file_range falls back to a regular copy.
+                with mock.patch.object(os, "copy_file_range", return_value=0, create=True) as m:
+                    clone_file("WAVECAR", "WAVECAR.relax4")
+                    m.assert_called_once()
+            clone_file("WAVECAR", "WAVECAR.relax3")
+            for f in ["WAVECAR.relax1", "WAVECAR.relax2", "WAVECAR.relax3", "WAVECAR.relax4"]:
+                with open(f, "rb") as fh:
+                    self.assertEqual(fh.read(), content)
+                self.assertEqual(os.path.getmtime(f), 1000)
+                self.assertEqual(os.stat(f).st_nlink, 1)
+            with open("WAVECAR", "wb") as f:
+                f.write(b"next")
+            with open("WAVECAR.relax3", "rb") as f:
+                self.assertEqual(f.read(), content)
+
+
+class DecompressFilesTest(unittest.TestCase):
+    def test_decompress_files(self):
+        with ScratchDir("."):
+            for f, opener in [("INCAR.gz", gzip.open), ("POSCAR.bz2", bz2.open), ("WAVECAR.GZ", gzip.open)]:
+                with opener(f, "wb") as fh:
+                    fh.write(f.encode())
+            with gzip.open("OUTCAR.relax1.gz", "wb") as fh:
+                fh.write(b"OUTCAR")
+            self.assertEqual(
+                sorted(decompress_files(["INCAR", "POSCAR", "KPOINTS", "WAVECAR"], workers=2)),
+                ["INCAR", "POSCAR", "WAVECAR"],
+            )
+            self.assertEqual(sorted(os.listdir(".")), ["INCAR", "OUTCAR.relax1.gz", "POSCAR", "WAVECAR"])
+            with open("WAVECAR") as f:
+                self.assertEqual(f.read(), "WAVECAR.GZ")
+
+            # A decompressed copy at least as recent is kept as is.
+            with gzip.open("INCAR.gz", "wb") as fh:
+                fh.write(b"old")
+            os.utime("INCAR.gz", (0, 0))
+            self.assertEqual(decompress_files(["INCAR"]), [])
+            self.assertTrue(os.path.exists("INCAR.gz"))
+            os.utime("INCAR", (0, 0))
+            os.utime("INCAR.gz", (1, 1))
+            self.assertEqual(decompress_files(["INCAR"]), ["INCAR"])
+            with open("INCAR") as f:
+                self.assertEqual(f.read(), "old")
+
+
+class ParseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def parser(self, filename):
+        self.calls.append(filename)
+        with open(filename) as f:
+            content = f.read()
+        if content == "corrupt":
+            raise ValueError("corrupt file")
+        return content
+
+    def test_load(self):
+        cache = ParseCache()
+        with ScratchDir("."):
+            with open("INCAR", "w") as f:
+                f.write("ISMEAR = 0")
+            # Without a scope, files are always parsed.
+            cache.load(self.parser, "INCAR")
+            cache.load(self.parser, "INCAR")
+            self.assertEqual(len(self.calls), 2)
+            with cache.scope():
+                self.assertEqual(cache.load(self.parser, "INCAR"), "ISMEAR = 0")
+                with cache.scope():
+                    self.assertEqual(cache.load(self.parser, "INCAR"), "ISMEAR = 0")
+                self.assertEqual(len(self.calls), 3)
+                self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+
+                # Rewritten files are parsed again.
+                with open("INCAR", "w") as f:
+                    f.write("ISMEAR = -5")
+                self.assertEqual(cache.load(self.parser, "INCAR"), "ISMEAR = -5")
+                cache.invalidate("INCAR")
+                cache.load(self.parser, "INCAR")
+                self.assertEqual(len(self.calls), 5)
+
+                # Failures are cached too.
+                with open("OUTCAR", "w") as f:
+                    f.write("corrupt")
+                for _ in range(2):
+                    self.assertRaises(ValueError, cache.load, self.parser, "OUTCAR")
+                self.assertEqual(len(self.calls), 6)
+            self.assertFalse(cache.active)
+            self.assertEqual(cache._cache, {})
+            cache.reset_stats()
+            self.assertEqual(cache.stats(), {"hits": 0, "misses": 0})
+
+    def test_load_threads(self):
+        def slow_parser(filename):
+            time.sleep(0.1)
+            return self.parser(filename)
+
+        cache = ParseCache()
+        with ScratchDir("."):
+            with open("INCAR", "w") as f:
+                f.write("ISMEAR = 0")
+            with cache.scope(), ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(executor.map(lambda i: cache.load(slow_parser, "INCAR"), range(8)))
+            self.assertEqual(results, ["ISMEAR = 0"] * 8)
+            # The file is parsed only once.
+            self.assertEqual(len(self.calls), 1)
+            self.assertEqual(cache.stats(), {"hits": 7, "misses": 1})
+
+    def test_load_copy(self):
+        class Parsed:
+            def __init__(self, filename):
+                self.data = {"filename": filename}
+
+        cache = ParseCache()
+        with ScratchDir("."):
+            with open("OUTCAR", "w") as f:
+                f.write("OUTCAR")
+            with cache.scope():
+                outcar = cache.load_copy(Parsed, "OUTCAR")
+                outcar.data["timings"] = [1.0]
+                # The shared object is not modified.
+                self.assertEqual(cache.load(Parsed, "OUTCAR").data, {"filename": "OUTCAR"})
+                self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+
+
+class GetMpiNcoresTest(unittest.TestCase):
+    def test_get_mpi_ncores(self):
+        self.assertEqual(get_mpi_ncores(["mpirun", "-np", "24", "vasp_std"]), 24)
+        self.assertEqual(get_mpi_ncores("srun -n 16 vasp_std"), 16)
+        self.assertEqual(get_mpi_ncores(["srun", "--ntasks=8", "vasp_std"]), 8)
+        self.assertIsNone(get_mpi_ncores(["vasp_std"]))
+
+    def test_set_mpi_ncores(self):
+        self.assertEqual(set_mpi_ncores(["mpirun", "-np", "24", "vasp_std"], 6), ["mpirun", "-np", "6", "vasp_std"])
+        self.assertEqual(set_mpi_ncores("srun -n 16 vasp_std", 4), "srun -n 4 vasp_std")
+        self.assertEqual(set_mpi_ncores(["srun", "--ntasks=8", "vasp_std"], 2), ["srun", "--ntasks=2", "vasp_std"])
+        self.assertEqual(set_mpi_ncores(["vasp_std"], 2), ["vasp_std"])
+
+
+@unittest.skipIf(not hasattr(os, "killpg"), "Process groups are POSIX only")
+class TerminateProcessTest(unittest.TestCase):
+    def test_process_group(self):
+        p = subprocess.Popen("sleep 60 & sleep 60 & wait", shell=True, start_new_session=True)
+        other = subprocess.Popen(["sleep", "60"], start_new_session=True)
+        try:
+            time.sleep(0.2)
+            self.assertTrue(terminate_process(p, timeout=5))
+            self.assertEqual(p.returncode, -signal.SIGTERM)
+            self.assertRaises(ProcessLookupError, os.killpg, p.pid, 0)
+            # Other jobs are left alone.
+            self.assertIsNone(other.poll())
+            # Terminating an exited job is a no-op.
+            self.assertTrue(terminate_process(p))
+        finally:
+            other.kill()
+            other.wait()
+
+    def test_kill(self):
+        script = "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print(1, flush=True); time.sleep(60)"
+        p = subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, start_new_session=True)
+        p.stdout.readline()
+        start = time.time()
+        self.assertTrue(terminate_process(p, timeout=0.5))
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(p.returncode, -signal.SIGKILL)
+        p.stdout.close()
+
+    def test_not_group_leader(self):
+        p = subprocess.Popen(["sleep", "60"])
+        self.assertTrue(terminate_process(p, timeout=5))
+        self.assertEqual(p.returncode, -signal.SIGTERM)
+
+    def test_start_process(self):
+        p = start_process("sleep 60 & exit 0", shell=True)
+        # The job leads a new process group in the session of custodian.
+        self.assertEqual(os.getpgid(p.pid), p.pid)
+        self.assertEqual(os.getsid(p.pid), os.getsid(0))
+        p.wait()
+        # The rest of the group of a reaped job is terminated.
+        self.assertTrue(terminate_process(p, timeout=5))
+        self.assertRaises(ProcessLookupError, os.killpg, p.pid, 0)
+
+    def test_reaped_not_group_leader(self):
+        p = subprocess.Popen(["true"])
+        p.wait()
+        with mock.patch.object(utils.os, "killpg") as killpg:
+            self.assertTrue(terminate_process(p))
+        killpg.assert_not_called()
+
+    def test_forward_signals(self):
+        received = []
+        previous = signal.signal(signal.SIGTERM, lambda signum, frame: received.append(signum))
+        p = start_process(["sleep", "60"])
+        try:
+            with forward_signals():
+                os.kill(os.getpid(), signal.SIGTERM)
+                p.wait(timeout=5)
+            self.assertEqual(p.returncode, -signal.SIGTERM)
+            # The signal is then handled as before.
+            self.assertEqual(received, [signal.SIGTERM])
+            self.assertIsNot(signal.getsignal(signal.SIGTERM), utils._forward_signal)
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+            p.kill()
+            p.wait()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,30 +4,992 @@
 Utility function and classes.
 """
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from glob import glob
+import bz2
+import copy
+import ctypes
+import ctypes.util
+import gzip
+import io
 import logging
 import os
+import re
+import shutil
+import signal
+import struct
+import subprocess
+import sys
 import tarfile
+import threading
+import time
+import weakref
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
-def backup(filenames, prefix="error"):
+
+BACKUP_EXTENSIONS = {"gz": ".tar.gz", "zst": ".tar.zst", "lz4": ".tar.lz4", "snapshot": ""}
+
+# Extensions of compressed files, as recognized by monty.shutil.decompress_file.
+_COMPRESSED_EXTENSIONS = {".gz": gzip.open, ".bz2": bz2.open, ".z": gzip.open}
+
+# ioctl request cloning a file on Linux filesystems supporting reflinks, e.g.,
+# Btrfs or XFS.
+_FICLONE = 0x40049409
+
+
+def backup(filenames, prefix="error", codec=None, level=None, workers=None):
     """
     Backup files to a tar.gz file. Used, for example, in backing up the
     files of an errored run before performing corrections.
 
+    Large files such as WAVECAR or CHGCAR make the default gzip compression
+    slow, and the defaults of codec, level and workers can therefore be set
+    for a whole run with the CUSTODIAN_BACKUP_CODEC, CUSTODIAN_BACKUP_LEVEL and
+    CUSTODIAN_BACKUP_WORKERS environment variables, which apply to the
+    backups made by all handlers.
+
     Args:
         filenames ([str]): List of files to backup. Supports wildcards, e.g.,
             *.*.
         prefix (str): prefix to the files. Defaults to error, which means a
             series of error.1.tar.gz, error.2.tar.gz, ... will be generated.
+        codec (str): "gz" (default), "zst" or "lz4" for a tarball compressed
+            with gzip, zstandard or lz4 (the last two need the zstandard and
+            lz4 packages), or "snapshot" to copy the files uncompressed into
+            a prefix.N directory. Snapshots use reflinks (copy-on-write
+            clones) where the filesystem supports them, which makes them
+            nearly free. Hard links are not used since the input and output
+            files of a run are rewritten in place, which would change the
+            backup as well.
+        level (int): Compression level. Defaults to the default of the codec,
+            i.e., 9 for gzip. Level 1 is several times faster on large
+            binary files at a modest cost in size.
+        workers (int): Number of threads compressing blocks of the tarball
+            concurrently. The result is a series of compressed frames, which
+            is a valid compressed file. Defaults to 1.
+
+    Returns:
+        (str) Name of the backup.
     """
-    num = max([0] + [int(f.split(".")[1]) for f in glob("{}.*.tar.gz".format(prefix))])
-    filename = "{}.{}.tar.gz".format(prefix, num + 1)
+    codec = codec or os.environ.get("CUSTODIAN_BACKUP_CODEC", "gz")
+    if codec not in BACKUP_EXTENSIONS:
+        raise ValueError("Unknown backup codec {}".format(codec))
+    if level is None and "CUSTODIAN_BACKUP_LEVEL" in os.environ:
+        level = int(os.environ["CUSTODIAN_BACKUP_LEVEL"])
+    workers = workers or int(os.environ.get("CUSTODIAN_BACKUP_WORKERS", 1))
+    start = time.perf_counter()
+    num = _next_backup_number(prefix)
+    filename = "{}.{}{}".format(prefix, num, BACKUP_EXTENSIONS[codec])
     logging.info("Backing up run to {}.".format(filename))
-    with tarfile.open(filename, "w:gz") as tar:
-        for fname in filenames:
-            for f in glob(fname):
+    paths = [f for fname in filenames for f in glob(fname)]
+    if codec == "snapshot":
+        os.mkdir(filename)
+        for f in paths:
+            if os.path.isdir(f):
+                for root, _, files in os.walk(f):
+                    os.makedirs(os.path.join(filename, root), exist_ok=True)
+                    for name in files:
+                        clone_file(os.path.join(root, name), os.path.join(filename, root, name))
+            else:
+                os.makedirs(os.path.dirname(os.path.join(filename, f)), exist_ok=True)
+                clone_file(f, os.path.join(filename, f))
+    elif codec == "gz" and workers == 1:
+        with tarfile.open(filename, "w:gz", compresslevel=9 if level is None else level) as tar:
+            for f in paths:
                 tar.add(f)
+    else:
+        with open(filename, "wb") as out:
+            writer = _BlockWriter(out, _block_compressor(codec, level), workers)
+            with tarfile.open(fileobj=writer, mode="w|") as tar:
+                for f in paths:
+                    tar.add(f)
+            writer.close()
+    get_backup_metrics().record(_disk_usage(filename), time.perf_counter() - start)
+    return filename
+
+
+class BackupMetrics:
+    """
+    Totals of the backups made since the last reset, i.e., their number,
+    size in bytes and the time spent writing them. Each Custodian has its
+    own, which it resets at the start of each job and records in the run
+    log.
+    """
+
+    def __init__(self):
+        """
+        Starts with zero totals.
+        """
+        self.reset()
+
+    def reset(self):
+        """
+        Resets the totals.
+        """
+        self.count = 0
+        self.bytes = 0
+        self.time = 0.0
+
+    def record(self, nbytes, elapsed):
+        """
+        Adds a backup to the totals.
+
+        Args:
+            nbytes (int): Size of the backup in bytes.
+            elapsed (float): Time in seconds taken by the backup.
+        """
+        self.count += 1
+        self.bytes += nbytes
+        self.time += elapsed
+
+    def stats(self):
+        """
+        Returns:
+            {"count": int, "bytes": int, "time": float}
+        """
+        return {"count": self.count, "bytes": self.bytes, "time": self.time}
+
+
+# Totals of the backups made outside of a Custodian, e.g., by handlers used
+# on their own.
+backup_metrics = BackupMetrics()
+
+
+def _disk_usage(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def _next_backup_number(prefix):
+    """
+    Returns the number of the next backup, i.e., one more than the largest
+    number of the existing backups, whatever their codec.
+    """
+    pattern = re.compile(r"{}\.(\d+)(\.tar\.\w+)?$".format(re.escape(prefix)))
+    nums = [int(m.group(1)) for m in map(pattern.match, glob("{}.*".format(prefix))) if m]
+    return max([0] + nums) + 1
+
+
+def clone_file(src, dst):
+    """
+    Copies a file as a reflink (a copy-on-write clone sharing the data of the
+    original) if the filesystem supports it, e.g., Btrfs or XFS. Otherwise,
+    the data are copied within the kernel with copy_file_range, which
+    filesystems may still turn into a clone (e.g., ZFS) or a server-side
+    copy (e.g., NFS 4.2), and as a regular copy as a last resort. Metadata
+    are copied as with shutil.copy2.
+
+    Hard links are never used, since VASP and the jobs rewrite their output
+    files in place, which would also modify the copy.
+
+    Args:
+        src (str): File to copy.
+        dst (str): Destination file.
+
+    Returns:
+        dst
+    """
+    if fcntl is None:
+        return shutil.copy2(src, dst)
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            except OSError:
+                _copy_file_range(fsrc.fileno(), fdst.fileno())
+        shutil.copystat(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+def _copy_file_range(fd_src, fd_dst):
+    """
+    Copies the whole content of a file to an empty file with
+    os.copy_file_range. Raises OSError if it is not supported or if the
+    copy is incomplete.
+    """
+    if not hasattr(os, "copy_file_range"):
+        raise OSError("copy_file_range is not available.")
+    size = os.fstat(fd_src).st_size
+    copied = 0
+    while copied < size:
+        n = os.copy_file_range(fd_src, fd_dst, min(size - copied, 1 << 30))
+        if n == 0:
+            # E.g. a file system on which copy_file_range copies nothing.
+            break
+        copied += n
+    if copied != size:
+        raise OSError("copy_file_range copied {} of {} bytes.".format(copied, size))
+
+
+def decompress_files(filenames, workers=None):
+    """
+    Decompresses the compressed versions of files, e.g., WAVECAR.gz or
+    WAVECAR.bz2 for WAVECAR, and removes them, as
+    monty.shutil.decompress_file. Unlike monty.shutil.decompress_dir, only
+    the given files are decompressed, several at a time, and a compressed
+    file is skipped if its decompressed copy is at least as recent.
+
+    Args:
+        filenames ([str]): Decompressed names of the files, e.g., "WAVECAR".
+        workers (int): Number of files decompressed at a time. Defaults to
+            None, i.e., the number of cores.
+
+    Returns:
+        List of the files decompressed.
+    """
+    tasks = []
+    for f in dict.fromkeys(filenames):
+        candidates = [f + e for ext in _COMPRESSED_EXTENSIONS for e in (ext, ext.upper())]
+        compressed = next((c for c in candidates if os.path.isfile(c)), None)
+        if compressed is None:
+            continue
+        if os.path.exists(f) and os.path.getmtime(f) >= os.path.getmtime(compressed):
+            logging.debug("{} is up to date with {}.".format(f, compressed))
+            continue
+        tasks.append((compressed, f))
+    if len(tasks) > 1 and workers != 1:
+        # zlib and bz2 release the GIL, so that threads decompress in parallel.
+        with ThreadPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(tasks))) as executor:
+            list(executor.map(lambda t: _decompress_file(*t), tasks))
+    else:
+        for t in tasks:
+            _decompress_file(*t)
+    return [f for _, f in tasks]
+
+
+def _decompress_file(compressed, dest):
+    """
+    Decompresses a file to dest and removes it. dest is replaced atomically,
+    so that an interrupted decompression never leaves a truncated file.
+    """
+    opener = _COMPRESSED_EXTENSIONS[os.path.splitext(compressed)[1].lower()]
+    tmp = "{}.{}.tmp".format(dest, os.getpid())
+    try:
+        with opener(compressed, "rb") as f_in, open(tmp, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, 1 << 20)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    os.remove(compressed)
+
+
+def _block_compressor(codec, level):
+    """
+    Returns a function compressing a block of bytes into a standalone frame.
+    """
+    if codec == "gz":
+        level = 9 if level is None else level
+
+        def compress(block):
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=level, mtime=0) as f:
+                f.write(block)
+            return buf.getvalue()
+
+        return compress
+    if codec == "zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zst backups require the zstandard package.")
+        level = 3 if level is None else level
+        return lambda block: zstandard.ZstdCompressor(level=level).compress(block)
+    try:
+        import lz4.frame
+    except ImportError:
+        raise ImportError("lz4 backups require the lz4 package.")
+    level = 0 if level is None else level
+    return lambda block: lz4.frame.compress(block, compression_level=level)
+
+
+class _BlockWriter:
+    """
+    File-like object compressing what is written to it in blocks, in a pool
+    of threads, and writing the compressed blocks in order to a file.
+    """
+
+    block_size = 16 * 1024 * 1024
+
+    def __init__(self, fileobj, compress, workers):
+        self._fileobj = fileobj
+        self._compress = compress
+        self._workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending = deque()
+        self._buffer = []
+        self._size = 0
+
+    def write(self, data):
+        self._buffer.append(bytes(data))
+        self._size += len(data)
+        if self._size >= self.block_size:
+            self._submit()
+        return len(data)
+
+    def _submit(self):
+        block = b"".join(self._buffer)
+        self._buffer = []
+        self._size = 0
+        self._pending.append(self._executor.submit(self._compress, block))
+        # Bound the memory used by blocks waiting to be written.
+        while len(self._pending) > 2 * self._workers:
+            self._fileobj.write(self._pending.popleft().result())
+
+    def close(self):
+        if self._buffer:
+            self._submit()
+        while self._pending:
+            self._fileobj.write(self._pending.popleft().result())
+        self._executor.shutdown()
+
+
+class TailReader:
+    """
+    Incrementally reads the lines appended to a file. The byte offset and
+    inode of the file are remembered between calls, so that each call to
+    readlines only returns lines written since the previous call. If the file
+    has been truncated or replaced in the meantime (e.g., a job has been
+    restarted and its output rewritten), reading starts again from the
+    beginning of the file.
+    """
+
+    def __init__(self, filename, offset=0, inode=None):
+        """
+        Args:
+            filename (str): File to follow.
+            offset (int): Byte offset to resume reading from. Defaults to 0.
+            inode (int): Inode of the file the offset refers to. Defaults to
+                None, i.e., unknown.
+        """
+        self.filename = filename
+        self.offset = offset
+        self.inode = inode
+        self.rewound = False
+        self.incomplete = False
+
+    def reset(self):
+        """
+        Forget the read position so that the next call to readlines starts
+        from the beginning of the file.
+        """
+        self.offset = 0
+        self.inode = None
+
+    def readlines(self):
+        """
+        Returns the lines appended to the file since the last call. A trailing
+        line that is still being written (no newline yet) is returned as well,
+        but is read again on the next call once it is complete.
+
+        After this method returns, the rewound attribute indicates whether the
+        file was found truncated or replaced, i.e., whether previous results
+        derived from it are stale. Once a line has been yielded, the
+        incomplete attribute indicates whether it was such a trailing line.
+
+        Returns:
+            Generator of str lines, without line endings.
+        """
+        st = os.stat(self.filename)
+        self.rewound = (self.inode is not None and st.st_ino != self.inode) or st.st_size < self.offset
+        if self.rewound:
+            self.offset = 0
+        self.inode = st.st_ino
+        self.incomplete = False
+        return self._read_from(self.offset)
+
+    def _read_from(self, offset):
+        with open(self.filename, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                self.incomplete = not line.endswith(b"\n")
+                if not self.incomplete:
+                    self.offset += len(line)
+                yield line.decode("utf-8", "replace").rstrip("\r\n")
+
+    def as_dict(self):
+        """
+        Returns:
+            JSON serializable dict of the read position.
+        """
+        return {"filename": self.filename, "offset": self.offset, "inode": self.inode}
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Args:
+            d (dict): Dict representation from as_dict.
+
+        Returns:
+            TailReader
+        """
+        return cls(d["filename"], offset=d.get("offset", 0), inode=d.get("inode"))
+
+
+class MessageMatcher:
+    """
+    Matches a table of error messages against the lines of an output file.
+    This is meant to be built once per handler class from its message table,
+    e.g., {"brmix": ["BRMIX: very serious problems"], ...}, and then used to
+    scan output files for all messages at once instead of looping over every
+    message for every line.
+
+    Lines are scanned in large blocks. Since messages never span several
+    lines, a message is found in a block iff it is found in one of its lines.
+    Looking up each message in a whole block is done at C speed and is much
+    faster than a per-line loop, or even a compiled alternation of all
+    messages, which is only used to locate the earliest match.
+    """
+
+    block_size = 4 * 1024 * 1024
+
+    def __init__(self, messages):
+        """
+        Args:
+            messages (dict): Dict of {error: [msg, ...]}, where each msg is a
+                literal string to look for.
+        """
+        self.messages = messages
+        self._pairs = [(err, msg) for err, msgs in messages.items() for msg in msgs]
+        # Longer messages come first so that a message that contains another
+        # one wins when both start at the same position.
+        alternatives = sorted({msg for _, msg in self._pairs}, key=len, reverse=True)
+        self._regex = re.compile("|".join(re.escape(msg) for msg in alternatives))
+        self._errors_by_msg = {}
+        for err, msg in self._pairs:
+            self._errors_by_msg.setdefault(msg, []).append(err)
+
+    def _blocks(self, lines):
+        block = []
+        size = 0
+        for line in lines:
+            block.append(line)
+            size += len(line)
+            if size >= self.block_size:
+                yield "\n".join(block)
+                block = []
+                size = 0
+        if block:
+            yield "\n".join(block)
+
+    def findall(self, lines):
+        """
+        Finds all messages occurring in the lines.
+
+        Args:
+            lines (iterable): Lines of text, e.g., an open file.
+
+        Returns:
+            Set of (error, msg) tuples that were found.
+        """
+        found = set()
+        for block in self._blocks(lines):
+            for pair in self._pairs:
+                if pair not in found and pair[1] in block:
+                    found.add(pair)
+        return found
+
+    def first(self, lines):
+        """
+        Finds the message that occurs first in the lines.
+
+        Args:
+            lines (iterable): Lines of text, e.g., an open file.
+
+        Returns:
+            (error, msg) tuple of the earliest match, or None if no message
+            occurs. If a message belongs to several errors, the first one in
+            the table is returned.
+        """
+        for block in self._blocks(lines):
+            m = self._regex.search(block)
+            if m:
+                return self._errors_by_msg[m.group(0)][0], m.group(0)
+        return None
+
+
+class ParseCache:
+    """
+    Cache of parsed output files shared by the handlers and validators during
+    a check. Several handlers typically parse the same files, e.g., INCAR,
+    OUTCAR or vasprun.xml, and for large runs the repeated parsing dominates
+    the time spent in a check. Within a scope, a file is parsed once per
+    parser and the result is reused as long as the file's mtime and size are
+    unchanged. Outside of a scope, load simply calls the parser, so handlers
+    behave as before when they are used on their own.
+
+    Parsed objects are shared and must be treated as read-only: handlers and
+    validators must not modify them. Those that add to a parsed object, e.g.,
+    with Outcar.read_pattern, use load_copy instead. Failed parses are cached
+    as well, so that a corrupt file is only parsed once. The cache
+    can be used from several threads, e.g., when handlers are checked
+    concurrently. A file requested by several threads at once is parsed by
+    the first one while the others wait for its result.
+    """
+
+    def __init__(self):
+        """
+        Creates an empty cache, with no scope open.
+        """
+        self._cache = {}
+        self._depth = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def active(self):
+        """
+        Whether a cache scope is currently open.
+        """
+        return self._depth > 0
+
+    @contextmanager
+    def scope(self):
+        """
+        Context manager enabling the cache. Scopes can be nested, and the
+        cache is cleared when the outermost scope exits so that parsed files
+        are not kept in memory between checks.
+        """
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.clear()
+
+    def load(self, parser, filename, **kwargs):
+        """
+        Parses a file, reusing a previous result if possible.
+
+        Args:
+            parser (callable): Called as parser(filename, **kwargs), e.g.,
+                Vasprun or Incar.from_file.
+            filename (str): File to parse.
+            **kwargs: Passed to the parser and part of the cache key.
+
+        Returns:
+            The parsed object.
+        """
+        if not self.active:
+            return parser(filename, **kwargs)
+        path = os.path.abspath(filename)
+        key = (parser, path, tuple(sorted(kwargs.items())))
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            try:
+                st = os.stat(path)
+                stamp = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                stamp = None
+            cached = self._cache.get(key)
+            if cached is not None and stamp is not None and cached[0] == stamp:
+                with self._lock:
+                    self.hits += 1
+                obj, exc = cached[1:]
+            else:
+                with self._lock:
+                    self.misses += 1
+                obj, exc = None, None
+                try:
+                    obj = parser(filename, **kwargs)
+                except Exception as e:
+                    exc = e
+                if stamp is not None:
+                    with self._lock:
+                        self._cache[key] = (stamp, obj, exc)
+        if exc is not None:
+            raise exc
+        return obj
+
+    def load_copy(self, parser, filename, **kwargs):
+        """
+        Parses a file as load, but returns a shallow copy of the parsed object
+        with its own data dict, if it has one, so that the caller may add to
+        it, e.g., with Outcar.read_pattern, without affecting the other
+        handlers.
+
+        Args:
+            parser (callable): Called as parser(filename, **kwargs).
+            filename (str): File to parse.
+            **kwargs: Passed to the parser and part of the cache key.
+
+        Returns:
+            A copy of the parsed object.
+        """
+        obj = copy.copy(self.load(parser, filename, **kwargs))
+        if isinstance(getattr(obj, "data", None), dict):
+            obj.data = dict(obj.data)
+        return obj
+
+    def invalidate(self, filename):
+        """
+        Drops the cached results for a file.
+
+        Args:
+            filename (str): File that was modified.
+        """
+        path = os.path.abspath(filename)
+        with self._lock:
+            for key in [k for k in self._cache if k[1] == path]:
+                del self._cache[key]
+
+    def clear(self):
+        """
+        Drops all cached results.
+        """
+        with self._lock:
+            self._cache = {}
+            self._key_locks = {}
+
+    def reset_stats(self):
+        """
+        Resets the hit and miss counters.
+        """
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+        Returns:
+            {"hits": int, "misses": int}
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# Parse cache of the handlers and validators used outside of a Custodian.
+# Each Custodian has its own, and opens a scope around each check.
+parse_cache = ParseCache()
+
+# Parse cache and backup metrics bound to each thread by bind_metrics.
+_bound_metrics = threading.local()
+
+
+@contextmanager
+def bind_metrics(cache, metrics):
+    """
+    Context manager making a parse cache and backup metrics those of the
+    current thread, i.e., those returned by get_parse_cache and
+    get_backup_metrics, so that several Custodians running at once keep
+    their own. Bindings can be nested.
+
+    Args:
+        cache (ParseCache): Parse cache.
+        metrics (BackupMetrics): Backup metrics.
+    """
+    previous = getattr(_bound_metrics, "value", None)
+    _bound_metrics.value = (cache, metrics)
+    try:
+        yield
+    finally:
+        _bound_metrics.value = previous
+
+
+def get_parse_cache():
+    """
+    Returns the parse cache bound to the current thread, e.g., that of the
+    Custodian checking the handlers, or else the module's parse_cache.
+    """
+    bound = getattr(_bound_metrics, "value", None)
+    return parse_cache if bound is None else bound[0]
+
+
+def get_backup_metrics():
+    """
+    Returns the backup metrics bound to the current thread, e.g., those of
+    the Custodian checking the handlers, or else the module's
+    backup_metrics.
+    """
+    bound = getattr(_bound_metrics, "value", None)
+    return backup_metrics if bound is None else bound[1]
+
+
+class FileWatcher:
+    """
+    Watches files for modifications using Linux's inotify, so that a caller
+    can wait for changes with select.select instead of polling. The
+    directories containing the files are watched rather than the files
+    themselves, so that files which do not exist yet or are replaced are
+    caught as well.
+
+    An OSError is raised on initialization if inotify is not available, e.g.,
+    on other operating systems.
+    """
+
+    # IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    _mask = 0x2 | 0x8 | 0x80 | 0x100
+    _event = struct.Struct("iIII")
+
+    def __init__(self, filenames):
+        """
+        Args:
+            filenames ([str]): Files to watch.
+        """
+        libc_name = ctypes.util.find_library("c")
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError, TypeError):
+            raise OSError("inotify is not available on this system")
+        self._fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches = {}
+        try:
+            for fname in filenames:
+                dirname, basename = os.path.split(os.path.abspath(fname))
+                wd = add_watch(self._fd, dirname.encode(), self._mask)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), "Cannot watch {}".format(dirname))
+                self._watches.setdefault(wd, {})[basename] = fname
+        except OSError:
+            self.close()
+            raise
+
+    def fileno(self):
+        """
+        Returns:
+            The inotify file descriptor, which is readable when events are
+            pending.
+        """
+        return self._fd
+
+    def read(self):
+        """
+        Returns:
+            Set of watched filenames modified since the last call.
+        """
+        changed = set()
+        while True:
+            try:
+                buf = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            i = 0
+            while i < len(buf):
+                wd, _, _, length = self._event.unpack_from(buf, i)
+                i += self._event.size
+                name = buf[i: i + length].rstrip(b"\0").decode(errors="replace")
+                i += length
+                if name in self._watches.get(wd, {}):
+                    changed.add(self._watches[wd][name])
+        return changed
+
+    def close(self):
+        """
+        Stops watching and releases the inotify file descriptor.
+        """
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def get_mpi_ncores(cmd):
+    """
+    Returns the number of MPI processes requested in a command, e.g.,
+    ["mpirun", "-np", "24", "vasp_std"] or "srun -n 24 vasp_std".
+
+    Args:
+        cmd (str or [str]): Command.
+
+    Returns:
+        (int) Number of processes, or None if the command does not specify
+        it.
+    """
+    args = cmd.split() if isinstance(cmd, str) else [str(a) for a in cmd]
+    for i, arg in enumerate(args):
+        if arg in ("-np", "-n", "--np", "--ntasks") and i + 1 < len(args) and args[i + 1].isdigit():
+            return int(args[i + 1])
+        if arg.startswith("--ntasks=") and arg[9:].isdigit():
+            return int(arg[9:])
+    return None
+
+
+def set_mpi_ncores(cmd, ncores):
+    """
+    Returns a copy of a command with the number of MPI processes it requests
+    replaced, e.g., ["mpirun", "-np", "6", "vasp_std"] for
+    ["mpirun", "-np", "24", "vasp_std"] and 6.
+
+    Args:
+        cmd (str or [str]): Command.
+        ncores (int): Number of processes.
+
+    Returns:
+        The command, as a str or list like cmd. It is returned unchanged if
+        it does not specify the number of processes.
+    """
+    args = cmd.split() if isinstance(cmd, str) else [str(a) for a in cmd]
+    for i, arg in enumerate(args):
+        if arg in ("-np", "-n", "--np", "--ntasks") and i + 1 < len(args) and args[i + 1].isdigit():
+            args[i + 1] = str(ncores)
+            break
+        if arg.startswith("--ntasks=") and arg[9:].isdigit():
+            args[i] = "--ntasks={}".format(ncores)
+            break
+    return " ".join(args) if isinstance(cmd, str) else args
+
+
+# Processes started by start_process, each leading its own process group.
+_group_leaders = weakref.WeakSet()
+
+# Signals forwarded to the process groups of the running jobs by
+# forward_signals, and the handlers they replaced.
+FORWARDED_SIGNALS = tuple(getattr(signal, name) for name in ("SIGTERM", "SIGHUP") if hasattr(signal, name))
+_forwarding = {"depth": 0, "previous": {}}
+
+
+def start_process(args, **kwargs):
+    """
+    Starts the process of a job with subprocess.Popen, as the leader of a
+    new process group, so that terminate_process terminates the processes
+    it starts as well, e.g., the MPI ranks launched by mpirun. The process
+    stays in the session of custodian, and forward_signals forwards the
+    signals that custodian receives to its group.
+
+    Args:
+        args: Command, as for subprocess.Popen.
+        **kwargs: Other arguments of subprocess.Popen.
+
+    Returns:
+        (subprocess.Popen) The process.
+    """
+    if not hasattr(os, "setpgrp"):
+        return subprocess.Popen(args, **kwargs)
+    if sys.version_info >= (3, 11):
+        kwargs["process_group"] = 0
+    else:
+        kwargs["preexec_fn"] = os.setpgrp
+    p = subprocess.Popen(args, **kwargs)
+    _group_leaders.add(p)
+    return p
+
+
+def _forward_signal(signum, frame):
+    for p in list(_group_leaders):
+        if p.returncode is None:
+            try:
+                os.killpg(p.pid, signum)
+            except ProcessLookupError:
+                pass
+    handler = _forwarding["previous"].get(signum)
+    if callable(handler):
+        handler(signum, frame)
+    elif handler != signal.SIG_IGN:
+        # Dies of the signal as it would have without forwarding.
+        signal.signal(signum, signal.SIG_DFL)
+        os.kill(os.getpid(), signum)
+
+
+@contextmanager
+def forward_signals():
+    """
+    Context manager forwarding SIGTERM and SIGHUP to the process groups of
+    the jobs started with start_process, which do not receive the signals
+    sent to the process group of custodian, before handling them as before,
+    e.g., by exiting. Contexts can be nested, and only the main thread can
+    install signal handlers, so that the context does nothing in the other
+    threads.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    if _forwarding["depth"] == 0:
+        _forwarding["previous"] = {sig: signal.signal(sig, _forward_signal) for sig in FORWARDED_SIGNALS}
+    _forwarding["depth"] += 1
+    try:
+        yield
+    finally:
+        _forwarding["depth"] -= 1
+        if _forwarding["depth"] == 0:
+            for sig, handler in _forwarding["previous"].items():
+                signal.signal(sig, signal.SIG_DFL if handler is None else handler)
+
+
+def terminate_process(p, timeout=30, kill_timeout=10):
+    """
+    Terminates a process started by a job and waits for it to exit. If the
+    process leads its own process group, e.g., it was started with
+    start_process, all the processes of the group, such as the MPI ranks
+    launched by mpirun, are terminated with it, while the processes of
+    other jobs on the same node are left alone.
+
+    The processes are first sent SIGTERM, and then SIGKILL if they have not
+    all exited after timeout seconds.
+
+    Args:
+        p (subprocess.Popen): Process.
+        timeout (float): Time in seconds to wait for the processes to exit
+            after SIGTERM. Defaults to 30.
+        kill_timeout (float): Time in seconds to wait for the processes to
+            exit after SIGKILL. Defaults to 10.
+
+    Returns:
+        (bool) Whether all the processes have exited.
+    """
+    # The id of a process group is that of its leader, and is not reused
+    # while any process of the group remains, even once the leader has been
+    # reaped. The group of a reaped process is only signalled if it is
+    # known to have created one.
+    group = p in _group_leaders
+    if not group and hasattr(os, "killpg") and p.poll() is None:
+        try:
+            group = os.getpgid(p.pid) == p.pid != os.getpgrp()
+        except ProcessLookupError:
+            pass
+
+    def send(sig):
+        try:
+            if group:
+                os.killpg(p.pid, sig)
+            elif p.poll() is None:
+                p.send_signal(sig)
+        except ProcessLookupError:
+            pass
+
+    def alive():
+        running = p.poll() is None
+        if group:
+            try:
+                os.killpg(p.pid, 0)
+                return True
+            except ProcessLookupError:
+                return False
+            except PermissionError:
+                return True
+        return running
+
+    def wait(t):
+        deadline = time.monotonic() + t
+        while alive():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+        return True
+
+    if not alive():
+        return True
+    send(signal.SIGTERM)
+    if wait(timeout):
+        return True
+    logging.warning("Process {} still running {} s after SIGTERM. Sending SIGKILL.".format(p.pid, timeout))
+    send(signal.SIGKILL)
+    if wait(kill_timeout):
+        return True
+    logging.error("Process {} still running {} s after SIGKILL.".format(p.pid, kill_timeout))
+    return False
 
 
 def get_execution_host_info():
@@ -0,0 +1,246 @@
+# coding: utf-8
+
+"""
+Autotuning of the parallel settings of a VASP run by short trial runs.
+
+Before an expensive production run, a few candidate combinations of KPAR,
+NCORE and LPLANE are each run for a handful of electronic steps, without
+ionic steps and without writing the WAVECAR or CHGCAR, and the one with
+the fastest electronic steps, as timed by the LOOP lines of the OUTCAR, is
+kept. The candidates are the best decompositions of the performance model
+of custodian.vasp.parallel.ParallelPlanner. The winner is cached per
+structure, class of INCAR and number of cores, so that repeated runs of the
+same system only pay for the trials once.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+
+from custodian.utils import start_process, terminate_process
+from custodian.vasp.parallel import ParallelPlanner, get_ncores, read_outcar_timings, read_system
+
+logger = logging.getLogger(__name__)
+
+# Environment variable overriding the location of the autotuning cache.
+AUTOTUNE_CACHE_ENV = "CUSTODIAN_VASP_AUTOTUNE_CACHE"
+
+# INCAR parameters that change the cost of an electronic step enough for the
+# best parallel settings to differ.
+INCAR_CLASS_KEYS = ("ISPIN", "LNONCOLLINEAR", "LSORBIT", "LHFCALC", "METAGGA", "ALGO", "PREC", "LREAL", "ENCUT")
+
+
+def get_autotune_cache_path():
+    """
+    Returns the path of the autotuning cache, i.e.,
+    $CUSTODIAN_VASP_AUTOTUNE_CACHE or ~/.custodian/vasp_autotune.json.
+    """
+    return os.environ.get(AUTOTUNE_CACHE_ENV) or os.path.join(
+        os.path.expanduser("~"), ".custodian", "vasp_autotune.json"
+    )
+
+
+def structure_hash(structure):
+    """
+    Returns a hash of a structure, insensitive to numerical noise in the
+    lattice and positions.
+
+    Args:
+        structure (Structure): Structure.
+    """
+    lines = [" ".join("{:.3f}".format(x) for x in row) for row in structure.lattice.matrix]
+    lines.extend(
+        "{} {}".format(site.species_string, " ".join("{:.3f}".format(x % 1) for x in site.frac_coords))
+        for site in structure
+    )
+    return hashlib.sha1("\n".join(lines).encode()).hexdigest()
+
+
+def incar_class(incar):
+    """
+    Returns the class of an INCAR, i.e., the values of the parameters in
+    INCAR_CLASS_KEYS that it sets, as a string.
+
+    Args:
+        incar (dict): INCAR.
+    """
+    return " ".join("{}={}".format(k, incar[k]) for k in INCAR_CLASS_KEYS if k in incar)
+
+
+class ParallelAutotuner:
+    """
+    Chooses KPAR, NCORE and LPLANE for a VASP run from the timings of short
+    trial runs of the input in the current directory.
+    """
+
+    def __init__(
+        self,
+        vasp_cmd,
+        ncandidates=3,
+        lplane=(True, False),
+        nelm=6,
+        trial_timeout=300,
+        cache=None,
+        trial_dir="autotune",
+    ):
+        """
+        Args:
+            vasp_cmd ([str]): Command to run VASP, as for VaspJob.
+            ncandidates (int): Number of decompositions tried, in the order
+                of the performance model. Defaults to 3.
+            lplane ((bool)): Values of LPLANE tried with each decomposition.
+                Defaults to (True, False).
+            nelm (int): Number of electronic steps of a trial run. The first
+                step is not timed. Defaults to 6.
+            trial_timeout (float): Time in seconds after which a trial run
+                is terminated, and timed from the steps it has completed.
+                Defaults to 300.
+            cache (str): Autotuning cache. Defaults to None, i.e.,
+                get_autotune_cache_path(). Set to False to disable caching.
+            trial_dir (str): Directory in which the trials are run. It is
+                removed afterwards. Defaults to "autotune".
+        """
+        self.vasp_cmd = vasp_cmd
+        self.ncandidates = ncandidates
+        self.lplane = lplane
+        self.nelm = nelm
+        self.trial_timeout = trial_timeout
+        self.cache = get_autotune_cache_path() if cache is None else cache
+        self.trial_dir = trial_dir
+
+    def cache_key(self, incar, ncores):
+        """
+        Returns the key of the input in the current directory in the cache,
+        i.e., "<structure hash>|<INCAR class>|<number of cores>".
+        """
+        from pymatgen.core import Structure
+
+        return "{}|{}|{}".format(structure_hash(Structure.from_file("POSCAR")), incar_class(incar), ncores)
+
+    def load_cache(self):
+        """
+        Returns the cached settings by key, or an empty dict.
+        """
+        if not self.cache or not os.path.exists(self.cache):
+            return {}
+        try:
+            with open(self.cache) as f:
+                return json.load(f)
+        except ValueError:
+            logger.warning("Ignoring corrupted autotuning cache {}.".format(self.cache))
+            return {}
+
+    def save(self, key, settings):
+        """
+        Stores the settings of a key in the cache.
+        """
+        if not self.cache:
+            return
+        directory = os.path.dirname(self.cache)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        cache = self.load_cache()
+        cache[key] = settings
+        # Replace the cache atomically, so that concurrent runs never read
+        # a partially written cache.
+        tmp = "{}.{}.tmp".format(self.cache, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump(cache, f, indent=1)
+        os.replace(tmp, self.cache)
+
+    def candidates(self, ncores):
+        """
+        Returns the trial settings as a list of {"KPAR", "NCORE", "LPLANE"},
+        with the most promising first.
+        """
+        system = read_system()
+        planner = ParallelPlanner(ncores)
+        ranked = sorted(
+            planner.candidates(system["nkpts"], system["nbands"]),
+            key=lambda c: (planner.predict(system["nkpts"], system["nbands"], *c), -c[0]),
+        )
+        return [
+            {"KPAR": kpar, "NCORE": ncores // kpar // npar, "LPLANE": lplane}
+            for kpar, npar in ranked[: self.ncandidates]
+            for lplane in self.lplane
+        ]
+
+    def trial(self, incar, settings):
+        """
+        Runs a trial with the given parallel settings.
+
+        Args:
+            incar (Incar): INCAR of the production run.
+            settings (dict): Parallel settings of the trial.
+
+        Returns:
+            Timings of the trial as read by read_outcar_timings, or None if
+            the trial did not complete a timed electronic step.
+        """
+        from pymatgen.io.vasp.inputs import Incar
+
+        if os.path.exists(self.trial_dir):
+            shutil.rmtree(self.trial_dir)
+        os.makedirs(self.trial_dir)
+        for f in ("KPOINTS", "POSCAR", "POTCAR"):
+            if os.path.exists(f):
+                shutil.copy(f, self.trial_dir)
+        trial_incar = Incar({k: v for k, v in incar.items() if k not in ("NPAR", "NELMIN", "ISTART", "ICHARG")})
+        trial_incar.update(settings)
+        # A single ionic step of nelm electronic steps, from scratch, that
+        # writes no large files.
+        trial_incar.update({"NSW": 0, "IBRION": -1, "NELM": self.nelm, "LWAVE": False, "LCHARG": False})
+        trial_incar.write_file(os.path.join(self.trial_dir, "INCAR"))
+        with open(os.path.join(self.trial_dir, "vasp.out"), "w") as f_std:
+            p = start_process(self.vasp_cmd, cwd=self.trial_dir, stdout=f_std, stderr=subprocess.STDOUT)
+        try:
+            p.wait(timeout=self.trial_timeout)
+        except subprocess.TimeoutExpired:
+            logger.info("Trial with {} timed out.".format(settings))
+        finally:
+            terminate_process(p)
+        outcar = os.path.join(self.trial_dir, "OUTCAR")
+        return read_outcar_timings(outcar) if os.path.exists(outcar) else None
+
+    def tune(self):
+        """
+        Finds the fastest parallel settings for the input in the current
+        directory, from the cache or else from trial runs.
+
+        Returns:
+            {"KPAR": int, "NCORE": int, "LPLANE": bool}, or None if no trial
+            completed a timed electronic step.
+        """
+        from pymatgen.io.vasp.inputs import Incar
+
+        incar = Incar.from_file("INCAR")
+        ncores = get_ncores(self.vasp_cmd)
+        key = self.cache_key(incar, ncores)
+        cached = self.load_cache().get(key)
+        if cached is not None:
+            logger.info("Using cached parallel settings {}.".format(cached))
+            return cached
+
+        planner = ParallelPlanner(ncores)
+        results = []
+        try:
+            for settings in self.candidates(ncores):
+                timings = self.trial(incar, settings)
+                if timings is None:
+                    logger.warning("Trial with {} could not be timed from its OUTCAR.".format(settings))
+                else:
+                    logger.info("Trial with {}: {}".format(settings, timings))
+                    results.append((timings["time_per_step"], settings))
+                    # The trials also teach the planner.
+                    planner.record(timings, settings["KPAR"])
+        finally:
+            shutil.rmtree(self.trial_dir, ignore_errors=True)
+        if not results:
+            logger.warning("No autotuning trial could be timed. The parallel settings are left unchanged.")
+            return None
+        best = min(results, key=lambda r: r[0])[1]
+        self.save(key, best)
+        return best
@@ -12,7 +12,6 @@ import operator
 import os
 import re
 import shutil
-import time
 from collections import Counter
 from functools import reduce
 
@@ -20,17 +19,14 @@ import numpy as np
 from monty.dev import deprecated
 from monty.os.path import zpath
 from monty.serialization import loadfn
-from pymatgen.core.structure import Structure
-from pymatgen.io.vasp.inputs import Poscar, VaspInput, Incar, Kpoints
-from pymatgen.io.vasp.outputs import Vasprun, Oszicar, Outcar
-from pymatgen.io.vasp.sets import MPScanRelaxSet
-from pymatgen.transformations.standard_transformations import SupercellTransformation
 
 from custodian.ansible.actions import FileActions
 from custodian.ansible.interpreter import Modder
 from custodian.custodian import ErrorHandler
-from custodian.utils import backup
+from custodian.liveness import LivenessDetector
+from custodian.utils import backup, TailReader, MessageMatcher, get_parse_cache
 from custodian.vasp.interpreter import VaspModder
+from custodian.vasp.outputs import OszicarReader, count_atoms
 
 
 __author__ = (
@@ -105,6 +101,8 @@ class VaspErrorHandler(ErrorHandler):
         "symprec_noise": ["determination of the symmetry of your systems shows a strong"]
     }
 
+    _matcher = MessageMatcher(error_msgs)
+
     def __init__(
         self,
         output_filename="vasp.out",
@@ -146,40 +144,69 @@ class VaspErrorHandler(ErrorHandler):
             VaspErrorHandler.error_msgs.keys()
         )
         self.logger = logging.getLogger(self.__class__.__name__)
+        # The output file is followed incrementally, i.e., only the lines
+        # appended since the last check are scanned. Messages found so far
+        # are kept until the job is restarted.
+        self._reader = TailReader(output_filename)
+        self._found = set()
+
+    @property
+    def monitored_files(self):
+        """
+        The output file is checked whenever it is modified.
+        """
+        return [self.output_filename]
 
     def check(self):
         """
         Check for error.
         """
-        incar = Incar.from_file("INCAR")
+        from pymatgen.io.vasp.inputs import Incar
+
+        incar = get_parse_cache().load(Incar.from_file, "INCAR")
+        lines = self._reader.readlines()
+        if self._reader.rewound:
+            self._found = set()
+        self._found.update(VaspErrorHandler._matcher.findall(lines))
         self.errors = set()
         error_msgs = set()
-        with open(self.output_filename, "r") as f:
-            for line in f:
-                l = line.strip()
-                for err, msgs in VaspErrorHandler.error_msgs.items():
-                    if err in self.errors_subset_to_catch:
-                        for msg in msgs:
-                            if l.find(msg) != -1:
-                                # this checks if we want to run a charged
-                                # computation (e.g., defects) if yes we don't
-                                # want to kill it because there is a change in
-                                # e-density (brmix error)
-                                if err == "brmix" and "NELECT" in incar:
-                                    continue
-                                self.errors.add(err)
-                                error_msgs.add(msg)
+        for err, msg in self._found:
+            if err not in self.errors_subset_to_catch:
+                continue
+            # this checks if we want to run a charged
+            # computation (e.g., defects) if yes we don't
+            # want to kill it because there is a change in
+            # e-density (brmix error)
+            if err == "brmix" and "NELECT" in incar:
+                continue
+            self.errors.add(err)
+            error_msgs.add(msg)
         for msg in error_msgs:
             self.logger.error(msg, extra={"incar": incar.as_dict()})
         return len(self.errors) > 0
 
+    def reset(self):
+        """
+        Forget the scanned part of the output file, which is rewritten when
+        the job is restarted.
+        """
+        self._reader.reset()
+        self._found = set()
+
     def correct(self):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import Kpoints, VaspInput
+        from pymatgen.io.vasp.outputs import Outcar
+        from pymatgen.transformations.standard_transformations import SupercellTransformation
+
         backup(VASP_BACKUP_FILES | {self.output_filename})
         actions = []
         vi = VaspInput.from_directory(".")
+        # The job is restarted after the correction, so the next check has to
+        # scan the new output from the start.
+        self.reset()
 
         if self.errors.intersection(["tet", "dentet"]):
             if vi["INCAR"].get("KSPACING"):
@@ -295,8 +322,7 @@ class VaspErrorHandler(ErrorHandler):
             # being too big and POTIM should be decreased.  If a static run
             # try turning off symmetry.
             try:
-                oszicar = Oszicar("OSZICAR")
-                nsteps = len(oszicar.ionic_steps)
+                nsteps = len(OszicarReader("OSZICAR").update().ionic_steps)
             except Exception:
                 nsteps = 0
 
@@ -493,6 +519,35 @@ class VaspErrorHandler(ErrorHandler):
         VaspModder(vi=vi).apply_actions(actions)
         return {"errors": list(self.errors), "actions": actions}
 
+    def as_dict(self):
+        """
+        Returns:
+            MSONable dict, including the position reached in the output file
+            and the messages found so far.
+        """
+        d = super().as_dict()
+        d["scan_state"] = {
+            "reader": self._reader.as_dict(),
+            "found": sorted([list(f) for f in self._found]),
+        }
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        """
+        Custom from_dict method that restores the scan state, if any.
+        """
+        h = cls(
+            output_filename=d.get("output_filename", "vasp.out"),
+            natoms_large_cell=d.get("natoms_large_cell", 100),
+            errors_subset_to_catch=d.get("errors_subset_to_catch"),
+        )
+        state = d.get("scan_state")
+        if state and state["reader"]["filename"] == h.output_filename:
+            h._reader = TailReader.from_dict(state["reader"])
+            h._found = {tuple(f) for f in state["found"]}
+        return h
+
 
 class LrfCommutatorHandler(ErrorHandler):
     """
@@ -505,6 +560,8 @@ class LrfCommutatorHandler(ErrorHandler):
 
     error_msgs = {"lrf_comm": ["LRF_COMMUTATOR internal error"]}
 
+    _matcher = MessageMatcher(error_msgs)
+
     def __init__(self, output_filename="std_err.txt"):
         """
         Initializes the handler with the output file to check.
@@ -519,24 +576,28 @@ class LrfCommutatorHandler(ErrorHandler):
         self.errors = set()
         self.error_count = Counter()
 
+    @property
+    def monitored_files(self):
+        """
+        The stderr file is checked whenever it is modified.
+        """
+        return [self.output_filename]
+
     def check(self):
         """
         Check for error.
         """
-        self.errors = set()
         with open(self.output_filename, "r") as f:
-            for line in f:
-                l = line.strip()
-                for err, msgs in LrfCommutatorHandler.error_msgs.items():
-                    for msg in msgs:
-                        if l.find(msg) != -1:
-                            self.errors.add(err)
+            self.errors = {err for err, _ in LrfCommutatorHandler._matcher.findall(f)}
         return len(self.errors) > 0
 
     def correct(self):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+        from pymatgen.io.vasp.outputs import Outcar
+
         backup(VASP_BACKUP_FILES | {self.output_filename})
         actions = []
         vi = VaspInput.from_directory(".")
@@ -569,6 +630,8 @@ class StdErrHandler(ErrorHandler):
         "out_of_memory": ["Allocation would exceed memory limit"],
     }
 
+    _matcher = MessageMatcher(error_msgs)
+
     def __init__(self, output_filename="std_err.txt"):
         """
         Initializes the handler with the output file to check.
@@ -583,24 +646,27 @@ class StdErrHandler(ErrorHandler):
         self.errors = set()
         self.error_count = Counter()
 
+    @property
+    def monitored_files(self):
+        """
+        The stderr file is checked whenever it is modified.
+        """
+        return [self.output_filename]
+
     def check(self):
         """
         Check for error.
         """
-        self.errors = set()
         with open(self.output_filename, "r") as f:
-            for line in f:
-                l = line.strip()
-                for err, msgs in StdErrHandler.error_msgs.items():
-                    for msg in msgs:
-                        if l.find(msg) != -1:
-                            self.errors.add(err)
+            self.errors = {err for err, _ in StdErrHandler._matcher.findall(f)}
         return len(self.errors) > 0
 
     def correct(self):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         backup(VASP_BACKUP_FILES | {self.output_filename})
         actions = []
         vi = VaspInput.from_directory(".")
@@ -642,6 +708,8 @@ class AliasingErrorHandler(ErrorHandler):
         ],
     }
 
+    _matcher = MessageMatcher(error_msgs)
+
     def __init__(self, output_filename="vasp.out"):
         """
         Initializes the handler with the output file to check.
@@ -655,31 +723,27 @@ class AliasingErrorHandler(ErrorHandler):
         self.output_filename = output_filename
         self.errors = set()
 
+    @property
+    def monitored_files(self):
+        """
+        The output file is checked whenever it is modified.
+        """
+        return [self.output_filename]
+
     def check(self):
         """
         Check for error.
         """
-        incar = Incar.from_file("INCAR")
-        self.errors = set()
         with open(self.output_filename, "r") as f:
-            for line in f:
-                l = line.strip()
-                for err, msgs in AliasingErrorHandler.error_msgs.items():
-                    for msg in msgs:
-                        if l.find(msg) != -1:
-                            # this checks if we want to run a charged
-                            # computation (e.g., defects) if yes we don't
-                            # want to kill it because there is a change in e-
-                            # density (brmix error)
-                            if err == "brmix" and "NELECT" in incar:
-                                continue
-                            self.errors.add(err)
+            self.errors = {err for err, _ in AliasingErrorHandler._matcher.findall(f)}
         return len(self.errors) > 0
 
     def correct(self):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         backup(VASP_BACKUP_FILES | {self.output_filename})
         actions = []
         vi = VaspInput.from_directory(".")
@@ -759,7 +823,10 @@ class DriftErrorHandler(ErrorHandler):
         """
         Check for error.
         """
-        incar = Incar.from_file("INCAR")
+        from pymatgen.io.vasp.inputs import Incar
+        from pymatgen.io.vasp.outputs import Outcar
+
+        incar = get_parse_cache().load(Incar.from_file, "INCAR")
         if incar.get("EDIFFG", 0.1) >= 0 or incar.get("NSW", 0) == 0:
             # Only activate when force relaxing and ionic steps
             # NSW check prevents accidental effects when running DFPT
@@ -769,7 +836,7 @@ class DriftErrorHandler(ErrorHandler):
             self.max_drift = incar["EDIFFG"] * -1
 
         try:
-            outcar = Outcar("OUTCAR")
+            outcar = get_parse_cache().load(Outcar, "OUTCAR")
         except Exception:
             # Can't perform check if Outcar not valid
             return False
@@ -786,12 +853,15 @@ class DriftErrorHandler(ErrorHandler):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+        from pymatgen.io.vasp.outputs import Outcar
+
         backup(VASP_BACKUP_FILES)
         actions = []
         vi = VaspInput.from_directory(".")
 
         incar = vi["INCAR"]
-        outcar = Outcar("OUTCAR")
+        outcar = get_parse_cache().load(Outcar, "OUTCAR")
 
         # Move CONTCAR to POSCAR
         actions.append(
@@ -841,6 +911,15 @@ class MeshSymmetryErrorHandler(ErrorHandler):
 
     is_monitor = False
 
+    _matcher = MessageMatcher(
+        {
+            "mesh_symmetry": [
+                "Reciprocal lattice and k-lattice belong to different class of"
+                " lattices."
+            ]
+        }
+    )
+
     def __init__(self, output_filename="vasp.out", output_vasprun="vasprun.xml"):
         """
         Initializes the handler with the output files to check.
@@ -860,40 +939,37 @@ class MeshSymmetryErrorHandler(ErrorHandler):
         """
         Check for error.
         """
-        msg = (
-            "Reciprocal lattice and k-lattice belong to different class of" " lattices."
-        )
+        from pymatgen.io.vasp.inputs import Incar, Kpoints
+        from pymatgen.io.vasp.outputs import Vasprun
 
-        vi = VaspInput.from_directory(".")
+        incar = get_parse_cache().load(Incar.from_file, "INCAR")
         # disregard this error if KSPACING is set and no KPOINTS file is generated
-        if vi["INCAR"].get("KSPACING", False):
+        if incar.get("KSPACING", False):
             return False
 
         # According to VASP admins, you can disregard this error
         # if symmetry is off
         # Also disregard if automatic KPOINT generation is used
-        if (not vi["INCAR"].get("ISYM", True)) or vi[
-            "KPOINTS"
-        ].style == Kpoints.supported_modes.Automatic:
+        if (not incar.get("ISYM", True)) or get_parse_cache().load(
+            Kpoints.from_file, "KPOINTS"
+        ).style == Kpoints.supported_modes.Automatic:
             return False
 
         try:
-            v = Vasprun(self.output_vasprun)
+            v = get_parse_cache().load(Vasprun, self.output_vasprun)
             if v.converged:
                 return False
         except Exception:
             pass
         with open(self.output_filename, "r") as f:
-            for line in f:
-                l = line.strip()
-                if l.find(msg) != -1:
-                    return True
-        return False
+            return MeshSymmetryErrorHandler._matcher.first(f) is not None
 
     def correct(self):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         backup(VASP_BACKUP_FILES | {self.output_filename})
         vi = VaspInput.from_directory(".")
         m = reduce(operator.mul, vi["KPOINTS"].kpts[0])
@@ -926,8 +1002,10 @@ class UnconvergedErrorHandler(ErrorHandler):
         """
         Check for error.
         """
+        from pymatgen.io.vasp.outputs import Vasprun
+
         try:
-            v = Vasprun(self.output_filename)
+            v = get_parse_cache().load(Vasprun, self.output_filename)
             if not v.converged:
                 return True
         except Exception:
@@ -938,7 +1016,10 @@ class UnconvergedErrorHandler(ErrorHandler):
         """
         Perform corrections.
         """
-        v = Vasprun(self.output_filename)
+        from pymatgen.io.vasp.inputs import VaspInput
+        from pymatgen.io.vasp.outputs import Vasprun
+
+        v = get_parse_cache().load(Vasprun, self.output_filename)
         actions = []
         if not v.converged_electronic:
             # Ladder from VeryFast to Fast to Fast to All
@@ -1011,8 +1092,10 @@ class IncorrectSmearingHandler(ErrorHandler):
         """
         Check for error.
         """
+        from pymatgen.io.vasp.outputs import Vasprun
+
         try:
-            v = Vasprun(self.output_filename)
+            v = get_parse_cache().load(Vasprun, self.output_filename)
             # check whether bandgap is zero and tetrahedron smearing was used
             if v.eigenvalue_band_properties[0] == 0 and v.incar.get("ISMEAR", 1) < 0:
                 return True
@@ -1024,6 +1107,8 @@ class IncorrectSmearingHandler(ErrorHandler):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         backup(VASP_BACKUP_FILES | {self.output_filename})
         vi = VaspInput.from_directory(".")
 
@@ -1059,8 +1144,10 @@ class ScanMetalHandler(ErrorHandler):
         """
         Check for error.
         """
+        from pymatgen.io.vasp.outputs import Vasprun
+
         try:
-            v = Vasprun(self.output_filename)
+            v = get_parse_cache().load(Vasprun, self.output_filename)
             # check whether bandgap is zero and tetrahedron smearing was used
             if v.eigenvalue_band_properties[0] == 0 and v.incar.get("KSPACING", 1) > 0.22:
                 return True
@@ -1072,6 +1159,10 @@ class ScanMetalHandler(ErrorHandler):
         """
         Perform corrections.
         """
+        from pymatgen.core.structure import Structure
+        from pymatgen.io.vasp.inputs import VaspInput
+        from pymatgen.io.vasp.sets import MPScanRelaxSet
+
         backup(VASP_BACKUP_FILES | {self.output_filename})
         vi = VaspInput.from_directory(".")
 
@@ -1107,9 +1198,13 @@ class LargeSigmaHandler(ErrorHandler):
         """
         Check for error.
         """
-        incar = Incar.from_file("INCAR")
+        from pymatgen.core.structure import Structure
+        from pymatgen.io.vasp.inputs import Incar
+        from pymatgen.io.vasp.outputs import Outcar
+
+        incar = get_parse_cache().load(Incar.from_file, "INCAR")
         try:
-            outcar = Outcar("OUTCAR")
+            outcar = get_parse_cache().load_copy(Outcar, "OUTCAR")
         except Exception:
             # Can't perform check if Outcar not valid
             return False
@@ -1122,7 +1217,7 @@ class LargeSigmaHandler(ErrorHandler):
                 reverse=True,
                 terminate_on_match=True
             )
-            n_atoms = Structure.from_file("POSCAR").num_sites
+            n_atoms = get_parse_cache().load(Structure.from_file, "POSCAR").num_sites
             if outcar.data.get("entropy", []):
                 entropy_per_atom = abs(np.max(outcar.data.get("entropy")))/n_atoms
 
@@ -1136,6 +1231,8 @@ class LargeSigmaHandler(ErrorHandler):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         backup(VASP_BACKUP_FILES)
         actions = []
         vi = VaspInput.from_directory(".")
@@ -1187,8 +1284,10 @@ class MaxForceErrorHandler(ErrorHandler):
         """
         Check for error.
         """
+        from pymatgen.io.vasp.outputs import Vasprun
+
         try:
-            v = Vasprun(self.output_filename)
+            v = get_parse_cache().load(Vasprun, self.output_filename)
             forces = np.array(v.ionic_steps[-1]["forces"])
             sdyn = v.final_structure.site_properties.get("selective_dynamics")
             if sdyn:
@@ -1204,6 +1303,8 @@ class MaxForceErrorHandler(ErrorHandler):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         backup(VASP_BACKUP_FILES | {self.output_filename})
         vi = VaspInput.from_directory(".")
         ediff = float(vi["INCAR"].get("EDIFF", 1e-4))
@@ -1244,15 +1345,28 @@ class PotimErrorHandler(ErrorHandler):
         self.input_filename = input_filename
         self.output_filename = output_filename
         self.dE_threshold = dE_threshold
+        self._oszicar = OszicarReader(output_filename)
+
+    @property
+    def monitored_files(self):
+        """
+        The OSZICAR is checked whenever it is modified.
+        """
+        return [self.output_filename]
+
+    def reset(self):
+        """
+        Starts reading the OSZICAR of a new run from the beginning.
+        """
+        self._oszicar.reset()
 
     def check(self):
         """
         Check for error.
         """
         try:
-            oszicar = Oszicar(self.output_filename)
-            n = len(Poscar.from_file(self.input_filename).structure)
-            max_dE = max([s["dE"] for s in oszicar.ionic_steps[1:]]) / n
+            dE = self._oszicar.update().energy_changes
+            max_dE = np.max(dE[1:]) / count_atoms(self.input_filename)
             if max_dE > self.dE_threshold:
                 return True
         except Exception:
@@ -1263,6 +1377,8 @@ class PotimErrorHandler(ErrorHandler):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         backup(VASP_BACKUP_FILES)
         vi = VaspInput.from_directory(".")
         potim = float(vi["INCAR"].get("POTIM", 0.5))
@@ -1282,13 +1398,18 @@ class PotimErrorHandler(ErrorHandler):
 
 class FrozenJobErrorHandler(ErrorHandler):
     """
-    Detects an error when the output file has not been updated
-    in timeout seconds. Changes ALGO to Normal from Fast
+    Detects an error when the run has made no progress, i.e., neither the
+    output file nor the OSZICAR has grown, for too long. How long adapts to
+    the time the electronic steps of the run have taken so far, within
+    min_timeout and timeout, and a run whose processes have stopped using
+    CPU and doing I/O is flagged after min_timeout if Custodian samples the
+    resources of the job (see custodian.liveness.LivenessDetector). Changes
+    ALGO to Normal from Fast
     """
 
     is_monitor = True
 
-    def __init__(self, output_filename="vasp.out", timeout=21600):
+    def __init__(self, output_filename="vasp.out", timeout=21600, min_timeout=600, step_factor=10):
         """
         Initializes the handler with the output file to check.
 
@@ -1297,19 +1418,40 @@ class FrozenJobErrorHandler(ErrorHandler):
                 is being redirected. The error messages that are checked are
                 present in the stdout. Defaults to "vasp.out", which is the
                 default redirect used by :class:`custodian.vasp.jobs.VaspJob`.
-            timeout (int): The time in seconds between checks where if there
-                is no activity on the output file, the run is considered
-                frozen. Defaults to 3600 seconds, i.e., 1 hour.
+            timeout (int): The longest time in seconds without progress
+                before the run is considered frozen. Defaults to 21600
+                seconds, i.e., 6 hours.
+            min_timeout (int): The shortest time in seconds without progress
+                before the run is considered frozen. Defaults to 600 seconds.
+            step_factor (float): The run is considered frozen after
+                step_factor times its longest recent electronic step without
+                progress, within min_timeout and timeout. Defaults to 10.
         """
         self.output_filename = output_filename
         self.timeout = timeout
+        self.min_timeout = min_timeout
+        self.step_factor = step_factor
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self._detector = LivenessDetector(output_filename, timeout, min_timeout, step_factor)
+        self._oszicar = OszicarReader("OSZICAR")
+
+    def reset(self):
+        """
+        Forgets the progress of the previous run.
+        """
+        self._detector.reset()
+        self._oszicar.reset()
 
     def check(self):
         """
         Check for error.
         """
-        st = os.stat(self.output_filename)
-        if time.time() - st.st_mtime > self.timeout:
+        try:
+            steps = int(self._oszicar.update().n_electronic_steps.sum())
+        except OSError:
+            steps = None
+        if self._detector.update(steps, self.process_sampler):
+            self.logger.warning(self._detector.reason)
             return True
         return None
 
@@ -1317,6 +1459,8 @@ class FrozenJobErrorHandler(ErrorHandler):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         backup(VASP_BACKUP_FILES | {self.output_filename})
 
         vi = VaspInput.from_directory(".")
@@ -1353,20 +1497,33 @@ class NonConvergingErrorHandler(ErrorHandler):
         """
         self.output_filename = output_filename
         self.nionic_steps = nionic_steps
+        self._oszicar = OszicarReader(output_filename)
+
+    @property
+    def monitored_files(self):
+        """
+        The OSZICAR is checked whenever it is modified.
+        """
+        return [self.output_filename]
+
+    def reset(self):
+        """
+        Starts reading the OSZICAR of a new run from the beginning.
+        """
+        self._oszicar.reset()
 
     def check(self):
         """
         Check for error.
         """
-        vi = VaspInput.from_directory(".")
-        nelm = vi["INCAR"].get("NELM", 60)
+        from pymatgen.io.vasp.inputs import Incar
+
+        incar = get_parse_cache().load(Incar.from_file, "INCAR")
+        nelm = incar.get("NELM", 60)
         try:
-            oszicar = Oszicar(self.output_filename)
-            esteps = oszicar.electronic_steps
-            if len(esteps) > self.nionic_steps:
-                return all(
-                    [len(e) == nelm for e in esteps[-(self.nionic_steps + 1): -1]]
-                )
+            nsteps = self._oszicar.update().n_electronic_steps
+            if len(nsteps) > self.nionic_steps:
+                return bool(np.all(nsteps[-(self.nionic_steps + 1): -1] == nelm))
         except Exception:
             pass
         return False
@@ -1375,6 +1532,8 @@ class NonConvergingErrorHandler(ErrorHandler):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         vi = VaspInput.from_directory(".")
         algo = vi["INCAR"].get("ALGO", "Normal")
         amix = vi["INCAR"].get("AMIX", 0.4)
@@ -1504,10 +1663,12 @@ class WalltimeHandler(ErrorHandler):
         """
         Check for error.
         """
+        from pymatgen.io.vasp.outputs import Outcar
+
         if self.wall_time:
             run_time = datetime.datetime.now() - self.start_time
             total_secs = run_time.total_seconds()
-            outcar = Outcar("OUTCAR")
+            outcar = get_parse_cache().load_copy(Outcar, "OUTCAR")
             if not self.electronic_step_stop:
                 # Determine max time per ionic step.
                 outcar.read_pattern(
@@ -1696,14 +1857,27 @@ class PositiveEnergyErrorHandler(ErrorHandler):
                 this only if it is different from the default (unlikely).
         """
         self.output_filename = output_filename
+        self._oszicar = OszicarReader(output_filename)
+
+    @property
+    def monitored_files(self):
+        """
+        The OSZICAR is checked whenever it is modified.
+        """
+        return [self.output_filename]
+
+    def reset(self):
+        """
+        Starts reading the OSZICAR of a new run from the beginning.
+        """
+        self._oszicar.reset()
 
     def check(self):
         """
         Check for error.
         """
         try:
-            oszicar = Oszicar(self.output_filename)
-            if oszicar.final_energy > 0:
+            if self._oszicar.update().energies[-1] > 0:
                 return True
         except Exception:
             pass
@@ -1713,6 +1887,8 @@ class PositiveEnergyErrorHandler(ErrorHandler):
         """
         Perform corrections.
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         # change ALGO = Fast to Normal if ALGO is !Normal
         vi = VaspInput.from_directory(".")
         algo = vi["INCAR"].get("ALGO", "Normal")
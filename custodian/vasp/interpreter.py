@@ -4,10 +4,9 @@
 Implements various interpreters and modders for VASP.
 """
 
-from pymatgen.io.vasp.inputs import VaspInput
-
 from custodian.ansible.actions import FileActions, DictActions
 from custodian.ansible.interpreter import Modder
+from custodian.utils import get_parse_cache
 
 
 class VaspModder(Modder):
@@ -30,6 +29,8 @@ class VaspModder(Modder):
                 Initialized automatically if not passed (but passing it will
                 avoid having to reparse the directory).
         """
+        from pymatgen.io.vasp.inputs import VaspInput
+
         self.vi = vi or VaspInput.from_directory(".")
         actions = actions or [FileActions, DictActions]
         super().__init__(actions, strict)
@@ -51,7 +52,11 @@ class VaspModder(Modder):
                 self.vi[k] = self.modify_object(a["action"], self.vi[k])
             elif "file" in a:
                 self.modify(a["action"], a["file"])
+                # File actions may also write to other files, e.g. the
+                # destination of a copy.
+                get_parse_cache().clear()
             else:
                 raise ValueError("Unrecognized format: {}".format(a))
         for f in modified:
             self.vi[f].write_file(f)
+            get_parse_cache().invalidate(f)
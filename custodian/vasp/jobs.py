@@ -4,30 +4,53 @@
 This module implements basic kinds of jobs for VASP runs.
 """
 
+import copy
+import glob
 import logging
-import math
 import os
+import re
 import shutil
-import subprocess
 
 import numpy as np
 from monty.os.path import which
 from monty.serialization import dumpfn, loadfn
-from monty.shutil import decompress_dir
-from pymatgen.core.structure import Structure
-from pymatgen.io.vasp.inputs import VaspInput, Incar, Poscar, Kpoints
-from pymatgen.io.vasp.outputs import Vasprun, Outcar
 
-from custodian.custodian import Job, SENTRY_DSN
-from custodian.utils import backup
+from custodian.custodian import Job, SENTRY_DSN, add_sentry_tags, init_sentry
+from custodian.async_custodian import AsyncCustodian, run_many
+from custodian.batch import split_allocation
+from custodian.utils import (
+    backup,
+    clone_file,
+    decompress_files,
+    get_mpi_ncores,
+    set_mpi_ncores,
+    start_process,
+    terminate_process,
+)
+from custodian.vasp.autotune import ParallelAutotuner
 from custodian.vasp.handlers import VASP_BACKUP_FILES
 from custodian.vasp.interpreter import VaspModder
+from custodian.vasp.parallel import (
+    ParallelPlanner,
+    default_npar,
+    get_ncores,
+    get_perf_db_path,
+    read_outcar_timings,
+    read_system,
+)
 
 logger = logging.getLogger(__name__)
 
 
 VASP_INPUT_FILES = {"INCAR", "POSCAR", "POTCAR", "KPOINTS"}
 
+# Ratio by which the steps of the lattice parameter search grow.
+_GOLDEN = (1 + 5 ** 0.5) / 2
+
+# Files read by a VASP run whenever they are present, besides the WAVECAR
+# and CHGCAR, which are only read depending on the INCAR.
+VASP_SETUP_FILES = VASP_INPUT_FILES | {"CONTCAR", "ICONST", "KPOINTS_OPT", "ML_AB", "ML_FF", "vdw_kernel.bindat"}
+
 VASP_OUTPUT_FILES = [
     "DOSCAR",
     "INCAR",
@@ -67,6 +90,133 @@ VASP_NEB_OUTPUT_SUB_FILES = [
 ]
 
 
+def get_restart_files(incar):
+    """
+    Returns the restart files read by a VASP run, i.e., the WAVECAR unless
+    ISTART = 0, and the CHGCAR if ICHARG = 1 or 11.
+
+    Args:
+        incar (dict): INCAR of the run.
+    """
+    files = []
+    if incar.get("ISTART", 1) != 0:
+        files.append("WAVECAR")
+    if incar.get("ICHARG", 0) % 10 == 1:
+        files.append("CHGCAR")
+    return files
+
+
+def propose_lattice_parameters(energies, npoints, etol, algo="bfgs", xtol=1e-4):
+    """
+    Proposes the lattice parameters to evaluate next in a search for the
+    lattice parameter of lowest energy, given the energies evaluated so far.
+
+    Until the minimum is bracketed, i.e., lies between two lattice
+    parameters of higher energy, the search steps away from the lowest
+    parameter evaluated, with steps growing by the golden ratio. Once it is
+    bracketed, the bracket is narrowed around the minimum with the vertex of
+    the parabola through the bracket (if algo is "bfgs") and with golden
+    sections of the largest intervals. With npoints points per round, the
+    bracket shrinks much faster than with one point at a time.
+
+    Args:
+        energies (dict): Energies by lattice parameter.
+        npoints (int): Number of lattice parameters to propose.
+        etol (float): Energy tolerance. The search has converged once the
+            lowest energy and the lower of its neighbours differ by less.
+        algo (str): "bfgs" to use parabolic steps, or "bisection" to only
+            use golden sections. Defaults to "bfgs".
+        xtol (float): Smallest distance between lattice parameters.
+            Defaults to 1e-4.
+
+    Returns:
+        List of lattice parameters, which is empty if the search has
+        converged or cannot proceed.
+    """
+    xs = sorted(energies)
+    if len(xs) < 2:
+        return []
+    ind = min(range(len(xs)), key=lambda i: energies[xs[i]])
+    neighbours = [i for i in (ind - 1, ind + 1) if 0 <= i < len(xs)]
+    other = min(neighbours, key=lambda i: energies[xs[i]])
+    if abs(energies[xs[ind]] - energies[xs[other]]) < etol:
+        return []
+
+    if ind in (0, len(xs) - 1):
+        # Expand the search beyond the lowest energy, as in Numerical Recipes'
+        # mnbrak.
+        direction = -1 if ind == 0 else 1
+        step = abs(xs[ind] - xs[other])
+        x = xs[ind]
+        points = []
+        for _ in range(npoints):
+            step *= _GOLDEN
+            x += direction * step
+            if x <= 0:
+                break
+            points.append(x)
+        return points
+
+    a, xm, b = xs[ind - 1], xs[ind], xs[ind + 1]
+    if b - a < 2 * xtol:
+        return []
+    points = []
+    if algo.lower() == "bfgs":
+        ea, em, eb = energies[a], energies[xm], energies[b]
+        den = (xm - a) * (em - eb) - (xm - b) * (em - ea)
+        if den != 0:
+            x = xm - 0.5 * ((xm - a) ** 2 * (em - eb) - (xm - b) ** 2 * (em - ea)) / den
+            if a + xtol < x < b - xtol and abs(x - xm) > xtol:
+                points.append(x)
+    while len(points) < npoints:
+        grid = sorted([a, xm, b] + points)
+        width, i = max((grid[i + 1] - grid[i], i) for i in range(len(grid) - 1))
+        if width < 2 * xtol:
+            break
+        # The golden section of the interval closer to the minimum.
+        near, far = (grid[i], grid[i + 1]) if grid[i + 1] <= xm else (grid[i + 1], grid[i])
+        points.append(near + (far - near) / _GOLDEN ** 2)
+    return points
+
+
+def _write_eos(lattice_direction, energies):
+    """
+    Writes the energies of a constrained optimization to EOS.txt.
+    """
+    with open("EOS.txt", "wt") as f:
+        f.write("# %s energy\n" % lattice_direction)
+        for k in sorted(energies.keys()):
+            f.write("%f %f\n" % (k, energies[k]))
+
+
+def prune_copies(filename, keep, suffix):
+    """
+    Removes all but the most recent copies of a file made by a chain of jobs
+    with numbered suffixes, e.g., WAVECAR.relax1, WAVECAR.relax2, etc. for
+    WAVECAR and the suffix ".relax3". Other files, such as WAVECAR.bak or
+    WAVECAR.relax1.gz, are never removed.
+
+    Args:
+        filename (str): File, e.g., "WAVECAR" or "01/WAVECAR".
+        keep (int): Number of copies to keep.
+        suffix (str): Suffix of the current job. The copies with the same
+            suffix but for its trailing number are pruned.
+    """
+    if not suffix:
+        return
+    stem = re.sub(r"\d+$", "", suffix)
+    pattern = re.compile(re.escape(stem) + (r"\d+$" if stem != suffix else "$"))
+    copies = [
+        f
+        for f in glob.glob(glob.escape(filename + stem) + "*")
+        if os.path.isfile(f) and pattern.match(f[len(filename):])
+    ]
+    copies.sort(key=os.path.getmtime, reverse=True)
+    for f in copies[max(keep, 0):]:
+        logger.info("Removing {}".format(f))
+        os.remove(f)
+
+
 class VaspJob(Job):
     """
     A basic vasp job. Just runs whatever is in the directory. But conceivably
@@ -87,6 +237,8 @@ class VaspJob(Job):
         gamma_vasp_cmd=None,
         copy_magmom=False,
         auto_continue=False,
+        autotune=False,
+        max_wavecar_copies=None,
     ):
         """
         This constructor is necessarily complex due to the need for
@@ -109,10 +261,17 @@ class VaspJob(Job):
             backup (bool): Whether to backup the initial input files. If True,
                 the INCAR, KPOINTS, POSCAR and POTCAR will be copied with a
                 ".orig" appended. Defaults to True.
-            auto_npar (bool): Whether to automatically tune NPAR to be sqrt(
-                number of cores) as recommended by VASP for DFT calculations.
-                Generally, this results in significant speedups. Defaults to
-                True. Set to False for HF, GW and RPA calculations.
+            auto_npar (bool): Whether to automatically choose KPAR and NPAR
+                from the number of bands and irreducible k-points, the number
+                of cores and the topology of the nodes (see
+                custodian.vasp.parallel.ParallelPlanner). If
+                $CUSTODIAN_VASP_PERF_DB is set, the timings of finished runs
+                are recorded in that performance database, which refines the
+                choices for similar systems. If the size of the system cannot
+                be read from the inputs, only NPAR is set, from the number of
+                cores. Generally, this results in significant speedups.
+                Defaults to True. Set to False for HF, GW and RPA
+                calculations.
             auto_gamma (bool): Whether to automatically check if run is a
                 Gamma 1x1x1 run, and whether a Gamma optimized version of
                 VASP exists with ".gamma" appended to the name of the VASP
@@ -139,6 +298,17 @@ class VaspJob(Job):
                 if a STOPCAR is present. This is very useful if using the
                 wall-time handler which will write a read-only STOPCAR to
                 prevent VASP from deleting it once it finishes
+            autotune (bool): Whether to choose KPAR, NCORE and LPLANE from
+                short trial runs of the input before the run (see
+                custodian.vasp.autotune.ParallelAutotuner). The fastest
+                settings are cached per structure, class of INCAR and number
+                of cores. Worthwhile for long runs only. Ignored for HF, RPA
+                and Hessian matrix calculations. Defaults to False.
+            max_wavecar_copies (int): Maximum number of copies of the WAVECAR
+                made by the jobs of a chain, i.e., with the suffix of this
+                job but for its trailing number, e.g., WAVECAR.relax1 for
+                ".relax2", kept after the run. The oldest copies are removed
+                first. Defaults to None, i.e., all copies are kept.
         """
         self.vasp_cmd = vasp_cmd
         self.output_file = output_file
@@ -152,31 +322,41 @@ class VaspJob(Job):
         self.gamma_vasp_cmd = gamma_vasp_cmd
         self.copy_magmom = copy_magmom
         self.auto_continue = auto_continue
+        self.autotune = autotune
+        self.max_wavecar_copies = max_wavecar_copies
+        self._process = None
 
         if SENTRY_DSN:
-            # if using Sentry logging, add specific VASP executable to scope
-            from sentry_sdk import configure_scope
-
-            with configure_scope() as scope:
-                try:
-                    if isinstance(vasp_cmd, str):
-                        vasp_path = which(vasp_cmd.split(" ")[-1])
-                    elif isinstance(vasp_cmd, list):
-                        vasp_path = which(vasp_cmd[-1])
-                    scope.set_tag("vasp_path", vasp_path)
-                    scope.set_tag("vasp_cmd", vasp_cmd)
-                except Exception:
-                    logger.error(
-                        "Failed to detect VASP path: {}".format(vasp_cmd), exc_info=True
-                    )
-                    scope.set_tag("vasp_cmd", vasp_cmd)
+            # if using Sentry logging, add specific VASP executable to the
+            # tags of the reports
+            add_sentry_tags(vasp_cmd=vasp_cmd)
+            try:
+                if isinstance(vasp_cmd, str):
+                    vasp_path = which(vasp_cmd.split(" ")[-1])
+                elif isinstance(vasp_cmd, list):
+                    vasp_path = which(vasp_cmd[-1])
+                add_sentry_tags(vasp_path=vasp_path)
+            except Exception:
+                init_sentry()
+                logger.error(
+                    "Failed to detect VASP path: {}".format(vasp_cmd), exc_info=True
+                )
 
     def setup(self):
         """
         Performs initial setup for VaspJob, including overriding any settings
         and backing up.
         """
-        decompress_dir(".")
+        from pymatgen.io.vasp.inputs import Incar
+
+        # Only the files read by the job are decompressed, rather than, e.g.,
+        # the outputs of previous jobs and the backups of their errors.
+        actions = list(self.settings_override or [])
+        if isinstance(self.auto_continue, list):
+            actions.extend(self.auto_continue)
+        if os.path.exists("continue.json"):
+            actions.extend(loadfn("continue.json").get("actions") or [])
+        decompress_files(sorted(VASP_SETUP_FILES) + [a["file"] for a in actions if "file" in a])
 
         if self.backup:
             for f in VASP_INPUT_FILES:
@@ -198,17 +378,20 @@ class VaspJob(Job):
                         # calculations, whether in DFPT or otherwise.
                         del incar["NPAR"]
                     else:
-                        import multiprocessing
-
-                        # try sge environment variable first
-                        # (since multiprocessing counts cores on the current
-                        # machine only)
-                        ncores = os.environ.get("NSLOTS") or multiprocessing.cpu_count()
-                        ncores = int(ncores)
-                        for npar in range(int(math.sqrt(ncores)), ncores):
-                            if ncores % npar == 0:
+                        ncores = get_ncores(self.vasp_cmd)
+                        try:
+                            system = read_system()
+                            plan = ParallelPlanner(ncores).plan(system["nkpts"], system["nbands"])
+                        except Exception:
+                            logger.warning("Cannot plan the parallelisation. Setting NPAR only.", exc_info=True)
+                            npar = default_npar(ncores)
+                            if npar:
                                 incar["NPAR"] = npar
-                                break
+                        else:
+                            logger.info("Parallelisation for {}: {}".format(system, plan))
+                            incar.pop("NCORE", None)
+                            incar["KPAR"] = plan["KPAR"]
+                            incar["NPAR"] = plan["NPAR"]
                     incar.write_file("INCAR")
             except Exception:
                 pass
@@ -238,6 +421,31 @@ class VaspJob(Job):
         if self.settings_override is not None:
             VaspModder().apply_actions(self.settings_override)
 
+        if self.autotune:
+            # Tune the final input, after the continuation and the overrides.
+            try:
+                incar = Incar.from_file("INCAR")
+                if not (
+                    incar.get("LHFCALC")
+                    or incar.get("LRPA")
+                    or incar.get("LEPSILON")
+                    or incar.get("IBRION") in [5, 6, 7, 8]
+                ):
+                    settings = ParallelAutotuner(self.vasp_cmd).tune()
+                    if settings is not None:
+                        logger.info("Autotuned parallel settings: {}".format(settings))
+                        actions = [{"dict": "INCAR", "action": {"_set": settings}}]
+                        if "NPAR" in incar:
+                            # NPAR, e.g. from an override, takes precedence
+                            # over NCORE.
+                            actions.append({"dict": "INCAR", "action": {"_unset": {"NPAR": 1}}})
+                        VaspModder().apply_actions(actions)
+            except Exception:
+                logger.warning("Autotuning failed.", exc_info=True)
+
+        if os.path.exists("INCAR"):
+            decompress_files(get_restart_files(Incar.from_file("INCAR")))
+
     def run(self):
         """
         Perform the actual VASP run.
@@ -245,6 +453,8 @@ class VaspJob(Job):
         Returns:
             (subprocess.Popen) Used for monitoring.
         """
+        from pymatgen.io.vasp.inputs import Kpoints, VaspInput
+
         cmd = list(self.vasp_cmd)
         if self.auto_gamma:
             vi = VaspInput.from_directory(".")
@@ -263,8 +473,10 @@ class VaspJob(Job):
         with open(self.output_file, "w") as f_std, open(
             self.stderr_file, "w", buffering=1
         ) as f_err:
-            # use line buffering for stderr
-            p = subprocess.Popen(cmd, stdout=f_std, stderr=f_err)
+            # use line buffering for stderr. VASP is run in its own process
+            # group, so that terminate only kills the processes of this job.
+            p = start_process(cmd, stdout=f_std, stderr=f_err)
+        self._process = p
         return p
 
     def postprocess(self):
@@ -272,12 +484,29 @@ class VaspJob(Job):
         Postprocessing includes renaming and gzipping where necessary.
         Also copies the magmom to the incar if necessary
         """
+        from pymatgen.io.vasp.inputs import Incar
+        from pymatgen.io.vasp.outputs import Outcar
+
+        if self.auto_npar and get_perf_db_path() and os.path.exists("OUTCAR"):
+            # Feed the timings of the run back to the parallelisation planner.
+            try:
+                timings = read_outcar_timings("OUTCAR")
+                if timings is not None:
+                    ParallelPlanner(timings["ncores"]).record(timings)
+            except Exception:
+                logger.warning("Failed to record the timings of the run.", exc_info=True)
+
         for f in VASP_OUTPUT_FILES + [self.output_file]:
             if os.path.exists(f):
                 if self.final and self.suffix != "":
                     shutil.move(f, "{}{}".format(f, self.suffix))
                 elif self.suffix != "":
-                    shutil.copy(f, "{}{}".format(f, self.suffix))
+                    # The outputs of non-final jobs, e.g., multi-GB WAVECARs,
+                    # are cloned rather than copied where possible.
+                    clone_file(f, "{}{}".format(f, self.suffix))
+
+        if self.max_wavecar_copies is not None:
+            prune_copies("WAVECAR", self.max_wavecar_copies, self.suffix)
 
         if self.copy_magmom and not self.final:
             try:
@@ -311,10 +540,17 @@ class VaspJob(Job):
             vasp_cmd (str): Command to run vasp as a list of args. For example,
                 if you are using mpirun, it can be something like
                 ["mpirun", "pvasp.5.2.11"]
-            auto_npar (bool): Whether to automatically tune NPAR to be sqrt(
-                number of cores) as recommended by VASP for DFT calculations.
-                Generally, this results in significant speedups. Defaults to
-                True. Set to False for HF, GW and RPA calculations.
+            auto_npar (bool): Whether to automatically choose KPAR and NPAR
+                from the number of bands and irreducible k-points, the number
+                of cores and the topology of the nodes (see
+                custodian.vasp.parallel.ParallelPlanner). If
+                $CUSTODIAN_VASP_PERF_DB is set, the timings of finished runs
+                are recorded in that performance database, which refines the
+                choices for similar systems. If the size of the system cannot
+                be read from the inputs, only NPAR is set, from the number of
+                cores. Generally, this results in significant speedups.
+                Defaults to True. Set to False for HF, GW and RPA
+                calculations.
             ediffg (float): Force convergence criteria for subsequent runs (
                 ignored for the initial run.)
             half_kpts_first_relax (bool): Whether to halve the kpoint grid
@@ -324,6 +560,8 @@ class VaspJob(Job):
         Returns:
             List of two jobs corresponding to an AFLOW style run.
         """
+        from pymatgen.io.vasp.inputs import Kpoints
+
         incar_update = {"ISTART": 1}
         if ediffg:
             incar_update["EDIFFG"] = ediffg
@@ -387,6 +625,7 @@ class VaspJob(Job):
         to precondition the electronic structure optimizer. The metaGGA
         optimization is performed using the double relaxation scheme
         """
+        from pymatgen.io.vasp.inputs import Incar
 
         incar = Incar.from_file("INCAR")
         # Defaults to using the SCAN metaGGA
@@ -477,6 +716,8 @@ class VaspJob(Job):
         Returns:
             Generator of jobs.
         """
+        from pymatgen.io.vasp.inputs import Kpoints, Poscar
+
         for i in range(max_steps):
             if i == 0:
                 settings = None
@@ -534,6 +775,8 @@ class VaspJob(Job):
         atom_relax=True,
         max_steps=20,
         algo="bfgs",
+        npoints=1,
+        handlers=None,
         **vasp_job_kwargs
     ):
         r"""
@@ -570,6 +813,19 @@ class VaspJob(Job):
                 which is more robust but can be a bit slow. The code does fall
                 back on the bisection when bfgs gives a non-sensical result,
                 e.g., negative lattice params.
+            npoints (int): Number of lattice parameters evaluated
+                concurrently, each on an equal slice of the cores of vasp_cmd
+                and in its own directory, e.g., "c_5.123400". With more than
+                one point, the lattice parameter is searched in rounds of
+                npoints runs (see propose_lattice_parameters), and each
+                round is a ConcurrentVaspJob, which copies the outputs of
+                the lowest energy run to the current directory, where the
+                handlers of the Custodian running the jobs check them. The
+                first round is centred on the initial lattice parameter.
+                Defaults to 1, i.e., one run at a time in the current
+                directory.
+            handlers ([ErrorHandler]): Error handlers of each run, if npoints
+                is more than one. Defaults to None, i.e., no handlers.
             \*\*vasp_job_kwargs: Passthrough kwargs to VaspJob. See
                 :class:`custodian.vasp.jobs.VaspJob`.
 
@@ -577,6 +833,10 @@ class VaspJob(Job):
             Generator of jobs. At the end of the run, an "EOS.txt" is written
             which provides a quick look at the E vs lattice parameter.
         """
+        from pymatgen.core.structure import Structure
+        from pymatgen.io.vasp.inputs import Incar, Poscar
+        from pymatgen.io.vasp.outputs import Vasprun
+
         nsw = 99 if atom_relax else 0
 
         incar = Incar.from_file("INCAR")
@@ -597,6 +857,50 @@ class VaspJob(Job):
 
         energies = {}
 
+        if npoints > 1:
+            structure = Poscar.from_file("POSCAR").structure
+            incar.update({"ISIF": 2, "NSW": nsw})
+            x = structure.lattice.abc[lattice_index]
+            # The first round is centred on the initial lattice parameter, in
+            # steps of the initial strain.
+            points = [x * (1 + initial_strain * (j - (npoints - 1) // 2)) for j in range(npoints)]
+            nruns = 0
+            while points:
+                if nruns:
+                    # The later rounds start from the collected INCAR, with
+                    # the corrections of the previous rounds.
+                    incar = Incar.from_file("INCAR")
+                    incar.update({"ISIF": 2, "NSW": nsw})
+                nruns += len(points)
+                directories = []
+                for x in points:
+                    d = "%s_%f" % (lattice_direction, x)
+                    os.makedirs(d, exist_ok=True)
+                    lattice = structure.lattice.matrix.copy()
+                    lattice[lattice_index] = lattice[lattice_index] / np.linalg.norm(lattice[lattice_index]) * x
+                    s = Structure(lattice, structure.species, structure.frac_coords)
+                    s.to(filename=os.path.join(d, "POSCAR"))
+                    incar.write_file(os.path.join(d, "INCAR"))
+                    for f in ["KPOINTS", "POTCAR"]:
+                        if os.path.exists(f):
+                            clone_file(f, os.path.join(d, f))
+                    directories.append(d)
+                logger.info("Generating jobs with parameters %s!" % ", ".join("%f" % x for x in points))
+                yield ConcurrentVaspJob(vasp_cmd, directories, handlers=handlers, vasp_job_kwargs=vasp_job_kwargs)
+                for x, d in zip(points, directories):
+                    try:
+                        energies[x] = Vasprun(os.path.join(d, "vasprun.xml")).final_energy
+                    except Exception:
+                        logger.warning("No energy for %s = %f." % (lattice_direction, x))
+                points = propose_lattice_parameters(energies, npoints, etol, algo)[: max_steps - nruns]
+            if energies:
+                logger.info(
+                    "Stopping optimization! Final %s = %f"
+                    % (lattice_direction, min(energies, key=energies.get))
+                )
+            _write_eos(lattice_direction, energies)
+            return
+
         for i in range(max_steps):
             if i == 0:
                 settings = [
@@ -718,21 +1022,209 @@ class VaspJob(Job):
                 **vasp_job_kwargs
             )
 
-        with open("EOS.txt", "wt") as f:
-            f.write("# %s energy\n" % lattice_direction)
-            for k in sorted(energies.keys()):
-                f.write("%f %f\n" % (k, energies[k]))
+        _write_eos(lattice_direction, energies)
 
     def terminate(self):
         """
-        Ensure all vasp jobs are killed.
+        Ensure all vasp processes of this job are killed, i.e., all the
+        processes in the process group VASP was started in by run, and wait
+        for them to exit.
         """
-        for k in self.vasp_cmd:
-            if "vasp" in k:
-                try:
-                    os.system("killall %s" % k)
-                except Exception:
-                    pass
+        if self._process is not None:
+            terminate_process(self._process)
+
+    @property
+    def ncores(self):
+        """
+        Number of MPI processes requested in vasp_cmd, if any.
+        """
+        return get_mpi_ncores(self.vasp_cmd)
+
+
+class ConcurrentVaspJob(Job):
+    """
+    Runs VASP concurrently in several directories, e.g., for the strained
+    structures of a constrained optimization. Each run gets an equal slice
+    of the cores requested by the VASP command, and is supervised by its own
+    AsyncCustodian with its own copy of the error handlers. The job blocks
+    until all the runs have finished, and then copies the outputs of the run
+    with the lowest final energy to the current directory, where the
+    handlers and validators of the Custodian running the job check them.
+    The corrections of these handlers to the INCAR of the current directory
+    are applied to the INCARs of all the runs when the job is rerun.
+
+    The runs are bound to their own cores through placeholders in the VASP
+    command, which are replaced for each run by a slice of the cores of
+    the allocation, split as BatchRunner splits it between workflows:
+
+        $CUSTODIAN_SLICE_HOSTFILE  hostfile with the host and number of
+                                   slots of the run
+        $CUSTODIAN_SLICE_CPUS      indices of the cores of the run on the
+                                   host, e.g., "8-15"
+
+    e.g., ["mpirun", "-np", "24", "--hostfile", "$CUSTODIAN_SLICE_HOSTFILE",
+    "--cpu-set", "$CUSTODIAN_SLICE_CPUS", "--bind-to", "core", "vasp_std"].
+    Without them, the MPI launcher decides where the processes of each run
+    go, and usually places the processes of all the runs on the same cores.
+
+    The job must be run by a Custodian, not by an AsyncCustodian.
+    """
+
+    SLICE_HOSTFILE = "custodian_slice.hosts"
+
+    def __init__(self, vasp_cmd, directories, handlers=None, max_errors=10, vasp_job_kwargs=None):
+        """
+        Args:
+            vasp_cmd ([str]): Command to run vasp, as for VaspJob. The number
+                of MPI processes it requests, if any, is split between the
+                runs, e.g., ["mpirun", "-np", "6", "vasp_std"] for each of 4
+                runs of ["mpirun", "-np", "24", "vasp_std"]. It may bind the
+                runs with the placeholders above.
+            directories ([str]): Directories with the inputs of the runs.
+            handlers ([ErrorHandler]): Error handlers of each run. Defaults to
+                None, i.e., no handlers.
+            max_errors (int): Maximum number of errors of each run. Defaults
+                to 10.
+            vasp_job_kwargs (dict): Keyword arguments of the VaspJob of each
+                run. Defaults to None.
+        """
+        self.vasp_cmd = vasp_cmd
+        self.directories = directories
+        self.handlers = handlers
+        self.max_errors = max_errors
+        self.vasp_job_kwargs = vasp_job_kwargs
+        self._incar = None
+
+    def setup(self):
+        """
+        Records the INCAR of the current directory, if any, so that the
+        changes made to it later are applied to the runs as well. Each run
+        sets up its own directory.
+        """
+        from pymatgen.io.vasp.inputs import Incar
+
+        if os.path.exists("INCAR"):
+            self._incar = Incar.from_file("INCAR")
+
+    def _propagate_incar(self):
+        """
+        Applies the changes made to the INCAR of the current directory since
+        it was last recorded, e.g., by the handlers of the Custodian running
+        the job, to the INCARs of the runs.
+        """
+        from pymatgen.io.vasp.inputs import Incar
+
+        if self._incar is None or not os.path.exists("INCAR"):
+            return
+        incar = Incar.from_file("INCAR")
+        changed = {k: v for k, v in incar.items() if self._incar.get(k) != v}
+        removed = [k for k in self._incar if k not in incar]
+        if not changed and not removed:
+            return
+        logger.info("Applying the changes to the INCAR to the runs: set {}, removed {}.".format(changed, removed))
+        for d in self.directories:
+            path = os.path.join(d, "INCAR")
+            run_incar = Incar.from_file(path)
+            run_incar.update(changed)
+            for k in removed:
+                run_incar.pop(k, None)
+            run_incar.write_file(path)
+
+    def run(self):
+        """
+        Runs VASP in all the directories, and waits until all the runs have
+        finished.
+
+        Returns:
+            None, since there is no single process to monitor.
+        """
+        ncores = get_ncores(self.vasp_cmd)
+        if get_mpi_ncores(self.vasp_cmd) is None:
+            logger.warning(
+                "{} does not set the number of MPI processes, so the runs share the cores.".format(self.vasp_cmd)
+            )
+        ncores_per_run = max(ncores // len(self.directories), 1)
+        cmd = set_mpi_ncores(self.vasp_cmd, ncores_per_run)
+        self._propagate_incar()
+        cmds = self._bind(cmd, ncores_per_run)
+        custodians = [
+            AsyncCustodian(
+                copy.deepcopy(self.handlers or []),
+                [VaspJob(c, **(self.vasp_job_kwargs or {}))],
+                directory=d,
+                max_errors=self.max_errors,
+            )
+            for d, c in zip(self.directories, cmds)
+        ]
+        logger.info("Running {} in {}".format(cmd, ", ".join(self.directories)))
+        for d, result in zip(self.directories, run_many(custodians)):
+            if isinstance(result, BaseException):
+                logger.error("Run in {} failed: {}".format(d, result))
+        self._collect()
+        # Only the later changes to the collected INCAR are propagated.
+        self.setup()
+
+    def _bind(self, cmd, ncores):
+        """
+        Returns the command of each run, with the binding placeholders
+        replaced by the slice of the run, whose hostfile is written in its
+        directory.
+        """
+        args = cmd.split() if isinstance(cmd, str) else cmd
+        if not any("$CUSTODIAN_SLICE_" in a for a in args):
+            return [cmd] * len(self.directories)
+        slices = split_allocation(len(self.directories), ncores)
+        if slices is None:
+            raise ValueError(
+                "{} runs of {} cores do not fit in the allocation, each on a single host.".format(
+                    len(self.directories), ncores
+                )
+            )
+        cmds = []
+        for d, (host, cpus) in zip(self.directories, slices):
+            hostfile = os.path.abspath(os.path.join(d, ConcurrentVaspJob.SLICE_HOSTFILE))
+            with open(hostfile, "w") as f:
+                f.write("{} slots={}\n".format(host, ncores))
+            run_args = [
+                a.replace("$CUSTODIAN_SLICE_HOSTFILE", hostfile).replace("$CUSTODIAN_SLICE_CPUS", cpus) for a in args
+            ]
+            cmds.append(" ".join(run_args) if isinstance(cmd, str) else run_args)
+            logger.info("Run in {} bound to {} cores {}.".format(d, host, cpus))
+        return cmds
+
+    def _collect(self):
+        """
+        Copies the outputs of the run with the lowest final energy to the
+        current directory.
+        """
+        from pymatgen.io.vasp.outputs import Oszicar
+
+        energies = {}
+        for d in self.directories:
+            try:
+                energies[d] = Oszicar(os.path.join(d, "OSZICAR")).final_energy
+            except Exception:
+                continue
+        if not energies:
+            return
+        best = min(energies, key=energies.get)
+        for f in VASP_OUTPUT_FILES + ["vasp.out"]:
+            # The wavefunctions are not needed by the checks.
+            if f != "WAVECAR" and os.path.exists(os.path.join(best, f)):
+                clone_file(os.path.join(best, f), f)
+
+    def postprocess(self):
+        """
+        Nothing to postprocess, since each run postprocesses its own
+        directory.
+        """
+
+    @property
+    def ncores(self):
+        """
+        Number of MPI processes requested in vasp_cmd, if any.
+        """
+        return get_mpi_ncores(self.vasp_cmd)
 
 
 class VaspNEBJob(Job):
@@ -756,6 +1248,7 @@ class VaspNEBJob(Job):
         auto_continue=False,
         gamma_vasp_cmd=None,
         settings_override=None,
+        max_wavecar_copies=None,
     ):
         """
         This constructor is a simplified version of VaspJob, which satisfies
@@ -779,10 +1272,12 @@ class VaspNEBJob(Job):
             backup (bool): Whether to backup the initial input files. If True,
                 the INCAR, KPOINTS, POSCAR and POTCAR will be copied with a
                 ".orig" appended. Defaults to True.
-            auto_npar (bool): Whether to automatically tune NPAR to be sqrt(
-                number of cores) as recommended by VASP for DFT calculations.
-                Generally, this results in significant speedups. Defaults to
-                True. Set to False for HF, GW and RPA calculations.
+            auto_npar (bool): Whether to automatically choose KPAR and NPAR
+                from the number of bands and irreducible k-points and the
+                number of cores per image (see
+                custodian.vasp.parallel.ParallelPlanner). Generally, this
+                results in significant speedups. Defaults to True. Set to
+                False for HF, GW and RPA calculations.
             half_kpts (bool): Whether to halve the kpoint grid for NEB.
                 Speeds up convergence considerably. Defaults to False.
             auto_gamma (bool): Whether to automatically check if run is a
@@ -807,6 +1302,10 @@ class VaspNEBJob(Job):
                     [{"dict": "INCAR", "action": {"_set": {"ISTART": 1}}},
                      {"file": "CONTCAR",
                       "action": {"_file_copy": {"dest": "POSCAR"}}}]
+            max_wavecar_copies (int): Maximum number of copies of the WAVECAR
+                of each image made by the jobs of a chain, as for VaspJob,
+                kept after the run. The oldest copies are removed first.
+                Defaults to None, i.e., all copies are kept.
         """
 
         self.vasp_cmd = vasp_cmd
@@ -821,6 +1320,7 @@ class VaspNEBJob(Job):
         self.gamma_vasp_cmd = gamma_vasp_cmd
         self.auto_continue = auto_continue
         self.settings_override = settings_override
+        self.max_wavecar_copies = max_wavecar_copies
         self.neb_dirs = []  # 00, 01, etc.
         self.neb_sub = []  # 01, 02, etc.
 
@@ -835,6 +1335,8 @@ class VaspNEBJob(Job):
         Performs initial setup for VaspNEBJob, including overriding any settings
         and backing up.
         """
+        from pymatgen.io.vasp.inputs import Incar, Kpoints
+
         neb_dirs = self.neb_dirs
 
         if self.backup:
@@ -859,17 +1361,20 @@ class VaspNEBJob(Job):
         if self.auto_npar:
             try:
                 incar = Incar.from_file("INCAR")
-                import multiprocessing
-
-                # Try sge environment variable first
-                # (since multiprocessing counts cores on the current
-                # machine only)
-                ncores = os.environ.get("NSLOTS") or multiprocessing.cpu_count()
-                ncores = int(ncores)
-                for npar in range(int(math.sqrt(ncores)), ncores):
-                    if ncores % npar == 0:
+                # The cores are split between the images.
+                ncores = max(get_ncores(self.vasp_cmd) // int(incar.get("IMAGES", 1)), 1)
+                try:
+                    system = read_system(os.path.join(neb_dirs[0], "POSCAR"))
+                    plan = ParallelPlanner(ncores).plan(system["nkpts"], system["nbands"])
+                except Exception:
+                    logger.warning("Cannot plan the parallelisation. Setting NPAR only.", exc_info=True)
+                    npar = default_npar(ncores)
+                    if npar:
                         incar["NPAR"] = npar
-                        break
+                else:
+                    incar.pop("NCORE", None)
+                    incar["KPAR"] = plan["KPAR"]
+                    incar["NPAR"] = plan["NPAR"]
                 incar.write_file("INCAR")
             except Exception:
                 pass
@@ -899,6 +1404,8 @@ class VaspNEBJob(Job):
         Returns:
             (subprocess.Popen) Used for monitoring.
         """
+        from pymatgen.io.vasp.inputs import Kpoints
+
         cmd = list(self.vasp_cmd)
         if self.auto_gamma:
             kpts = Kpoints.from_file("KPOINTS")
@@ -917,7 +1424,7 @@ class VaspNEBJob(Job):
         ) as f_err:
 
             # Use line buffering for stderr
-            p = subprocess.Popen(cmd, stdout=f_std, stderr=f_err)
+            p = start_process(cmd, stdout=f_std, stderr=f_err)
         return p
 
     def postprocess(self):
@@ -932,7 +1439,9 @@ class VaspNEBJob(Job):
                     if self.final and self.suffix != "":
                         shutil.move(f, "{}{}".format(f, self.suffix))
                     elif self.suffix != "":
-                        shutil.copy(f, "{}{}".format(f, self.suffix))
+                        clone_file(f, "{}{}".format(f, self.suffix))
+            if self.max_wavecar_copies is not None:
+                prune_copies(os.path.join(path, "WAVECAR"), self.max_wavecar_copies, self.suffix)
 
         # Add suffix to all output files
         for f in VASP_NEB_OUTPUT_FILES + [self.output_file]:
@@ -940,7 +1449,14 @@ class VaspNEBJob(Job):
                 if self.final and self.suffix != "":
                     shutil.move(f, "{}{}".format(f, self.suffix))
                 elif self.suffix != "":
-                    shutil.copy(f, "{}{}".format(f, self.suffix))
+                    clone_file(f, "{}{}".format(f, self.suffix))
+
+    @property
+    def ncores(self):
+        """
+        Number of MPI processes requested in vasp_cmd, if any.
+        """
+        return get_mpi_ncores(self.vasp_cmd)
 
 
 class GenerateVaspInputJob(Job):
@@ -970,6 +1486,8 @@ class GenerateVaspInputJob(Job):
         """
         Run the calculation.
         """
+        from pymatgen.core.structure import Structure
+
         if os.path.exists("CONTCAR"):
             structure = Structure.from_file("CONTCAR")
         elif (not self.contcar_only) and os.path.exists("POSCAR"):
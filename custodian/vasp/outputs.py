@@ -0,0 +1,153 @@
+# coding: utf-8
+
+"""
+Lightweight readers of VASP output files for the handlers that monitor a
+running job. Unlike the full pymatgen parsers, these only extract what the
+handlers need and follow the files incrementally between checks.
+"""
+
+import re
+
+import numpy as np
+
+from custodian.utils import TailReader
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+class OszicarReader:
+    """
+    Incremental reader of the ionic and electronic steps in an OSZICAR. Each
+    call to update only parses the lines appended since the previous call,
+    and the steps are exposed as NumPy arrays. The OSZICAR is parsed the same
+    way as by pymatgen.io.vasp.outputs.Oszicar.
+    """
+
+    _electronic_pattern = re.compile(r"\s*\w+\s*:\s*(\S+)")
+    _header_pattern = re.compile(r"^\s*N\s+E\s*")
+    _ionic_pattern = re.compile(r"(\w+)=\s*(\S+)")
+
+    def __init__(self, filename="OSZICAR"):
+        """
+        Args:
+            filename (str): OSZICAR file to follow. Defaults to "OSZICAR".
+        """
+        self.filename = filename
+        self._reader = TailReader(filename)
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets all steps read so far.
+        """
+        self._reader.reset()
+        self._n_electronic = []
+        self.ionic_steps = []
+        self._arrays = {}
+        self._undo = None
+
+    def update(self):
+        """
+        Reads the steps appended to the OSZICAR since the last call. If the
+        file has been rewritten in the meantime, it is read from the start.
+        A trailing line that is still being written is parsed as well, but
+        only provisionally until it is complete.
+
+        Returns:
+            self, for chaining.
+        """
+        lines = self._reader.readlines()
+        if self._reader.rewound:
+            self._n_electronic = []
+            self.ionic_steps = []
+        elif self._undo is not None:
+            self._undo()
+        self._undo = None
+        for line in lines:
+            undo = self._parse_line(line.strip())
+            if self._reader.incomplete:
+                self._undo = undo
+        self._arrays = {}
+        return self
+
+    def _parse_line(self, line):
+        """
+        Parses a line into the steps. Returns a function reverting that.
+        """
+        m = self._electronic_pattern.match(line)
+        if m:
+            if m.group(1) == "1" or not self._n_electronic:
+                self._n_electronic.append(1)
+                return self._n_electronic.pop
+
+            self._n_electronic[-1] += 1
+
+            def undo():
+                self._n_electronic[-1] -= 1
+
+            return undo
+        if line and not self._header_pattern.match(line):
+            matches = self._ionic_pattern.findall(re.sub(r"d E ", "dE", line))
+            self.ionic_steps.append({k: _to_float(v) for k, v in matches})
+            return self.ionic_steps.pop
+        return None
+
+    def _array(self, key):
+        if key not in self._arrays:
+            self._arrays[key] = np.array([s.get(key, np.nan) for s in self.ionic_steps], dtype=float)
+        return self._arrays[key]
+
+    @property
+    def n_electronic_steps(self):
+        """
+        Number of electronic steps in each ionic step, including the one in
+        progress, as an int array.
+        """
+        return np.array(self._n_electronic, dtype=int)
+
+    @property
+    def energies(self):
+        """
+        Energy E0 at the end of each completed ionic step, as an array.
+        """
+        return self._array("E0")
+
+    @property
+    def free_energies(self):
+        """
+        Free energy F at the end of each completed ionic step, as an array.
+        """
+        return self._array("F")
+
+    @property
+    def energy_changes(self):
+        """
+        Energy change dE of each completed ionic step, as an array.
+        """
+        return self._array("dE")
+
+
+def count_atoms(filename="POSCAR"):
+    """
+    Returns the number of atoms in a POSCAR or CONTCAR from its species
+    counts, without building a Structure.
+
+    Args:
+        filename (str): POSCAR file. Defaults to "POSCAR".
+
+    Returns:
+        (int) Number of atoms.
+    """
+    with open(filename) as f:
+        lines = [f.readline() for _ in range(7)]
+    # VASP 5 files have a line of species symbols before the counts.
+    for line in lines[5:7]:
+        tokens = line.split()
+        if tokens and all(t.isdigit() for t in tokens):
+            return sum(int(t) for t in tokens)
+    raise ValueError("Cannot read the number of atoms in {}".format(filename))
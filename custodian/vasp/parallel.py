@@ -0,0 +1,420 @@
+# coding: utf-8
+
+"""
+Planning of the parallelisation of VASP runs, i.e., of KPAR (number of
+k-point groups) and NPAR (number of band groups per k-point group, i.e.,
+NCORE = cores / KPAR / NPAR cores per band), from the size of the system
+and the topology of the nodes.
+
+Candidate decompositions are ranked with a simple performance model of an
+electronic step, which accounts for the k-points left idle by KPAR, the
+bands handled by each band group, and the communication of the FFTs of a
+band across the cores, sockets and nodes that share it. If the
+CUSTODIAN_VASP_PERF_DB environment variable names a local performance
+database, a JSON lines file, the timings of the electronic steps of
+finished runs are recorded in it, and measured timings of similar systems
+correct the model for the decompositions that have been tried before.
+"""
+
+import json
+import math
+import os
+import re
+
+from custodian.utils import get_mpi_ncores
+
+# Environment variable overriding the location of the performance database.
+PERF_DB_ENV = "CUSTODIAN_VASP_PERF_DB"
+
+
+def get_perf_db_path():
+    """
+    Returns the path of the performance database, i.e.,
+    $CUSTODIAN_VASP_PERF_DB, or None if it is not set, in which case no
+    timings are recorded.
+    """
+    return os.environ.get(PERF_DB_ENV) or None
+
+
+def get_node_topology():
+    """
+    Returns the number of cores per node and per socket of the current host,
+    as allocated by the batch system if it tells.
+
+    Returns:
+        (cores per node, cores per socket)
+    """
+    cores = None
+    for var in ("SLURM_CPUS_ON_NODE", "PBS_NUM_PPN", "NSLOTS"):
+        if os.environ.get(var, "").isdigit():
+            cores = int(os.environ[var])
+            break
+    cores = cores or os.cpu_count() or 1
+    sockets = set()
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("physical id"):
+                    sockets.add(line.split(":")[1].strip())
+    except OSError:
+        pass
+    return cores, max(cores // max(len(sockets), 1), 1)
+
+
+def _divisors(n):
+    return [d for d in range(1, n + 1) if n % d == 0]
+
+
+def _read_species_counts(poscar="POSCAR"):
+    """
+    Returns the number of atoms of each species of a POSCAR, in order.
+    """
+    with open(poscar) as f:
+        lines = [f.readline() for _ in range(7)]
+    for line in lines[5:7]:
+        tokens = line.split()
+        if tokens and all(t.isdigit() for t in tokens):
+            return [int(t) for t in tokens]
+    raise ValueError("Cannot read the species counts in {}".format(poscar))
+
+
+def _read_zvals(potcar="POTCAR"):
+    """
+    Returns the valence of each species of a POTCAR, in order.
+    """
+    zvals = []
+    with open(potcar) as f:
+        for line in f:
+            m = re.search(r"ZVAL\s*=\s*([\d.]+)", line)
+            if m:
+                zvals.append(float(m.group(1)))
+    return zvals
+
+
+def estimate_nbands(incar, natoms, nelect):
+    """
+    Returns NBANDS as set in an INCAR, or else the default of VASP.
+
+    Args:
+        incar (dict): INCAR.
+        natoms (int): Number of atoms.
+        nelect (float): Number of electrons.
+    """
+    if incar.get("NBANDS"):
+        return int(incar["NBANDS"])
+    nbands = max(int(round(nelect + 2) / 2) + max(natoms // 2, 3), int(0.6 * nelect))
+    if incar.get("LNONCOLLINEAR") or incar.get("LSORBIT"):
+        nbands *= 2
+    return nbands
+
+
+def estimate_nkpts(incar, kpoints, structure):
+    """
+    Returns the number of irreducible k-points of a run, from the IBZKPT of
+    a previous run if there is one, and else from the k-point mesh reduced
+    by the symmetry of the structure.
+
+    Args:
+        incar (dict): INCAR.
+        kpoints (Kpoints): KPOINTS, or None if KSPACING is used.
+        structure (Structure): Structure.
+    """
+    if os.path.exists("IBZKPT"):
+        try:
+            with open("IBZKPT") as f:
+                f.readline()
+                return max(int(f.readline().split()[0]), 1)
+        except (ValueError, IndexError):
+            pass
+    shift = (0, 0, 0)
+    if kpoints is None:
+        spacing = float(incar.get("KSPACING", 0.5))
+        mesh = [max(1, int(math.ceil(b / spacing))) for b in structure.lattice.reciprocal_lattice.abc]
+        if not incar.get("KGAMMA", True):
+            shift = (0.5, 0.5, 0.5)
+    elif kpoints.style.name.lower() in ("gamma", "monkhorst"):
+        mesh = [int(k) for k in kpoints.kpts[0]]
+        if kpoints.style.name.lower() == "monkhorst":
+            shift = tuple(0.5 if k % 2 == 0 else 0 for k in mesh)
+    elif kpoints.style.name.lower() == "line_mode":
+        return max(kpoints.num_kpts * len(kpoints.kpts) // 2, 1)
+    else:
+        return max(len(kpoints.kpts), 1)
+    try:
+        from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+        return len(SpacegroupAnalyzer(structure).get_ir_reciprocal_mesh(mesh, shift))
+    except Exception:
+        # Time reversal symmetry alone halves the mesh.
+        return max((mesh[0] * mesh[1] * mesh[2] + 1) // 2, 1)
+
+
+def read_system(poscar="POSCAR"):
+    """
+    Reads the size of the system of a VASP run from its input files in the
+    current directory.
+
+    Args:
+        poscar (str): POSCAR of the run. Defaults to "POSCAR".
+
+    Returns:
+        {"natoms": int, "nbands": int, "nkpts": int}
+    """
+    from pymatgen.core import Structure
+    from pymatgen.io.vasp.inputs import Incar, Kpoints
+
+    incar = Incar.from_file("INCAR")
+    counts = _read_species_counts(poscar)
+    natoms = sum(counts)
+    zvals = _read_zvals("POTCAR") if os.path.exists("POTCAR") else []
+    nelect = incar.get("NELECT")
+    if not nelect:
+        # Without a matching POTCAR, assume 8 valence electrons per atom.
+        nelect = sum(z * n for z, n in zip(zvals, counts)) if len(zvals) == len(counts) else 8 * natoms
+    kpoints = Kpoints.from_file("KPOINTS") if os.path.exists("KPOINTS") else None
+    return {
+        "natoms": natoms,
+        "nbands": estimate_nbands(incar, natoms, nelect),
+        "nkpts": estimate_nkpts(incar, kpoints, Structure.from_file(poscar)),
+    }
+
+
+def get_ncores(cmd=None):
+    """
+    Returns the number of cores of a VASP run, from the number of MPI
+    processes of its command, or else from the batch system, or else the
+    number of cores of the current host.
+
+    Args:
+        cmd (str or [str]): Command running VASP. Defaults to None.
+    """
+    ncores = get_mpi_ncores(cmd) if cmd else None
+    if ncores:
+        return ncores
+    for var in ("SLURM_NTASKS", "NSLOTS", "PBS_NP"):
+        if os.environ.get(var, "").isdigit():
+            return int(os.environ[var])
+    return os.cpu_count() or 1
+
+
+def default_npar(ncores):
+    """
+    Returns NPAR as chosen without a model of the system, i.e., the smallest
+    divisor of the number of cores not less than its square root, or None
+    for a single core.
+
+    Args:
+        ncores (int): Number of cores.
+    """
+    for npar in range(int(math.sqrt(ncores)), ncores):
+        if ncores % npar == 0:
+            return npar
+    return None
+
+
+def read_outcar_timings(filename="OUTCAR"):
+    """
+    Reads the decomposition and the timings of the electronic steps of a
+    VASP run from its OUTCAR.
+
+    Args:
+        filename (str): OUTCAR.
+
+    Both the VASP 5 ("running on N total cores") and the VASP 6 ("running
+    N mpi-ranks") headers are understood.
+
+    Returns:
+        {"ncores", "natoms", "nbands", "nkpts", "kpar", "ncore", "npar",
+        "nsteps", "time_per_step"}, or None if the OUTCAR has no timed
+        electronic step.
+    """
+    d = {}
+    times = []
+    patterns = {
+        "ncores": re.compile(r"running (?:on\s+(\d+) total cores|\s*(\d+) mpi-ranks)"),
+        "nkpts": re.compile(r"NKPTS\s*=\s*(\d+)"),
+        "nbands": re.compile(r"NBANDS\s*=\s*(\d+)"),
+        "natoms": re.compile(r"NIONS\s*=\s*(\d+)"),
+        "kpar": re.compile(r"distrk:\s+each k-point on\s+(\d+) cores,\s+(\d+) groups"),
+        "ncore": re.compile(r"distr:\s+one band on (?:NCORE\w*\s*=\s*)?(\d+) cores,\s+(\d+) groups"),
+    }
+    loop = re.compile(r"LOOP:\s+cpu time\s+[\d.]+:\s+real time\s+([\d.]+)")
+    with open(filename) as f:
+        for line in f:
+            m = loop.search(line)
+            if m:
+                times.append(float(m.group(1)))
+                continue
+            for k, p in patterns.items():
+                if k not in d:
+                    m = p.search(line)
+                    if m:
+                        if k == "ncores":
+                            d[k] = int(m.group(1) or m.group(2))
+                        elif k == "kpar":
+                            d[k] = int(m.group(2))
+                        else:
+                            d[k] = int(m.group(1))
+                        if k == "ncore":
+                            d["npar"] = int(m.group(2))
+    # KPAR is only reported by the runs that distribute the k-points.
+    d.setdefault("kpar", 1)
+    if not times or any(k not in d for k in patterns):
+        return None
+    # The first steps of a run are non-selfconsistent and not typical.
+    steady = sorted(times[1:] or times)
+    d["nsteps"] = len(times)
+    d["time_per_step"] = steady[len(steady) // 2]
+    return d
+
+
+class ParallelPlanner:
+    """
+    Chooses KPAR and NPAR for a VASP run on a given number of cores, from a
+    performance model refined by the measured timings of similar runs.
+    """
+
+    def __init__(self, ncores, cores_per_node=None, cores_per_socket=None, perf_db=None):
+        """
+        Args:
+            ncores (int): Number of cores of the run.
+            cores_per_node (int): Number of cores per node. Defaults to None,
+                i.e., as detected by get_node_topology.
+            cores_per_socket (int): Number of cores per socket. Defaults to
+                None, i.e., as detected by get_node_topology.
+            perf_db (str): Performance database. Defaults to None, i.e.,
+                get_perf_db_path(), which is only set if opted in with
+                $CUSTODIAN_VASP_PERF_DB. Set to False to use the model only.
+        """
+        topology = get_node_topology() if cores_per_node is None or cores_per_socket is None else None
+        self.ncores = max(int(ncores), 1)
+        self.cores_per_node = cores_per_node or topology[0]
+        self.cores_per_socket = cores_per_socket or min(topology[1], self.cores_per_node)
+        self.perf_db = get_perf_db_path() if perf_db is None else perf_db
+
+    def predict(self, nkpts, nbands, kpar, npar):
+        """
+        Returns the modelled time of an electronic step, in arbitrary units,
+        of a decomposition.
+
+        Args:
+            nkpts (int): Number of irreducible k-points.
+            nbands (int): Number of bands.
+            kpar (int): Number of k-point groups.
+            npar (int): Number of band groups per k-point group.
+        """
+        group = self.ncores // kpar
+        ncore = group // npar
+        # Distributing the plane waves of a band over ncore cores and the
+        # bands over npar groups both cost communication that grows with
+        # their number, so that the optimum lies in between, and more so
+        # across sockets and nodes.
+        overhead = 1 + 0.05 * math.log2(ncore) ** 2 + 0.05 * math.log2(npar) ** 2
+        if ncore > self.cores_per_socket:
+            overhead *= 1.25
+        if ncore > self.cores_per_node:
+            overhead *= 2
+        if group > self.cores_per_node:
+            overhead *= 1 + 0.1 * math.log2(group / self.cores_per_node)
+        # VASP pads the bands to a multiple of npar.
+        bands = math.ceil(nbands / npar) * npar
+        # Each k-point group also does the work that does not depend on the
+        # k-points, e.g., on the charge density.
+        return math.ceil(nkpts / kpar) * bands * overhead / group + nbands / group
+
+    def candidates(self, nkpts, nbands):
+        """
+        Returns the valid decompositions as a list of (KPAR, NPAR).
+        """
+        candidates = []
+        for kpar in _divisors(self.ncores):
+            if kpar > max(nkpts, 1):
+                continue
+            group = self.ncores // kpar
+            for npar in _divisors(group):
+                if npar <= nbands and group // npar <= self.cores_per_node:
+                    candidates.append((kpar, npar))
+        return candidates or [(1, 1)]
+
+    def load_records(self):
+        """
+        Returns the records of the performance database, or an empty list.
+        """
+        if not self.perf_db or not os.path.exists(self.perf_db):
+            return []
+        records = []
+        with open(self.perf_db) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A line cut by a concurrent writer.
+                    continue
+        return records
+
+    def _corrections(self, nkpts, nbands):
+        """
+        Returns the measured time of each decomposition tried on similar
+        systems relative to the model, normalised over these systems.
+        """
+        ratios = {}
+        for r in self.load_records():
+            try:
+                if (
+                    r["ncores"] != self.ncores
+                    or r["cores_per_node"] != self.cores_per_node
+                    or not 2 / 3 <= r["nbands"] / nbands <= 1.5
+                    or not 0.5 <= r["nkpts"] / nkpts <= 2
+                ):
+                    continue
+                ratio = r["time_per_step"] / self.predict(r["nkpts"], r["nbands"], r["kpar"], r["npar"])
+            except (KeyError, TypeError, ValueError, ZeroDivisionError):
+                continue
+            ratios.setdefault((r["kpar"], r["npar"]), []).append(ratio)
+        if not ratios:
+            return {}
+        medians = {k: sorted(v)[len(v) // 2] for k, v in ratios.items()}
+        overall = sorted(medians.values())[len(medians) // 2]
+        return {k: v / overall for k, v in medians.items()}
+
+    def plan(self, nkpts, nbands):
+        """
+        Chooses the decomposition with the lowest predicted time.
+
+        Args:
+            nkpts (int): Number of irreducible k-points.
+            nbands (int): Number of bands.
+
+        Returns:
+            {"KPAR": int, "NPAR": int, "NCORE": int}
+        """
+        corrections = self._corrections(nkpts, nbands)
+        best = min(
+            self.candidates(nkpts, nbands),
+            key=lambda c: (self.predict(nkpts, nbands, *c) * corrections.get(c, 1), -c[0]),
+        )
+        kpar, npar = best
+        return {"KPAR": kpar, "NPAR": npar, "NCORE": self.ncores // kpar // npar}
+
+    def record(self, timings, kpar=None):
+        """
+        Appends the timings of a finished run, as read by
+        read_outcar_timings, to the performance database.
+
+        Args:
+            timings (dict): Timings of the run.
+            kpar (int): KPAR of the run. Defaults to the KPAR read from the
+                OUTCAR, or 1.
+        """
+        if not self.perf_db or timings is None:
+            return
+        if kpar is None:
+            kpar = timings.get("kpar", 1)
+        record = dict(timings, kpar=int(kpar), cores_per_node=self.cores_per_node)
+        directory = os.path.dirname(self.perf_db)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # A single short append is atomic, so that concurrent runs do not
+        # need to lock the database.
+        with open(self.perf_db, "a") as f:
+            f.write(json.dumps(record) + "\n")
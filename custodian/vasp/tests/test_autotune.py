@@ -0,0 +1,114 @@
+# coding: utf-8
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from pymatgen.core import Structure
+from pymatgen.io.vasp.inputs import Incar
+
+from custodian.vasp.autotune import ParallelAutotuner, incar_class, structure_hash
+from custodian.vasp.jobs import VaspJob
+
+test_dir = os.path.join(os.path.dirname(__file__), "..", "..", "..", "test_files")
+
+# Writes the OUTCAR of a short run, whose steps are fastest with KPAR = 1,
+# NCORE = 2 and LPLANE = .FALSE.
+FAKE_VASP = """
+import re
+incar = dict(re.findall(r"(\\w+) = (\\S+)", open("INCAR").read()))
+assert incar["NSW"] == "0" and incar["LWAVE"] == "False" and "NPAR" not in incar
+ncore = int(incar["NCORE"])
+step = 1.0 + abs(ncore - 2) + 0.5 * (int(incar["KPAR"]) - 1) + (0.5 if incar["LPLANE"] == "True" else 0)
+with open("OUTCAR", "w") as f:
+    f.write(" running on    4 total cores\\n")
+    f.write(" distr:  one band on NCORES_PER_BAND=   {} cores,    {} groups\\n".format(ncore, 4 // ncore))
+    f.write("   k-points           NKPTS =      1   k-points in BZ     NKDIM =      1   number of bands    NBANDS=     24\\n")
+    f.write("   number of dos      NEDOS =    301   number of ions     NIONS =      4\\n")
+    for i in range(int(incar["NELM"])):
+        f.write("      LOOP:  cpu time    {0:.4f}: real time    {0:.4f}\\n".format(step * (3 if i == 0 else 1)))
+"""
+
+
+class ParallelAutotunerTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        for f in ("INCAR", "KPOINTS", "POSCAR", "POTCAR"):
+            shutil.copy(os.path.join(test_dir, f), self.scratch)
+        self.cwd = os.getcwd()
+        os.chdir(self.scratch)
+        with open("fake_vasp.py", "w") as f:
+            f.write(FAKE_VASP)
+        self.cache = os.path.join(self.scratch, "cache", "autotune.json")
+        self.env = mock.patch.dict(
+            os.environ,
+            {"NSLOTS": "4", "CUSTODIAN_VASP_PERF_DB": os.path.join(self.scratch, "perf.jsonl")},
+        )
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.scratch)
+
+    def test_tune(self):
+        tuner = ParallelAutotuner([sys.executable, os.path.abspath("fake_vasp.py")], cache=self.cache)
+        candidates = tuner.candidates(4)
+        self.assertEqual(len(candidates), 6)
+        self.assertIn({"KPAR": 1, "NCORE": 2, "LPLANE": False}, candidates)
+        self.assertEqual(tuner.tune(), {"KPAR": 1, "NCORE": 2, "LPLANE": False})
+        self.assertFalse(os.path.exists("autotune"))
+        with open(os.environ["CUSTODIAN_VASP_PERF_DB"]) as f:
+            self.assertEqual(len(f.readlines()), 6)
+
+        # The cached settings are used without any trial.
+        tuner = ParallelAutotuner([sys.executable, "-c", "raise SystemExit(1)"], cache=self.cache)
+        self.assertEqual(tuner.tune(), {"KPAR": 1, "NCORE": 2, "LPLANE": False})
+        # But not for another number of cores.
+        with mock.patch.dict(os.environ, {"NSLOTS": "2"}):
+            self.assertIsNone(tuner.tune())
+
+    def test_untimed_trials(self):
+        # E.g. an OUTCAR whose header cannot be parsed.
+        tuner = ParallelAutotuner([sys.executable, "-c", "open('OUTCAR', 'w').write(' running\\n')"], cache=False)
+        with self.assertLogs("custodian.vasp.autotune", "WARNING") as logs:
+            self.assertIsNone(tuner.tune())
+        self.assertEqual(len(logs.output), 7)
+        self.assertIn("No autotuning trial could be timed", logs.output[-1])
+
+    def test_vasp_job(self):
+        # The settings are tuned after the overrides, and an NPAR set by an
+        # override does not end up next to the tuned NCORE.
+        os.environ["CUSTODIAN_VASP_AUTOTUNE_CACHE"] = self.cache
+        job = VaspJob(
+            [sys.executable, os.path.abspath("fake_vasp.py")],
+            auto_npar=False,
+            autotune=True,
+            settings_override=[{"dict": "INCAR", "action": {"_set": {"NPAR": 4, "ISPIN": 1}}}],
+        )
+        job.setup()
+        incar = Incar.from_file("INCAR")
+        self.assertNotIn("NPAR", incar)
+        self.assertEqual(incar["NCORE"], 2)
+        self.assertEqual(incar["ISPIN"], 1)
+        self.assertEqual(len(ParallelAutotuner([], cache=self.cache).load_cache()), 1)
+
+    def test_trial_timeout(self):
+        tuner = ParallelAutotuner([sys.executable, "-c", "import time; time.sleep(60)"], trial_timeout=0.5, cache=False)
+        self.assertIsNone(tuner.trial(Incar.from_file("INCAR"), {"KPAR": 1, "NCORE": 2, "LPLANE": True}))
+
+    def test_keys(self):
+        s = Structure.from_file("POSCAR")
+        h = structure_hash(s)
+        s.translate_sites(list(range(len(s))), [1e-5, 0, 0])
+        self.assertEqual(structure_hash(s), h)
+        s.replace(0, "Li")
+        self.assertNotEqual(structure_hash(s), h)
+        self.assertEqual(incar_class({"ISPIN": 2, "ENCUT": 520, "NSW": 99}), "ISPIN=2 ENCUT=520")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -19,6 +19,8 @@ import os
 import glob
 import shutil
 import datetime
+import tempfile
+import time
 import numpy as np
 
 from custodian.vasp.handlers import (
@@ -225,6 +227,39 @@ class VaspErrorHandlerTest(unittest.TestCase):
         self.assertEqual(type(h2), type(h))
         self.assertEqual(h2.output_filename, "random_name")
 
+    def test_incremental_check(self):
+        with open("vasp.teterror") as f:
+            lines = f.readlines()
+        clean = [l for l in lines if "k-point" not in l]
+        with open("vasp.incremental", "w") as f:
+            f.writelines(clean)
+        h = VaspErrorHandler("vasp.incremental")
+        self.assertFalse(h.check())
+        offset = h._reader.offset
+        self.assertEqual(offset, os.path.getsize("vasp.incremental"))
+
+        # Only the appended error should be scanned, and errors are kept
+        # until the job is restarted.
+        with open("vasp.incremental", "a") as f:
+            f.write(" Fatal error: unable to match k-point!       0\n")
+        self.assertTrue(h.check())
+        self.assertGreater(h._reader.offset, offset)
+        self.assertTrue(h.check())
+        self.assertEqual(h.errors, {"tet"})
+
+        # The scan state survives serialization.
+        h2 = VaspErrorHandler.from_dict(h.as_dict())
+        self.assertEqual(h2._reader.offset, h._reader.offset)
+        self.assertTrue(h2.check())
+
+        # A rewritten output file is scanned from the start.
+        with open("vasp.incremental", "w") as f:
+            f.writelines(clean[:10])
+        self.assertFalse(h.check())
+        h.reset()
+        self.assertEqual(h._reader.offset, 0)
+        os.remove("vasp.incremental")
+
     def test_pssyevx(self):
         h = VaspErrorHandler("vasp.pssyevx")
         self.assertEqual(h.check(), True)
@@ -586,6 +621,38 @@ class LargeSigmaHandlerTest(unittest.TestCase):
         os.chdir(cwd)
 
 
+class FrozenJobErrorHandlerTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        os.chdir(self.scratch)
+        shutil.copy(os.path.join(test_dir, "OSZICAR"), "OSZICAR")
+        with open("vasp.out", "w") as f:
+            f.write("running on    4 total cores\n")
+
+    def test_check(self):
+        h = FrozenJobErrorHandler(timeout=3600, min_timeout=60)
+        h.reset()
+        self.assertFalse(h.check())
+        # Steps are read from the OSZICAR.
+        self.assertGreater(h._detector._steps, 0)
+        self.assertFalse(h.check())
+        self.assertEqual(h.as_dict()["min_timeout"], 60)
+
+    def test_check_stale_output(self):
+        stale = time.time() - 3700
+        os.utime("vasp.out", (stale, stale))
+        h = FrozenJobErrorHandler(timeout=3600)
+        self.assertTrue(h.check())
+        h.reset()
+        with open("vasp.out", "a") as f:
+            f.write("DAV:   1\n")
+        self.assertFalse(h.check())
+
+    def tearDown(self):
+        os.chdir(cwd)
+        shutil.rmtree(self.scratch)
+
+
 class ZpotrfErrorHandlerTest(unittest.TestCase):
     def setUp(self):
         if "PMG_VASP_PSP_DIR" not in os.environ:
@@ -4,12 +4,21 @@ from __future__ import unicode_literals, division
 import unittest
 import os
 import shutil
+import sys
 import glob
+import gzip
+from unittest import mock
 from monty.tempfile import ScratchDir
 from monty.os import cd
-import multiprocessing
-from custodian.vasp.jobs import VaspJob, VaspNEBJob, GenerateVaspInputJob
-from pymatgen.io.vasp import Incar, Kpoints, Poscar
+from custodian.vasp.jobs import (
+    ConcurrentVaspJob,
+    GenerateVaspInputJob,
+    VaspJob,
+    VaspNEBJob,
+    propose_lattice_parameters,
+)
+from custodian.vasp.parallel import get_ncores
+from pymatgen.io.vasp import Incar, Kpoints, Oszicar, Poscar
 import pymatgen
 
 
@@ -30,10 +39,42 @@ class VaspJobTest(unittest.TestCase):
                 v = VaspJob("hello", auto_npar=True)
                 v.setup()
                 incar = Incar.from_file("INCAR")
-                count = multiprocessing.cpu_count()
-                # Need at least 3 CPUs for NPAR to be greater than 1
-                if count > 3:
-                    self.assertGreater(incar["NPAR"], 1)
+                count = get_ncores("hello")
+                # The k-point groups and band groups split the cores evenly.
+                self.assertEqual(count % (incar["KPAR"] * incar["NPAR"]), 0)
+                self.assertNotIn("NCORE", incar)
+
+    def test_setup_unreadable_system(self):
+        with cd(test_dir):
+            with ScratchDir(".", copy_from_current_on_enter=True) as d:
+                with mock.patch.dict(os.environ, {"NSLOTS": "16"}), mock.patch(
+                    "custodian.vasp.jobs.read_system", side_effect=ValueError
+                ):
+                    v = VaspJob("hello", auto_npar=True)
+                    v.setup()
+                # Without the size of the system, NPAR is set from the number
+                # of cores only.
+                incar = Incar.from_file("INCAR")
+                self.assertEqual(incar["NPAR"], 4)
+                self.assertNotIn("KPAR", incar)
+
+    def test_setup_decompress(self):
+        with cd(test_dir):
+            with ScratchDir(".", copy_from_current_on_enter=True) as d:
+                shutil.move("OSZICAR", "OSZICAR.relax1")
+                for f in ["INCAR", "POSCAR", "CHGCAR", "OSZICAR.relax1"]:
+                    with open(f, "rb") as f_in, gzip.open(f + ".gz", "wb") as f_out:
+                        shutil.copyfileobj(f_in, f_out)
+                    os.remove(f)
+                v = VaspJob("hello", settings_override=[{"dict": "INCAR", "action": {"_set": {"ICHARG": 2}}}])
+                v.setup()
+                # The CHGCAR is not read with ICHARG = 2, and the outputs of
+                # previous runs are left compressed.
+                for f in ["INCAR", "POSCAR", "CHGCAR.gz", "OSZICAR.relax1.gz"]:
+                    self.assertTrue(os.path.exists(f), f)
+                v = VaspJob("hello", settings_override=[{"dict": "INCAR", "action": {"_set": {"ICHARG": 1}}}])
+                v.setup()
+                self.assertTrue(os.path.exists("CHGCAR"))
 
     def test_setup_run_no_kpts(self):
         # just make sure v.setup() and v.run() exit cleanly when no KPOINTS file is present
@@ -74,6 +115,40 @@ class VaspJobTest(unittest.TestCase):
                 self.assertAlmostEqual(incar["MAGMOM"], [3.007, 1.397, -0.189, -0.189])
                 self.assertAlmostEqual(incar_prev["MAGMOM"], [5, -5, 0.6, 0.6])
 
+    def test_postprocess_wavecar_copies(self):
+        with cd(os.path.join(test_dir, "postprocess")):
+            with ScratchDir(".", copy_from_current_on_enter=True) as d:
+                suffixes = [".orig", ".bak", "_gamma", ".relax1.gz", ".relax1", ".relax2"]
+                for i, suffix in enumerate(suffixes):
+                    with open("WAVECAR" + suffix, "w") as f:
+                        f.write(suffix)
+                    os.utime("WAVECAR" + suffix, (i, i))
+                with open("WAVECAR", "w") as f:
+                    f.write("wavefunctions")
+                v = VaspJob("hello", final=False, suffix=".relax3", max_wavecar_copies=2)
+                v.postprocess()
+                # Only the copies made by the chain are pruned, and the
+                # user's own files survive.
+                self.assertEqual(
+                    sorted(glob.glob("WAVECAR*")),
+                    [
+                        "WAVECAR",
+                        "WAVECAR.bak",
+                        "WAVECAR.orig",
+                        "WAVECAR.relax1.gz",
+                        "WAVECAR.relax2",
+                        "WAVECAR.relax3",
+                        "WAVECAR_gamma",
+                    ],
+                )
+                with open("WAVECAR.relax3") as f:
+                    self.assertEqual(f.read(), "wavefunctions")
+                # The copy is independent of the WAVECAR of the next run.
+                with open("WAVECAR", "w") as f:
+                    f.write("next")
+                with open("WAVECAR.relax3") as f:
+                    self.assertEqual(f.read(), "wavefunctions")
+
     def test_continue(self):
         # Test the continuation functionality
         with cd(os.path.join(test_dir, "postprocess")):
@@ -116,6 +191,119 @@ class VaspJobTest(unittest.TestCase):
         # Just a basic test of init.
         VaspJob.double_relaxation_run(["vasp"])
 
+    def test_constrained_opt_run_concurrent(self):
+        with cd(test_dir):
+            with ScratchDir(".", copy_from_current_on_enter=True) as d:
+                c = Poscar.from_file("POSCAR").structure.lattice.c
+                jobs = VaspJob.constrained_opt_run(["mpirun", "-np", "6", "vasp"], "c", 0.02, npoints=3, max_steps=3)
+                job = next(jobs)
+                self.assertIsInstance(job, ConcurrentVaspJob)
+                self.assertEqual(len(job.directories), 3)
+                for i, directory in enumerate(job.directories):
+                    lattice = Poscar.from_file(os.path.join(directory, "POSCAR")).structure.lattice
+                    self.assertAlmostEqual(lattice.c, c * (1 + 0.02 * (i - 1)), 4)
+                    self.assertEqual(Incar.from_file(os.path.join(directory, "INCAR"))["ISIF"], 2)
+                    shutil.copy(os.path.join("postprocess", "vasprun.xml"), directory)
+                # All the runs are used up by the first round.
+                self.assertEqual(list(jobs), [])
+                with open("EOS.txt") as f:
+                    self.assertEqual(len(f.readlines()), 4)
+
+
+class ConcurrentVaspJobTest(unittest.TestCase):
+    def test_run(self):
+        with ScratchDir("."):
+            with open("fake_vasp.py", "w") as f:
+                f.write(
+                    "import os\n"
+                    "e = {'d1': -1.0, 'd2': -3.0, 'd3': -2.0}[os.path.basename(os.getcwd())]\n"
+                    "open('OSZICAR', 'w').write('   1 F= %.8E E0= %.8E  d E =0.0\\n' % (e, e))\n"
+                )
+            for directory in ["d1", "d2", "d3"]:
+                os.mkdir(directory)
+                for f in ["INCAR", "KPOINTS", "POSCAR", "POTCAR"]:
+                    shutil.copy(os.path.join(test_dir, f), directory)
+            job = ConcurrentVaspJob(
+                [sys.executable, os.path.abspath("fake_vasp.py")],
+                ["d1", "d2", "d3"],
+                vasp_job_kwargs={"auto_gamma": False},
+            )
+            job.setup()
+            self.assertIsNone(job.run())
+            for directory in ["d1", "d2", "d3"]:
+                self.assertTrue(os.path.exists(os.path.join(directory, "custodian.json")))
+            # The outputs of the run of lowest energy are copied.
+            self.assertEqual(Oszicar("OSZICAR").final_energy, -3.0)
+
+    def test_bind(self):
+        with ScratchDir("."):
+            for directory in ["d1", "d2"]:
+                os.mkdir(directory)
+            cmd = ["mpirun", "-np", "4", "--hostfile", "$CUSTODIAN_SLICE_HOSTFILE", "--cpu-set", "$CUSTODIAN_SLICE_CPUS"]
+            job = ConcurrentVaspJob(cmd, ["d1", "d2"])
+            # The slice of a batch workflow is split between the runs.
+            with mock.patch.dict(os.environ, {"CUSTODIAN_HOST": "node01", "CUSTODIAN_CPUS": "0-7"}):
+                cmds = job._bind(cmd, 4)
+            for directory, cpus, run_cmd in zip(["d1", "d2"], ["0-3", "4-7"], cmds):
+                hostfile = os.path.abspath(os.path.join(directory, ConcurrentVaspJob.SLICE_HOSTFILE))
+                self.assertEqual(run_cmd, ["mpirun", "-np", "4", "--hostfile", hostfile, "--cpu-set", cpus])
+                with open(hostfile) as f:
+                    self.assertEqual(f.read(), "node01 slots=4\n")
+            # Commands without placeholders are left to the MPI launcher.
+            self.assertEqual(ConcurrentVaspJob("vasp", ["d1", "d2"])._bind("vasp", 4), ["vasp", "vasp"])
+
+    def test_propagate_incar(self):
+        with ScratchDir("."):
+            for directory in ["d1", "d2"]:
+                os.mkdir(directory)
+                shutil.copy(os.path.join(test_dir, "INCAR"), directory)
+            shutil.copy(os.path.join(test_dir, "INCAR"), ".")
+            job = ConcurrentVaspJob("vasp", ["d1", "d2"])
+            job.setup()
+            # A correction of the Custodian running the job.
+            incar = Incar.from_file("INCAR")
+            incar["ALGO"] = "All"
+            del incar["ISMEAR"]
+            incar.write_file("INCAR")
+            job._propagate_incar()
+            for directory in ["d1", "d2"]:
+                run_incar = Incar.from_file(os.path.join(directory, "INCAR"))
+                self.assertEqual(run_incar["ALGO"], "All")
+                self.assertNotIn("ISMEAR", run_incar)
+
+
+class ProposeLatticeParametersTest(unittest.TestCase):
+    def search(self, npoints, algo="bfgs"):
+        # As in constrained_opt_run, one run at a time starts with the initial
+        # strain.
+        energies = {5.0: (5.0 - 5.37) ** 2 + 0.1 * (5.0 - 5.37) ** 4} if npoints == 1 else {}
+        points = [5.0 * (1 + 0.02 * (j - (npoints - 1) // 2)) for j in range(max(npoints, 2))]
+        points = [5.1] if npoints == 1 else points
+        rounds = 1 if npoints == 1 else 0
+        while points and len(energies) < 30:
+            rounds += 1
+            energies.update({x: (x - 5.37) ** 2 + 0.1 * (x - 5.37) ** 4 for x in points})
+            points = propose_lattice_parameters(energies, npoints, 1e-6, algo)
+        return min(energies, key=energies.get), rounds
+
+    def test_search(self):
+        x, serial_rounds = self.search(1)
+        self.assertAlmostEqual(x, 5.37, 2)
+        x, rounds = self.search(4)
+        self.assertAlmostEqual(x, 5.37, 2)
+        self.assertLess(rounds, serial_rounds)
+        x, rounds = self.search(4, "bisection")
+        self.assertAlmostEqual(x, 5.37, 2)
+
+    def test_bracket(self):
+        # Steps away from the lowest energy grow until it is bracketed.
+        points = propose_lattice_parameters({5.0: 1.0, 5.1: 0.5}, 3, 1e-4)
+        self.assertEqual(len(points), 3)
+        self.assertTrue(5.1 < points[0] < points[1] < points[2])
+        self.assertGreater(points[2] - points[1], points[1] - points[0])
+        # Converged within the energy tolerance.
+        self.assertEqual(propose_lattice_parameters({5.0: 1.0, 5.1: 0.5, 5.2: 0.50001}, 3, 1e-4), [])
+
 
 class VaspNEBJobTest(unittest.TestCase):
     def test_to_from_dict(self):
@@ -131,9 +319,8 @@ class VaspNEBJobTest(unittest.TestCase):
                 v.setup()
 
                 incar = Incar.from_file("INCAR")
-                count = multiprocessing.cpu_count()
-                if count > 3:
-                    self.assertGreater(incar["NPAR"], 1)
+                count = get_ncores("hello")
+                self.assertEqual(count % (incar["KPAR"] * incar["NPAR"]), 0)
 
                 kpt = Kpoints.from_file("KPOINTS")
                 kpt_pre = Kpoints.from_file("KPOINTS.orig")
@@ -0,0 +1,65 @@
+# coding: utf-8
+
+import glob
+import os
+import unittest
+
+import numpy as np
+from monty.tempfile import ScratchDir
+from pymatgen.io.vasp.outputs import Oszicar
+
+from custodian.vasp.outputs import OszicarReader, count_atoms
+
+test_dir = os.path.join(os.path.dirname(__file__), "..", "..", "..", "test_files")
+
+
+class OszicarReaderTest(unittest.TestCase):
+    def test_update(self):
+        files = glob.glob(os.path.join(test_dir, "OSZICAR")) + glob.glob(os.path.join(test_dir, "*", "OSZICAR*"))
+        for fname in files:
+            oszicar = Oszicar(fname)
+            reader = OszicarReader(fname).update()
+            self.assertEqual(reader.ionic_steps, oszicar.ionic_steps)
+            self.assertEqual(list(reader.n_electronic_steps), [len(e) for e in oszicar.electronic_steps])
+            for key, values in [("E0", reader.energies), ("dE", reader.energy_changes)]:
+                np.testing.assert_array_equal(values, [s.get(key, np.nan) for s in oszicar.ionic_steps])
+
+    def test_incremental(self):
+        with open(os.path.join(test_dir, "potim", "OSZICAR")) as f:
+            lines = f.readlines()
+        with ScratchDir("."):
+            reader = OszicarReader()
+            with open("OSZICAR", "w") as f:
+                f.writelines(lines[:30])
+                # A line still being written is not read yet.
+                f.write(lines[30][:10])
+            reader.update()
+            n = len(reader.ionic_steps)
+            with open("OSZICAR", "a") as f:
+                f.write(lines[30][10:])
+                f.writelines(lines[31:])
+            reader.update()
+            oszicar = Oszicar("OSZICAR")
+            self.assertLess(n, len(oszicar.ionic_steps))
+            self.assertEqual(reader.ionic_steps, oszicar.ionic_steps)
+            self.assertEqual(list(reader.n_electronic_steps), [len(e) for e in oszicar.electronic_steps])
+
+            # A rewritten OSZICAR is read from the start.
+            with open("OSZICAR", "w") as f:
+                f.writelines(lines[:3])
+            self.assertEqual(list(reader.update().n_electronic_steps), [2])
+            self.assertEqual(len(reader.energies), 0)
+
+    def test_count_atoms(self):
+        self.assertEqual(count_atoms(os.path.join(test_dir, "POSCAR")), 8)
+        with ScratchDir("."):
+            # VASP 4 format, without species symbols.
+            with open(os.path.join(test_dir, "POSCAR")) as f:
+                lines = f.readlines()
+            with open("POSCAR", "w") as f:
+                f.writelines(lines[:5] + lines[6:])
+            self.assertEqual(count_atoms(), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+# coding: utf-8
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from monty.os import cd
+
+from custodian.vasp.parallel import (
+    PERF_DB_ENV,
+    ParallelPlanner,
+    default_npar,
+    estimate_nbands,
+    read_outcar_timings,
+    read_system,
+)
+
+test_dir = os.path.join(os.path.dirname(__file__), "..", "..", "..", "test_files")
+
+
+class ParallelPlannerTest(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.perf_db = os.path.join(self.scratch, "perf", "vasp_perf.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.scratch)
+
+    def test_candidates(self):
+        p = ParallelPlanner(48, cores_per_node=24, cores_per_socket=12, perf_db=False)
+        candidates = p.candidates(nkpts=4, nbands=100)
+        self.assertIn((4, 12), candidates)
+        for kpar, npar in candidates:
+            self.assertEqual(48 % (kpar * npar), 0)
+            self.assertLessEqual(kpar, 4)
+            # A band is never spread over several nodes.
+            self.assertLessEqual(48 // kpar // npar, 24)
+        self.assertEqual(ParallelPlanner(1, 1, 1, perf_db=False).plan(10, 20), {"KPAR": 1, "NPAR": 1, "NCORE": 1})
+
+    def test_perf_db_opt_in(self):
+        with mock.patch.dict(os.environ, {PERF_DB_ENV: self.perf_db}):
+            self.assertEqual(ParallelPlanner(4, 4, 4).perf_db, self.perf_db)
+        with mock.patch.dict(os.environ):
+            os.environ.pop(PERF_DB_ENV, None)
+            p = ParallelPlanner(4, 4, 4)
+            self.assertIsNone(p.perf_db)
+            p.record({"ncores": 4, "nkpts": 1, "nbands": 8, "npar": 1, "time_per_step": 1.0})
+        self.assertFalse(os.path.exists(self.perf_db))
+
+    def test_default_npar(self):
+        self.assertEqual(default_npar(16), 4)
+        self.assertEqual(default_npar(24), 4)
+        self.assertIsNone(default_npar(7))
+
+    def test_plan(self):
+        p = ParallelPlanner(128, cores_per_node=64, cores_per_socket=32, perf_db=False)
+        # Many k-points are best spread over k-point groups.
+        many = p.plan(nkpts=60, nbands=300)
+        self.assertGreaterEqual(many["KPAR"], 8)
+        # A single k-point can only be split by bands and plane waves, with
+        # a band shared by a moderate number of cores.
+        gamma = p.plan(nkpts=1, nbands=800)
+        self.assertEqual(gamma["KPAR"], 1)
+        self.assertTrue(4 <= gamma["NCORE"] <= 32)
+        self.assertEqual(gamma["NPAR"] * gamma["NCORE"], 128)
+
+    def test_refine(self):
+        p = ParallelPlanner(24, cores_per_node=24, cores_per_socket=12, perf_db=self.perf_db)
+        plan = p.plan(nkpts=1, nbands=100)
+        self.assertEqual(p.load_records(), [])
+        unit = p.predict(1, 100, 1, plan["NPAR"])
+        # The chosen decomposition turned out slow on similar systems, and
+        # another one fast.
+        timings = {"ncores": 24, "natoms": 20, "nbands": 100, "nkpts": 1, "nsteps": 20}
+        p.record(dict(timings, npar=plan["NPAR"], time_per_step=10 * unit))
+        p.record(dict(timings, nbands=110, npar=24, time_per_step=p.predict(1, 110, 1, 24)))
+        with open(self.perf_db, "a") as f:
+            f.write('{"ncores": 24, "npar"')
+        self.assertEqual(len(p.load_records()), 2)
+        self.assertEqual(p.plan(nkpts=1, nbands=100), {"KPAR": 1, "NPAR": 24, "NCORE": 1})
+        # Records of other systems are ignored.
+        self.assertEqual(p.plan(nkpts=1, nbands=1000), ParallelPlanner(24, 24, 12, perf_db=False).plan(1, 1000))
+
+    def test_read_outcar_timings(self):
+        d = read_outcar_timings(os.path.join(test_dir, "postprocess", "OUTCAR"))
+        self.assertEqual(d["ncores"], 12)
+        self.assertEqual(d["nkpts"], 1)
+        self.assertEqual(d["nbands"], 24)
+        self.assertEqual(d["natoms"], 4)
+        self.assertEqual(d["ncore"], 1)
+        self.assertEqual(d["npar"], 12)
+        self.assertGreater(d["nsteps"], 10)
+        self.assertAlmostEqual(d["time_per_step"], 0.25, 1)
+        p = ParallelPlanner(d["ncores"], 12, 6, perf_db=self.perf_db)
+        p.record(d, kpar=1)
+        with open(self.perf_db) as f:
+            self.assertEqual(json.loads(f.readline())["kpar"], 1)
+
+    def test_read_outcar_timings_vasp6(self):
+        d = read_outcar_timings(os.path.join(test_dir, "outcar_vasp6", "OUTCAR"))
+        self.assertEqual(d["ncores"], 16)
+        self.assertEqual(d["nkpts"], 10)
+        self.assertEqual(d["nbands"], 32)
+        self.assertEqual(d["natoms"], 8)
+        self.assertEqual(d["kpar"], 8)
+        self.assertEqual(d["ncore"], 1)
+        self.assertEqual(d["npar"], 2)
+        self.assertEqual(d["nsteps"], 6)
+        self.assertAlmostEqual(d["time_per_step"], 1.50)
+        ParallelPlanner(d["ncores"], 16, 8, perf_db=self.perf_db).record(d)
+        with open(self.perf_db) as f:
+            self.assertEqual(json.loads(f.readline())["kpar"], 8)
+
+    def test_read_system(self):
+        with cd(test_dir):
+            d = read_system()
+        self.assertEqual(d["natoms"], 8)
+        self.assertGreater(d["nbands"], 8)
+        self.assertGreaterEqual(d["nkpts"], 1)
+        self.assertEqual(estimate_nbands({"NBANDS": 64}, 8, 40), 64)
+        self.assertEqual(estimate_nbands({}, 8, 40), 25)
+        self.assertEqual(estimate_nbands({"LSORBIT": True}, 8, 40), 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,12 @@
 import os, shutil
 import unittest
+from monty.tempfile import ScratchDir
 from custodian.vasp.validators import (
     VasprunXMLValidator,
     VaspFilesValidator,
     VaspNpTMDValidator,
     VaspAECCARValidator,
+    check_vasprun_xml,
 )
 
 test_dir = os.path.join(os.path.dirname(__file__), "..", "..", "..", "test_files")
@@ -14,7 +16,7 @@ cwd = os.getcwd()
 class VasprunXMLValidatorTest(unittest.TestCase):
     def test_check_and_correct(self):
         os.chdir(os.path.join(test_dir, "bad_vasprun"))
-        h = VasprunXMLValidator()
+        h = VasprunXMLValidator(full_parse=True)
         self.assertTrue(h.check())
 
         # Unconverged still has a valid vasprun.
@@ -23,11 +25,35 @@ class VasprunXMLValidatorTest(unittest.TestCase):
         self.assertFalse(h.check())
         os.remove("vasprun.xml")
 
+    def test_check_streaming(self):
+        os.chdir(os.path.join(test_dir, "bad_vasprun"))
+        # Streaming is the default.
+        h = VasprunXMLValidator()
+        self.assertTrue(h.check())
+
+        os.chdir(os.path.join(test_dir, "unconverged"))
+        shutil.copy("vasprun.xml.electronic", "vasprun.xml")
+        self.assertFalse(h.check())
+        os.remove("vasprun.xml")
+
+        check_vasprun_xml(os.path.join(test_dir, "vasprun.xml.indirect.gz"))
+        with ScratchDir("."):
+            # Well-formed, but the run stopped before the final structure.
+            with open("vasprun.xml", "w") as f:
+                f.write("<modeling><calculation><structure/><energy/></calculation></modeling>")
+            self.assertRaisesRegex(ValueError, "final structure", check_vasprun_xml)
+            with open("vasprun.xml", "w") as f:
+                f.write("<modeling><calculation><structure/></calculation></modeling>")
+            self.assertRaisesRegex(ValueError, "no energy", check_vasprun_xml)
+
     def test_as_dict(self):
         h = VasprunXMLValidator()
         d = h.as_dict()
         h2 = VasprunXMLValidator.from_dict(d)
         self.assertIsInstance(h2, VasprunXMLValidator)
+        self.assertFalse(h2.full_parse)
+        h2 = VasprunXMLValidator.from_dict(VasprunXMLValidator(full_parse=True).as_dict())
+        self.assertTrue(h2.full_parse)
 
     @classmethod
     def tearDownClass(cls):
@@ -6,11 +6,13 @@ Implements various validatiors, e.g., check if vasprun.xml is valid, for VASP.
 
 import logging
 import os
+import xml.etree.ElementTree as ET
 from collections import deque
 
-from pymatgen.io.vasp import Vasprun, Incar, Outcar, Chgcar
+from monty.io import zopen
 
 from custodian.custodian import Validator
+from custodian.utils import get_parse_cache
 
 
 class VasprunXMLValidator(Validator):
@@ -18,16 +20,22 @@ class VasprunXMLValidator(Validator):
     Checks that a valid vasprun.xml was generated
     """
 
-    def __init__(self, output_file="vasp.out", stderr_file="std_err.txt"):
+    def __init__(self, output_file="vasp.out", stderr_file="std_err.txt", full_parse=False):
         """
         Args:
             output_file (str): Name of file VASP standard output is directed to.
                 Defaults to "vasp.out".
             stderr_file (str): Name of file VASP standard error is direct to.
                 Defaults to "std_err.txt".
+            full_parse (bool): Whether vasprun.xml is validated by parsing it
+                into a Vasprun object. If False, the file is only streamed
+                through an incremental XML parser with check_vasprun_xml,
+                which takes a fraction of the time and a bounded amount of
+                memory on large runs, e.g., long MD runs. Defaults to False.
         """
         self.output_file = output_file
         self.stderr_file = stderr_file
+        self.full_parse = full_parse
         self.logger = logging.getLogger(self.__class__.__name__)
 
     def check(self):
@@ -35,7 +43,12 @@ class VasprunXMLValidator(Validator):
         Check for error.
         """
         try:
-            Vasprun("vasprun.xml")
+            if self.full_parse:
+                from pymatgen.io.vasp import Vasprun
+
+                get_parse_cache().load(Vasprun, "vasprun.xml")
+            else:
+                check_vasprun_xml("vasprun.xml")
         except Exception:
             exception_context = {}
 
@@ -106,12 +119,14 @@ class VaspNpTMDValidator(Validator):
         """
         Check for error.
         """
-        incar = Incar.from_file("INCAR")
+        from pymatgen.io.vasp import Incar, Outcar
+
+        incar = get_parse_cache().load(Incar.from_file, "INCAR")
         is_npt = incar.get("MDALGO") == 3
         if not is_npt:
             return False
 
-        outcar = Outcar("OUTCAR")
+        outcar = get_parse_cache().load_copy(Outcar, "OUTCAR")
         patterns = {"MDALGO": r"MDALGO\s+=\s+([\d]+)"}
         outcar.read_pattern(patterns=patterns)
         if outcar.data["MDALGO"] == [["3"]]:
@@ -134,12 +149,71 @@ class VaspAECCARValidator(Validator):
         """
         Check for error.
         """
+        from pymatgen.io.vasp import Chgcar
+
         aeccar0 = Chgcar.from_file("AECCAR0")
         aeccar2 = Chgcar.from_file("AECCAR2")
         aeccar = aeccar0 + aeccar2
         return check_broken_chgcar(aeccar)
 
 
+def check_vasprun_xml(filename="vasprun.xml"):
+    """
+    Checks that a vasprun.xml is complete without building a Vasprun object.
+    The file is streamed through an incremental parser and elements are
+    cleared as soon as they are closed, so that memory use does not grow with
+    the size of the file. The file must be well-formed XML, i.e., end with the
+    closing </modeling> tag, contain at least one calculation, the last of
+    which must have its structure and energy, and end with the final
+    structure.
+
+    Args:
+        filename (str): Name of the vasprun.xml file, which may be compressed.
+
+    Raises:
+        xml.etree.ElementTree.ParseError if the file is not well-formed,
+        ValueError if it is incomplete.
+    """
+    depth = 0
+    root = None
+    top = None
+    children = set()
+    last_children = set()
+    last = None
+    n_calculations = 0
+    with zopen(filename, "rb") as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if depth == 1:
+                    root = elem
+                elif depth == 2:
+                    top = elem.tag
+                    children = set()
+                continue
+            depth -= 1
+            if depth == 2 and top == "calculation":
+                children.add(elem.tag)
+            if depth == 1:
+                last = (elem.tag, elem.get("name"))
+                if elem.tag == "calculation":
+                    n_calculations += 1
+                    last_children = children
+                # Drop the children of the root once they have been checked.
+                root.clear()
+            elif depth > 1:
+                elem.clear()
+    if root is None or root.tag != "modeling":
+        raise ValueError("{} is not a vasprun.xml file".format(filename))
+    if n_calculations == 0:
+        raise ValueError("{} has no calculation".format(filename))
+    missing = {"structure", "energy"} - last_children
+    if missing:
+        raise ValueError("Last calculation in {} has no {}".format(filename, ", ".join(sorted(missing))))
+    if last != ("structure", "finalpos"):
+        raise ValueError("{} has no final structure".format(filename))
+
+
 def check_broken_chgcar(chgcar, diff_thresh=None):
     """
     Check if the charge density file is corrupt